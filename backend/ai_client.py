@@ -1,15 +1,64 @@
+import asyncio
 import os
-from google import genai
+from types import SimpleNamespace
 
+# google.genai takes ~0.5s to import, so it is loaded on first use rather than at
+# startup; only requests that actually call the model pay for it.
 api_key = os.getenv("GEMINI_API_KEY")
-client = None
+_client = None
+_initialized = False
 
-if api_key:
+def get_client():
+    """Shared Gemini client, or None when GEMINI_API_KEY is not set."""
+    global _client, _initialized
+    if _initialized:
+        return _client
+    _initialized = True
+
+    if not api_key:
+        print("Warning: GEMINI_API_KEY not set")
+        return None
     try:
-        client = genai.Client(api_key=api_key)
+        from google import genai
+        _client = genai.Client(api_key=api_key)
     except Exception as e:
         print(f"Failed to initialize Gemini Client: {e}")
-else:
-    print("Warning: GEMINI_API_KEY not set")
+    return _client
+
+# Default model for every task; per-task overrides and fallbacks live in model_router.py
+MODEL_NAME = os.getenv("AI_MODEL", "gemini-2.5-flash")
+
+
+class FakeClient:
+    """
+    Local stand-in for genai.Client (async surface only) for tests and benchmarks.
+    `latency(model)` returns seconds to wait, e.g. a sample from a distribution;
+    `respond(model, contents)` returns the response text or raises to inject an error.
+    """
+    def __init__(self, latency=lambda model: 0.0, respond=lambda model, contents: ""):
+        self.latency = latency
+        self.respond = respond
+        self.calls: list = []   # model of every request started
+        self.cancelled = 0      # requests abandoned before they finished
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self._generate_content))
+
+    async def _generate_content(self, model, contents, config=None):
+        self.calls.append(model)
+        try:
+            await asyncio.sleep(self.latency(model))
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        text = self.respond(model, contents)
+        usage = SimpleNamespace(prompt_token_count=estimate_tokens(contents), candidates_token_count=estimate_tokens(text))
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+IMAGE_TOKENS = 258  # Gemini's charge for one image tile
 
-MODEL_NAME = "gemini-2.5-flash"
+def estimate_tokens(contents) -> int:
+    """Rough token count for fake responses: ~4 characters per token, a flat rate per image."""
+    if isinstance(contents, str):
+        return (len(contents) + 3) // 4
+    if isinstance(contents, (list, tuple)):
+        return sum(estimate_tokens(part) for part in contents)
+    return IMAGE_TOKENS
@@ -0,0 +1,140 @@
+import asyncio
+import heapq
+import itertools
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import Depends, HTTPException, status
+
+from auth_utils import get_current_user
+from models import User
+
+# Sharing model throughput between users.
+#
+# - Scheduling: at most AI_CONCURRENCY model calls run at once. Waiting calls are ordered by
+#   weighted fair queuing over (user, task) flows, so one user's 1,000-page OCR backlog cannot
+#   starve anyone else, and interactive tasks (chat, quiz) overtake bulk OCR.
+# - Accounting: requests and tokens per user, day (UTC) and task, in ai_usage.
+# - Budgets: AI_DAILY_REQUESTS / AI_DAILY_TOKENS per user (0 is unlimited). Checked when an
+#   AI-backed request arrives; over budget is a 429 with Retry-After set to the next UTC midnight.
+
+AI_CONCURRENCY = int(os.getenv("AI_CONCURRENCY", "16"))
+AI_DAILY_REQUESTS = int(os.getenv("AI_DAILY_REQUESTS", "0"))
+AI_DAILY_TOKENS = int(os.getenv("AI_DAILY_TOKENS", "0"))
+
+# Relative share of model throughput per task; a flow with weight 8 is served 8x as often
+TASK_WEIGHTS: Dict[str, float] = {
+    task: float(os.getenv(f"AI_WEIGHT_{task.upper()}", default))
+    for task, default in (("chat", "8"), ("quiz", "8"), ("format", "4"), ("ocr", "1"), ("ocr_batch", "1"))
+}
+
+def usage_day(now: Optional[datetime] = None) -> str:
+    return (now or datetime.now(timezone.utc)).strftime("%Y-%m-%d")
+
+def seconds_until_reset(now: Optional[datetime] = None) -> int:
+    now = now or datetime.now(timezone.utc)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(1, int((midnight - now).total_seconds()))
+
+
+class FairScheduler:
+    """
+    Weighted fair queuing of model calls. Each (user, task) flow gets virtual finish tags
+    spaced 1/weight apart, starting no earlier than the current virtual time; when a slot
+    frees up, the waiting call with the smallest tag runs next.
+    """
+    def __init__(self, concurrency: int = AI_CONCURRENCY, weights: Optional[Dict[str, float]] = None):
+        self.concurrency = concurrency
+        self.weights = weights or TASK_WEIGHTS
+        self.active = 0
+        self._queue: List[Tuple[float, int, asyncio.Future]] = []
+        self._finish: Dict[Tuple[str, str], float] = {}  # Last finish tag per flow
+        self._virtual = 0.0
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, waiter in self._queue if not waiter.done())
+
+    def _tag(self, flow: Tuple[str, str]) -> Tuple[float, float]:
+        start = max(self._virtual, self._finish.get(flow, 0.0))
+        finish = start + 1.0 / self.weights.get(flow[1], 1.0)
+        self._finish[flow] = finish
+        if len(self._finish) > 10000:
+            # Flows behind the virtual clock would restart from it anyway
+            self._finish = {f: t for f, t in self._finish.items() if t > self._virtual}
+        return start, finish
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, task: str) -> AsyncIterator[None]:
+        start, finish = self._tag((user_id, task))
+        if self.active < self.concurrency:
+            # Free slots only exist while nothing is waiting
+            self.active += 1
+            self._virtual = max(self._virtual, start)
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queue, (finish, next(self._seq), waiter))
+            try:
+                self._virtual = max(self._virtual, await waiter)
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._release()  # Handed a slot just as we were cancelled: pass it on
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        while self._queue:
+            finish, _, waiter = heapq.heappop(self._queue)
+            if not waiter.done():
+                waiter.set_result(finish)  # The slot passes straight to the next call
+                return
+        self.active -= 1
+
+
+def response_tokens(response: Any) -> Tuple[int, int]:
+    """(input, output) tokens reported by a generate_content response."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return 0, 0
+    return (getattr(usage, "prompt_token_count", None) or 0, getattr(usage, "candidates_token_count", None) or 0)
+
+async def record_usage(user_id: Optional[str], task: str, response: Any) -> None:
+    """ModelRouter hook: charge one successful call to its user."""
+    if user_id is None:
+        return
+    from database import db
+    input_tokens, output_tokens = response_tokens(response)
+    try:
+        await db.add_ai_usage(user_id, usage_day(), task, input_tokens, output_tokens)
+    except Exception as e:
+        # Losing one row of accounting is better than failing a call that already succeeded
+        print(f"AI usage accounting failed for {user_id}: {e}")
+
+async def check_ai_budget(user_id: str) -> Optional[str]:
+    """Error message if the user has used up today's AI budget."""
+    if not AI_DAILY_REQUESTS and not AI_DAILY_TOKENS:
+        return None
+    from database import db
+    requests, tokens = await db.get_ai_usage(user_id, usage_day())
+    if AI_DAILY_REQUESTS and requests >= AI_DAILY_REQUESTS:
+        return f"Daily AI request limit reached: {requests} of {AI_DAILY_REQUESTS} used"
+    if AI_DAILY_TOKENS and tokens >= AI_DAILY_TOKENS:
+        return f"Daily AI token limit reached: {tokens} of {AI_DAILY_TOKENS} used"
+    return None
+
+async def require_ai_budget(current_user: User = Depends(get_current_user)) -> User:
+    """get_current_user for routes that call the model; 429 once the user's daily budget is spent."""
+    error = await check_ai_budget(current_user.id)
+    if error:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=error,
+            headers={"Retry-After": str(seconds_until_reset())},
+        )
+    return current_user
@@ -32,7 +32,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(request: Request) -> User:
+def get_token_username(request: Request) -> str:
+    """Username from the session cookie, without a database lookup."""
     token = request.cookies.get("access_token")
     if not token:
         raise HTTPException(
@@ -46,7 +47,10 @@ async def get_current_user(request: Request) -> User:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     except PyJWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    
+    return username
+
+async def get_current_user(request: Request) -> User:
+    username = get_token_username(request)
     user = await db.get_user_by_username(username)
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
@@ -0,0 +1,138 @@
+"""
+Database size and read latency with chunks stored as JSON vs compressed (chunk_codec).
+
+Builds a library (or copies a real one with --db), rewrites every story in the old
+format (chunks as JSON, formattedText duplicated), measures, then runs the migration
+that compresses them and measures again. Sizes are after VACUUM; the file includes the
+full-text index, which is unchanged.
+
+Synthetic books are pages of words drawn at random from Python's pydoc topics, one page
+image link each, with formattedText equal to text as after OCR. Without real phrases they
+compress worse than prose (2.8x vs 4.1x for the pydoc text itself with zstd), so the
+savings are a lower bound.
+
+    cd backend && python benchmarks/bench_chunk_storage.py [--stories 20] [--pages 300] [--zlib]
+    cd backend && python benchmarks/bench_chunk_storage.py --db /data/focusread.db
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+
+from sqlalchemy import null, select, text, update
+from database import db, engine
+from db_models import DBLibraryItem
+from migrations import _compress_chunks
+from models import Chunk, LibraryItem, SessionStats
+import chunk_codec
+
+PAGE_CHARS = 2500
+
+def vocabulary() -> List[str]:
+    import pydoc_data.topics
+    return " ".join(pydoc_data.topics.topics.values()).split()
+
+def page(rng: random.Random, words: List[str]) -> str:
+    out, size = [], 0
+    while size < PAGE_CHARS:
+        word = rng.choice(words)
+        out.append(word)
+        size += len(word) + 1
+    return " ".join(out)
+
+def make_story(n: int, pages: int, words: List[str]) -> LibraryItem:
+    rng = random.Random(n)
+    chunks = []
+    for i in range(pages):
+        page_text = f"![Page {i + 1}](/uploads/bench-{n}/{i + 1}.jpg)\n\n{page(rng, words)}"
+        chunks.append(Chunk(id=i, text=page_text, formattedText=page_text, isProcessed=True))
+    return LibraryItem(
+        id=f"bench-{n}", title=f"Book {n}", chunks=chunks, chapters=[], currentIndex=0,
+        stats=SessionStats(correctAnswers=0, totalQuestions=0, startTime=0, wordCount=0),
+        elapsedTime=0, lastRead=0, isComplete=False,
+    )
+
+async def to_json_format() -> None:
+    """Rewrite every story the way it was stored before chunk compression."""
+    async with engine.begin() as conn:
+        rows = (await conn.execute(select(DBLibraryItem.id, DBLibraryItem.chunk_data).where(DBLibraryItem.chunk_data.is_not(None)))).all()
+        for story_id, data in rows:
+            await conn.execute(
+                update(DBLibraryItem).where(DBLibraryItem.id == story_id)
+                .values(chunks=chunk_codec.decode(data), chunk_data=null(), chunk_count=null())
+            )
+
+async def compress() -> None:
+    async with engine.begin() as conn:
+        await _compress_chunks(conn)
+
+async def measure() -> dict:
+    async with engine.connect() as conn:
+        await conn.execute(text("VACUUM"))
+        stories = (await conn.execute(select(DBLibraryItem.id, DBLibraryItem.user_id))).all()
+        stored = (await conn.execute(text(
+            "SELECT SUM(COALESCE(LENGTH(chunk_data), LENGTH(CAST(chunks AS TEXT)), 0)) FROM library_items"
+        ))).scalar()
+    raw, model = [], []
+    for _ in range(5):
+        for story_id, user_id in stories:
+            start = time.perf_counter()
+            await db.get_story_json(story_id, user_id)
+            raw.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            await db.get_story(story_id, user_id)
+            model.append(time.perf_counter() - start)
+    return {
+        "file": os.path.getsize(DB_PATH),
+        "chunks": stored or 0,
+        "raw": statistics.median(raw) * 1000,
+        "model": statistics.median(model) * 1000,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stories", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--db", help="copy of a real focusread.db to measure instead")
+    parser.add_argument("--zlib", action="store_true", help="compress as without zstandard installed")
+    args = parser.parse_args()
+    if args.zlib:
+        chunk_codec.zstandard = None
+
+    if args.db:
+        shutil.copy(args.db, DB_PATH)
+        await db.init_db()
+        print(f"Library from {args.db}")
+    else:
+        await db.init_db()
+        words = vocabulary()
+        for n in range(args.stories):
+            await db.create_story(make_story(n, args.pages, words), "bench-user")
+        print(f"{args.stories} stories x {args.pages} pages")
+
+    await to_json_format()
+    before = await measure()
+    start = time.perf_counter()
+    await compress()
+    migrate = time.perf_counter() - start
+    after = await measure()
+
+    print(f"{'':<10}{'db file':>12}{'chunk bytes':>14}{'get_story_json ms':>20}{'get_story ms':>15}")
+    codec = "zstd" if chunk_codec.zstandard is not None else "zlib"
+    for name, r in (("json", before), (codec, after)):
+        print(f"{name:<10}{r['file'] / 1e6:>10.1f}MB{r['chunks'] / 1e6:>12.1f}MB{r['raw']:>20.2f}{r['model']:>15.2f}")
+    print(f"migration: {migrate:.1f}s")
+
+if __name__ == "__main__":
+    asyncio.run(main())
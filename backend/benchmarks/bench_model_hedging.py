@@ -0,0 +1,75 @@
+"""
+Tail latency of model calls with and without hedging, against a fake client.
+
+Latencies are drawn from a lognormal body (median ~1.2s) with a slow tail: a fraction
+of calls (--tail-rate) takes 8-20s, as when a request lands on an overloaded replica.
+Time is scaled down by --scale so a run takes seconds.
+
+    cd backend && python benchmarks/bench_model_hedging.py [--calls 400]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_client import FakeClient
+from model_router import ModelRouter, Route
+
+def latency_sampler(rng: random.Random, tail_rate: float, scale: float):
+    def sample(model):
+        if rng.random() < tail_rate:
+            return rng.uniform(8, 20) * scale
+        return rng.lognormvariate(0.2, 0.35) * scale
+    return sample
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+async def run(hedge: bool, args) -> dict:
+    client = FakeClient(latency=latency_sampler(random.Random(args.seed), args.tail_rate, args.scale))
+    router = ModelRouter(
+        client_factory=lambda: client,
+        routes={"quiz": Route("primary", None, hedge=hedge)},
+        hedge_min_samples=20,
+    )
+    semaphore = asyncio.Semaphore(args.concurrency)
+    loop = asyncio.get_running_loop()
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = loop.time()
+            await router.generate("quiz", "prompt")
+            latencies.append((loop.time() - start) / args.scale)
+
+    await asyncio.gather(*(one() for _ in range(args.calls)))
+    return {
+        "p50": statistics.median(latencies),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "extra": (len(client.calls) - args.calls) / args.calls,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tail-rate", type=float, default=0.03)
+    parser.add_argument("--scale", type=float, default=0.01, help="real seconds per simulated second")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.calls} calls, {args.tail_rate:.0%} slow tail, latencies in simulated seconds")
+    print(f"{'mode':<10}{'p50':>8}{'p95':>8}{'p99':>8}{'extra req':>11}")
+    for hedge in (False, True):
+        r = asyncio.run(run(hedge, args))
+        mode = "hedged" if hedge else "single"
+        print(f"{mode:<10}{r['p50']:>8.2f}{r['p95']:>8.2f}{r['p99']:>8.2f}{r['extra']:>10.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+OCR throughput and token cost: one page per model call vs several pages per call.
+
+  single   - ocr.ocr_page for every page (OCR_CONCURRENCY calls in flight)
+  batched  - ocr.ocr_pages with --batch pages per call, same concurrency
+
+By default the model is ai_client.FakeClient with a latency model of a fixed per-call
+overhead, a per-image cost and an output rate, so a run takes seconds (--scale).
+Tokens are FakeClient's estimates: ~4 characters per token, 258 per image.
+
+With --live, pages of --pdf are rendered with pdftoppm and sent to the real model
+(GEMINI_API_KEY); tokens are the usage the API reports.
+
+    cd backend && python benchmarks/bench_ocr_batching.py [--pages 40] [--batch 5]
+    cd backend && python benchmarks/bench_ocr_batching.py --live --pdf book.pdf --pages 12
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_client import FakeClient, estimate_tokens
+from model_router import ModelRouter, default_routes
+from pdf_pipeline import OCR_CONCURRENCY
+import ocr
+
+PAGE_TEXT = "The keeper climbed the spiral stair and trimmed the wick before the storm came in. " * 20
+
+class SimulatedClient(FakeClient):
+    """FakeClient whose latency depends on the request: overhead + images + output tokens."""
+    def __init__(self, args):
+        super().__init__(latency=self.seconds, respond=self.transcribe)
+        self.args = args
+
+    def transcribe(self, model, contents):
+        if contents[0] == ocr.OCR_BATCH_PROMPT:
+            pages = [int(c[5:-1]) for c in contents if isinstance(c, str) and c.startswith("Page ")]
+            return json.dumps([{"page": n, "text": PAGE_TEXT} for n in pages])
+        return PAGE_TEXT
+
+    async def _generate_content(self, model, contents, config=None):
+        self.contents = contents  # Read by seconds(); set and used before the first await
+        return await super()._generate_content(model, contents, config)
+
+    def seconds(self, model):
+        images = sum(1 for c in self.contents if not isinstance(c, str))
+        output = estimate_tokens(self.transcribe(model, self.contents))
+        return (self.args.overhead + images * self.args.per_image + output / self.args.output_rate) * self.args.scale
+
+def sample_jpeg() -> bytes:
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (850, 1100), "white").save(buffer, "JPEG")
+    return buffer.getvalue()
+
+def render_pages(pdf_path: str, pages: int):
+    from pdf_pipeline import render_page
+    return [(n, render_page(pdf_path, n)) for n in range(1, pages + 1)]
+
+async def run(pages, batch: int, concurrency: int, client) -> dict:
+    tokens = []
+
+    async def count(user_id, task, response):
+        usage = response.usage_metadata
+        tokens.append((usage.prompt_token_count or 0) + (usage.candidates_token_count or 0))
+
+    # Fresh router per run: no hedging or fallback, so every call is exactly one request
+    routes = {task: route._replace(fallback=None, hedge=False) for task, route in default_routes().items()}
+    ocr.models = ModelRouter(client_factory=lambda: client, routes=routes, on_usage=count)
+    ocr.get_client = lambda: client
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(group):
+        async with semaphore:
+            if batch == 1:
+                n, jpeg = group[0]
+                return {n: await ocr.ocr_page(jpeg, n)}
+            return await ocr.ocr_pages(group)
+
+    groups = [pages[i:i + batch] for i in range(0, len(pages), batch)]
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(g) for g in groups))
+    elapsed = time.perf_counter() - start
+    done = sum(1 for r in results for text in r.values() if text)
+    return {"seconds": elapsed, "pages": done, "calls": len(tokens), "tokens": sum(tokens)}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--batch", type=int, default=5, help="pages per batched call")
+    parser.add_argument("--concurrency", type=int, default=OCR_CONCURRENCY)
+    parser.add_argument("--overhead", type=float, default=0.8, help="simulated seconds per call")
+    parser.add_argument("--per-image", type=float, default=0.1, help="simulated seconds per page image")
+    parser.add_argument("--output-rate", type=float, default=200, help="simulated output tokens per second")
+    parser.add_argument("--scale", type=float, default=0.01, help="real seconds per simulated second")
+    parser.add_argument("--live", action="store_true")
+    parser.add_argument("--pdf")
+    args = parser.parse_args()
+
+    if args.live:
+        from ai_client import get_client
+        if not args.pdf or not get_client():
+            sys.exit("--live needs --pdf and GEMINI_API_KEY")
+        pages = render_pages(args.pdf, args.pages)
+        client, scale = get_client(), 1.0
+        print(f"{len(pages)} pages of {args.pdf}, live model, concurrency {args.concurrency}")
+    else:
+        jpeg = sample_jpeg()
+        pages = [(n, jpeg) for n in range(1, args.pages + 1)]
+        client, scale = SimulatedClient(args), args.scale
+        print(f"{len(pages)} pages, simulated: {args.overhead}s/call + {args.per_image}s/image + "
+              f"{args.output_rate:.0f} output tokens/s, concurrency {args.concurrency}")
+
+    print(f"{'mode':<12}{'calls':>7}{'pages/s':>10}{'tokens/page':>13}")
+    for batch in (1, args.batch):
+        r = asyncio.run(run(pages, batch, args.concurrency, client))
+        mode = "single" if batch == 1 else f"batched x{batch}"
+        pages_per_second = r["pages"] / (r["seconds"] / scale)
+        print(f"{mode:<12}{r['calls']:>7}{pages_per_second:>10.2f}{r['tokens'] / max(1, r['pages']):>13.0f}")
+
+if __name__ == "__main__":
+    main()
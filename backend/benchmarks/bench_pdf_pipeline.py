@@ -0,0 +1,101 @@
+"""
+Wall time per page for rendering + OCR, with and without the render/OCR pipeline.
+
+  sequential - the old loop: convert_from_path on one core for the whole batch,
+               then OCR page by page
+  pipeline   - pdf_pipeline.render_and_ocr: pages rendered in a process pool,
+               each OCR'd as soon as it is rasterized
+
+OCR is simulated with a fixed network latency so only rendering costs CPU.
+Requires poppler (pdftoppm). Without a PDF argument, a synthetic scanned PDF is generated.
+
+    cd backend && python benchmarks/bench_pdf_pipeline.py [--pdf book.pdf] [--pages 300] [--batch 5] [--ocr-latency 0.5]
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_pipeline import render_and_ocr, RENDER_DPI, RENDER_WORKERS, OCR_CONCURRENCY
+
+def make_scanned_pdf(path: str, pages: int) -> None:
+    from PIL import Image, ImageDraw
+    rng = random.Random(0)
+    images = []
+    for n in range(pages):
+        # Letter page at 150 dpi with grey noise and lines of "text", like a scan
+        page = Image.effect_noise((1275, 1650), 24).point(lambda v: 200 + v // 5).convert("RGB")
+        draw = ImageDraw.Draw(page)
+        for line in range(45):
+            y = 120 + line * 32
+            draw.text((110, y), " ".join("lorem" * rng.randint(1, 3) for _ in range(12)), fill=(20, 20, 20))
+        draw.text((620, 1580), str(n + 1), fill=(0, 0, 0))
+        images.append(page)
+    images[0].save(path, save_all=True, append_images=images[1:], resolution=150)
+
+def fake_ocr(latency: float):
+    def ocr(jpeg, page_num):
+        time.sleep(latency)
+        return "text"
+    return ocr
+
+def run_sequential(pdf_path: str, pages: int, batch: int, latency: float) -> float:
+    from pdf2image import convert_from_path
+    ocr = fake_ocr(latency)
+    start = time.perf_counter()
+    for first in range(1, pages + 1, batch):
+        last = min(first + batch - 1, pages)
+        images = convert_from_path(pdf_path, first_page=first, last_page=last, dpi=RENDER_DPI)
+        for offset, image in enumerate(images):
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG")
+            ocr(buffer.getvalue(), first + offset)
+    return time.perf_counter() - start
+
+async def run_pipeline(pdf_path: str, pages: int, batch: int, latency: float) -> float:
+    ocr = fake_ocr(latency)
+    start = time.perf_counter()
+    for first in range(1, pages + 1, batch):
+        last = min(first + batch - 1, pages)
+        async for _ in render_and_ocr(pdf_path, range(first, last + 1), ocr=ocr):
+            pass
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--batch", type=int, default=5, help="pages per /process call")
+    parser.add_argument("--ocr-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    if not shutil.which("pdftoppm"):
+        sys.exit("pdftoppm not found: install poppler-utils")
+
+    pdf_path = args.pdf
+    if not pdf_path:
+        pdf_path = os.path.join(tempfile.mkdtemp(), "scanned.pdf")
+        print(f"Generating {args.pages}-page scanned PDF...")
+        make_scanned_pdf(pdf_path, args.pages)
+
+    from pdf2image import pdfinfo_from_path
+    pages = min(args.pages, pdfinfo_from_path(pdf_path)["Pages"])
+    print(f"{pages} pages, batch {args.batch}, OCR latency {args.ocr_latency}s, "
+          f"{RENDER_WORKERS} render workers, OCR concurrency {OCR_CONCURRENCY}")
+
+    sequential = run_sequential(pdf_path, pages, args.batch, args.ocr_latency)
+    pipelined = asyncio.run(run_pipeline(pdf_path, pages, args.batch, args.ocr_latency))
+
+    print(f"{'mode':<12}{'total s':>10}{'ms/page':>10}")
+    print(f"{'sequential':<12}{sequential:>10.1f}{sequential / pages * 1000:>10.0f}")
+    print(f"{'pipeline':<12}{pipelined:>10.1f}{pipelined / pages * 1000:>10.0f}")
+
+if __name__ == "__main__":
+    main()
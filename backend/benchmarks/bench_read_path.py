@@ -0,0 +1,63 @@
+"""
+CPU per GET /stories/{id} for a 1,000-chunk story: Pydantic round-trip vs raw DB JSON.
+
+The "pydantic" column is what the read path used to do: build Chunk/Chapter objects
+from the row, then let FastAPI validate and serialize them again via response_model.
+The "raw" column is Database.get_story_json.
+
+    cd backend && python benchmarks/bench_read_path.py [chunks]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+
+from pydantic import TypeAdapter
+from database import db
+from models import LibraryItem
+from responses import dumps
+from bench_story_payload import make_story
+
+async def timed(fn, repeat: int = 20) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        await fn()
+        best = min(best, time.process_time() - start)
+    return best * 1000
+
+async def main():
+    chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    await db.init_db()
+    story = make_story(chunks)
+    await db.create_story(story, "bench-user")
+    adapter = TypeAdapter(LibraryItem)
+
+    async def pydantic_path():
+        item = await db.get_story(story.id, "bench-user")
+        # FastAPI response_model: validate, then dump to JSON-compatible data and render
+        value = adapter.validate_python(item)
+        return dumps(adapter.dump_python(value, mode="json"))
+
+    async def raw_path():
+        return await db.get_story_json(story.id, "bench-user")
+
+    assert json.loads(await pydantic_path()) == json.loads(await raw_path())
+    size = len(await raw_path())
+    slow = await timed(pydantic_path)
+    fast = await timed(raw_path)
+    print(f"{chunks}-chunk story, {size} bytes")
+    print(f"{'path':<12}{'cpu ms':>10}")
+    print(f"{'pydantic':<12}{slow:>10.2f}")
+    print(f"{'raw':<12}{fast:>10.2f}")
+    print(f"speedup {slow / fast:.1f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
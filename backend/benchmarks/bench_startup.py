@@ -0,0 +1,59 @@
+"""
+Cold-start cost of the API, split into import and initialization phases.
+
+Each measurement runs in a fresh interpreter, like a new container:
+  import   - `import main` (routers, models, database engine)
+  init     - db.init_db() on a brand-new database (creates schema)
+  re-init  - db.init_db() on an existing database (stored schema version matches)
+
+    cd backend && python benchmarks/bench_startup.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import asyncio, json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from database import db
+asyncio.run(db.init_db())
+done = time.perf_counter()
+heavy = [m for m in ("google.genai", "pdf2image", "PIL", "pypdf") if m in sys.modules]
+print(json.dumps({"import": imported - start, "init": done - imported, "heavy": heavy}))
+"""
+
+def run_child(db_path: str) -> dict:
+    env = dict(os.environ, DATABASE_URL=f"sqlite+aiosqlite:///{db_path}")
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    imports, fresh, existing, heavy = [], [], [], set()
+    for _ in range(runs):
+        db_path = os.path.join(tempfile.mkdtemp(), "startup.db")
+        first = run_child(db_path)
+        second = run_child(db_path)
+        imports.extend([first["import"], second["import"]])
+        fresh.append(first["init"])
+        existing.append(second["init"])
+        heavy.update(first["heavy"])
+
+    print(f"{'phase':<10}{'median ms':>12}")
+    print(f"{'import':<10}{statistics.median(imports) * 1000:>12.1f}")
+    print(f"{'init':<10}{statistics.median(fresh) * 1000:>12.1f}")
+    print(f"{'re-init':<10}{statistics.median(existing) * 1000:>12.1f}")
+    print(f"heavy modules loaded at startup: {sorted(heavy) or 'none'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Response size and serialization CPU for a large story payload.
+
+Builds a synthetic 500-page LibraryItem (OCR-sized chunks) and compares the
+stdlib JSON path FastAPI uses by default with orjson, plus gzip/brotli sizes.
+
+    cd backend && python benchmarks/bench_story_payload.py [pages]
+"""
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import LibraryItem, Chunk, Chapter, SessionStats
+from compression import compress, brotli
+from responses import orjson
+
+WORDS = (
+    "the reader turned page and found chapter theory evidence history argument "
+    "light water city river mountain between because however although would could "
+    "system method result figure table section analysis language memory attention"
+).split()
+
+def make_story(pages: int, words_per_page: int = 350) -> LibraryItem:
+    rng = random.Random(42)
+    chunks = []
+    for i in range(pages):
+        body = " ".join(rng.choice(WORDS) for _ in range(words_per_page))
+        text = f"![Page {i + 1}](/uploads/bench-story/{i + 1}.jpg)\n\n{body}"
+        chunks.append(Chunk(id=i, text=text, formattedText=text, isProcessed=True))
+    chapters = [Chapter(title=f"Chapter {n + 1}", pageIndex=n * 25) for n in range(pages // 25)]
+    return LibraryItem(
+        id="bench-story",
+        title="Benchmark Book",
+        chunks=chunks,
+        chapters=chapters,
+        currentIndex=0,
+        stats=SessionStats(correctAnswers=0, totalQuestions=0, startTime=0, wordCount=0),
+        elapsedTime=0,
+        lastRead=0,
+        isComplete=False,
+    )
+
+def timed(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    story = make_story(pages)
+    data = story.model_dump(mode="json")
+
+    def stdlib():
+        # What JSONResponse.render does
+        return json.dumps(data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+    body = stdlib()
+    print(f"{pages}-page story, {len(story.chunks)} chunks")
+    print(f"{'serializer':<28}{'ms':>10}")
+    print(f"{'json.dumps (default)':<28}{timed(stdlib):>10.2f}")
+    if orjson is not None:
+        print(f"{'orjson.dumps':<28}{timed(lambda: orjson.dumps(data)):>10.2f}")
+    print(f"{'model_dump (dict build)':<28}{timed(lambda: story.model_dump(mode='json')):>10.2f}")
+
+    print()
+    print(f"{'encoding':<28}{'bytes':>12}{'ratio':>8}{'ms':>10}")
+    print(f"{'identity':<28}{len(body):>12}{1.0:>8.2f}{0.0:>10.2f}")
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    for encoding in encodings:
+        size = len(compress(body, encoding))
+        ms = timed(lambda: compress(body, encoding), repeat=3)
+        print(f"{encoding:<28}{size:>12}{len(body) / size:>8.2f}{ms:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import json
+import os
+import zlib
+from typing import Any, Dict, List
+
+from responses import dumps, orjson
+
+try:
+    import zstandard
+except ImportError:  # Optional; stories are written with zlib without it
+    zstandard = None
+
+# At-rest format of a story's chunks (library_items.chunk_data).
+#
+# One format byte, then the chunk list as JSON compressed as a single stream: zstd when
+# zstandard is installed, zlib otherwise. Both are always readable, except zstd rows
+# without zstandard. formattedText is left out when it equals text (every OCR'd page
+# until the client formats it) and restored on decode.
+#
+# Compressing the whole book at once lets the compressor find repetition between pages.
+# A zstd dictionary trained on other books saved under 10% on whole-book blobs, and
+# per-page blobs with a dictionary came out larger than the whole book without one.
+# Dictionaries would have to be stored and versioned, so no dictionary is used.
+# update_story rewrites the blob on every save, so the level favours speed.
+# See benchmarks/bench_chunk_storage.py.
+
+CHUNK_COMPRESSION_LEVEL = int(os.getenv("CHUNK_COMPRESSION_LEVEL", "3"))
+# Books with more text than this are compressed in a worker thread so saving one doesn't stall the event loop
+THREAD_THRESHOLD = 256 * 1024
+# ...and decoded in one when chunk_data is larger than this (books compress 3-4x)
+DECODE_THREAD_THRESHOLD = THREAD_THRESHOLD // 4
+
+FORMAT_ZLIB = 1
+FORMAT_ZSTD = 2
+
+def encode(chunks: List[Dict[str, Any]], level: int = CHUNK_COMPRESSION_LEVEL) -> bytes:
+    """Chunk dicts (Chunk.model_dump()) to their stored form."""
+    deduped = [
+        {k: v for k, v in c.items() if k != "formattedText" or v != c["text"]}
+        for c in chunks
+    ]
+    body = dumps(deduped)
+    if zstandard is not None:
+        return bytes([FORMAT_ZSTD]) + zstandard.ZstdCompressor(level=level).compress(body)
+    return bytes([FORMAT_ZLIB]) + zlib.compress(body, level)
+
+def decode(data: bytes) -> List[Dict[str, Any]]:
+    """Stored form back to chunk dicts, keys in Chunk's field order."""
+    fmt = data[0] if data else None
+    if fmt == FORMAT_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Story chunks are zstd-compressed; install zstandard to read them")
+        raw = zstandard.ZstdDecompressor().decompress(data[1:])
+    elif fmt == FORMAT_ZLIB:
+        raw = zlib.decompress(data[1:])
+    else:
+        raise ValueError(f"Unknown chunk format {data[:1]!r}")
+    chunks = orjson.loads(raw) if orjson is not None else json.loads(raw)
+    return [c if "formattedText" in c else {"text": c["text"], "formattedText": c["text"], **c} for c in chunks]
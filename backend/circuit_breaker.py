@@ -0,0 +1,120 @@
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, NamedTuple
+
+# Circuit breaker for the model API.
+#
+# closed     Calls go through; the outcome of the last AI_BREAKER_WINDOW calls is kept.
+#            Once at least AI_BREAKER_MIN_CALLS are recorded and either the error rate or
+#            the rate of calls slower than AI_BREAKER_SLOW_SECONDS reaches AI_BREAKER_RATE,
+#            the breaker opens.
+# open       Calls fail immediately with CircuitOpenError for AI_BREAKER_COOLDOWN seconds.
+# half-open  One probe call is let through; success closes the breaker, failure reopens it.
+#            Outcomes of other calls (started before the breaker opened) are ignored.
+#
+# While the API is down this turns each model call (and each OCR page) from a full timeout
+# into an immediate error, so requests don't pile up waiting on it.
+
+AI_BREAKER_WINDOW = int(os.getenv("AI_BREAKER_WINDOW", "20"))
+AI_BREAKER_MIN_CALLS = int(os.getenv("AI_BREAKER_MIN_CALLS", "10"))
+AI_BREAKER_RATE = float(os.getenv("AI_BREAKER_RATE", "0.5"))
+AI_BREAKER_SLOW_SECONDS = float(os.getenv("AI_BREAKER_SLOW_SECONDS", "30"))
+AI_BREAKER_COOLDOWN = float(os.getenv("AI_BREAKER_COOLDOWN", "30"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+class CircuitOpenError(Exception):
+    """The model API is failing; retry after `retry_after` seconds."""
+    def __init__(self, retry_after: float):
+        super().__init__(f"AI service unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+class Outcome(NamedTuple):
+    ok: bool
+    slow: bool
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        window: int = AI_BREAKER_WINDOW,
+        min_calls: int = AI_BREAKER_MIN_CALLS,
+        rate: float = AI_BREAKER_RATE,
+        slow_seconds: float = AI_BREAKER_SLOW_SECONDS,
+        cooldown: float = AI_BREAKER_COOLDOWN,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.min_calls = min_calls
+        self.rate = rate
+        self.slow_seconds = slow_seconds
+        self.cooldown = cooldown
+        self.clock = clock
+        self.outcomes: Deque[Outcome] = deque(maxlen=window)
+        self.opened_at = 0.0
+        self._state = CLOSED
+        self._probing = False
+        self.rejected = 0  # Calls failed fast while open
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self.clock() - self.opened_at >= self.cooldown:
+            self._state = HALF_OPEN
+        return self._state
+
+    def retry_after(self) -> float:
+        """Seconds until calls are let through again (0 when closed)."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.cooldown - (self.clock() - self.opened_at))
+
+    def before_call(self) -> bool:
+        """
+        Raise CircuitOpenError unless a call may go ahead now. Returns True if the call is the
+        half-open probe: its caller must pass probe=True to record(), or call release_probe().
+        """
+        state = self.state
+        if state == CLOSED:
+            return False
+        if state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        raise CircuitOpenError(self.retry_after() or self.cooldown)
+
+    def record(self, ok: bool, seconds: float, probe: bool = False) -> None:
+        if self._state == OPEN:
+            return  # Calls that started before the breaker opened
+        if self._state == HALF_OPEN:
+            if not probe:
+                return  # Same, finishing after the cooldown: only the probe decides
+            self._probing = False
+            if ok and seconds < self.slow_seconds:
+                self._close()
+            else:
+                self._open()
+            return
+
+        self.outcomes.append(Outcome(ok, seconds >= self.slow_seconds))
+        if len(self.outcomes) < self.min_calls:
+            return
+        errors = sum(1 for o in self.outcomes if not o.ok) / len(self.outcomes)
+        slow = sum(1 for o in self.outcomes if o.slow) / len(self.outcomes)
+        if errors >= self.rate or slow >= self.rate:
+            self._open()
+
+    def release_probe(self) -> None:
+        """The probe ended without an outcome (cancelled, or never got a slot): let another call probe."""
+        self._probing = False
+
+    def _open(self) -> None:
+        if self._state != OPEN:
+            print(f"AI circuit breaker open for {self.cooldown:.0f}s")
+        self._state = OPEN
+        self.opened_at = self.clock()
+        self.outcomes.clear()
+
+    def _close(self) -> None:
+        print("AI circuit breaker closed")
+        self._state = CLOSED
+        self.outcomes.clear()
@@ -0,0 +1,128 @@
+import gzip
+import os
+from typing import Optional, Tuple
+
+import anyio
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip is always available
+    brotli = None
+
+# JSON bodies smaller than this are sent as-is; compressing them costs more than it saves
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # Good ratio at gzip-like speed; 11 is far too slow for per-request use
+# Bodies above this are compressed in a worker thread so a big book doesn't stall the event loop
+THREAD_THRESHOLD = 256 * 1024
+
+COMPRESSIBLE_TYPES = ("application/json",)
+
+def choose_encoding(accept_encoding: str, available: Optional[Tuple[str, ...]] = None) -> Optional[str]:
+    """
+    Pick the best encoding from an Accept-Encoding header: among `available` (already
+    compressed bodies), or by default among those we can compress with.
+    """
+    accepted = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if token:
+            accepted[token.lower()] = quality
+
+    def ok(name: str) -> bool:
+        return accepted.get(name, accepted.get("*", 0.0)) > 0
+
+    if available is None:
+        available = ("br", "gzip") if brotli is not None else ("gzip",)
+    if "br" in available and ok("br"):
+        return "br"
+    if "gzip" in available and ok("gzip"):
+        return "gzip"
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing JSON responses with brotli or gzip.
+    Only complete (non-streamed) bodies of at least `minimum_size` bytes are compressed.
+    """
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                response_headers = {k.lower(): v for k, v in message.get("headers", [])}
+                content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+                if (
+                    b"content-encoding" in response_headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Hold the headers until we see the body and know its size
+                    start_message = message
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streaming or small: send unchanged
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            if len(body) >= THREAD_THRESHOLD:
+                compressed = await anyio.to_thread.run_sync(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            vary = [v for k, v in start_message.get("headers", []) if k.lower() == b"vary"]
+            raw_headers = [
+                (k, v) for k, v in start_message.get("headers", [])
+                if k.lower() not in (b"content-length", b"content-encoding", b"vary", b"etag")
+            ]
+            # A strong ETag promises these exact bytes, which the compressed body isn't.
+            # Weak still revalidates: etag_matches() compares If-None-Match weakly.
+            for k, v in start_message.get("headers", []):
+                if k.lower() == b"etag":
+                    raw_headers.append((k, v if v.startswith(b"W/") else b"W/" + v))
+            raw_headers.append((b"content-length", str(len(compressed)).encode()))
+            raw_headers.append((b"content-encoding", encoding.encode()))
+            raw_headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+            await send({**start_message, "headers": raw_headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,45 +1,82 @@
 import os
 from contextlib import asynccontextmanager
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, update, delete, cast, func, null, Text
 
-from models import LibraryItem, ReadingSettings
-from db_models import Base, DBLibraryItem, DBReadingSettings, DBUser
+from models import LibraryItem, ReadingSettings, Chunk, SearchResults, PdfMetadata, Bootstrap, LibrarySummary, SessionStats, User, ReadingDay, ReadingEvent
+from db_models import DBAIUsage, DBLibraryItem, DBReadingDaily, DBReadingEvent, DBReadingSettings, DBStoryDocument, DBUploadSession, DBUser
+from migrations import run_migrations
+import anyio
+
+import chunk_codec
+import reading_log
+import search
+from responses import dumps, raw_json
 
 # Default to local SQLite if not provided
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./focusread.db")
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+def _normalize_url(url: str) -> str:
+    # Managed Postgres providers hand out postgres:// URLs; we need the asyncpg driver
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+def _engine_options(url: str) -> dict:
+    if url.startswith("postgresql"):
+        # Several API replicas share one server: keep per-replica pools small and drop dead connections
+        return {
+            "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "5")),
+            "pool_pre_ping": True,
+        }
+    return {}
+
+DATABASE_URL = _normalize_url(DATABASE_URL)
+engine = create_async_engine(DATABASE_URL, echo=False, **_engine_options(DATABASE_URL))
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
+def _dialect_insert(table):
+    # INSERT with on_conflict_do_update(), for counters kept by upsert
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(table)
+
+DEFAULT_SETTINGS = ReadingSettings(theme='light', fontSize='md', alignment='left', lineHeight='normal', width='standard')
+DEFAULT_STATS = SessionStats(correctAnswers=0, totalQuestions=0, startTime=0, wordCount=0)
+
 class Database:
     """
     Database interface using SQLAlchemy AsyncSession.
     """
     async def init_db(self):
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
-        await self._migrate_db()
-
-    async def _migrate_db(self):
-        # Simple migration system for SQLite
-        from sqlalchemy import text
-        async with engine.begin() as conn:
-            try:
-                # Check for chapters column in library_items
-                result = await conn.execute(text("PRAGMA table_info(library_items)"))
-                columns = [row[1] for row in result.fetchall()]
-                
-                if "library_items" in columns: # Wait, logic error. table name? No, PRAGMA returns columns of the table.
-                     pass 
-
-                if columns and "chapters" not in columns:
-                    print("Migrating: Adding 'chapters' column to library_items")
-                    await conn.execute(text("ALTER TABLE library_items ADD COLUMN chapters JSON DEFAULT '[]'"))
-            except Exception as e:
-                print(f"Migration error (ignored): {e}")
+        await run_migrations(engine)
+
+    async def _chunk_columns(self, chunks: List[Chunk]) -> dict:
+        """library_items values for a story's chunks, compressed (see chunk_codec.py)."""
+        dicts = [c.model_dump() for c in chunks]
+        if sum(len(c.text) for c in chunks) >= chunk_codec.THREAD_THRESHOLD:
+            data = await anyio.to_thread.run_sync(chunk_codec.encode, dicts)
+        else:
+            data = chunk_codec.encode(dicts)
+        return {"chunks": null(), "chunk_data": data, "chunk_count": len(chunks)}
+
+    @staticmethod
+    async def _decoding(chunk_bytes: int, fn, *args):
+        """fn(*args), in a worker thread if it decodes more than DECODE_THREAD_THRESHOLD bytes of chunk_data."""
+        if chunk_bytes >= chunk_codec.DECODE_THREAD_THRESHOLD:
+            return await anyio.to_thread.run_sync(fn, *args)
+        return fn(*args)
+
+    @staticmethod
+    def _chunk_dicts(chunk_data: Optional[bytes], chunks: Optional[list]) -> list:
+        # Rows written before chunk compression keep their JSON until migration 9 rewrites them
+        return chunk_codec.decode(chunk_data) if chunk_data is not None else (chunks or [])
 
     async def get_stories(self, user_id: str) -> List[LibraryItem]:
         async with AsyncSessionLocal() as session:
@@ -53,7 +90,7 @@ class Database:
                 id=story.id,
                 user_id=user_id,
                 title=story.title,
-                chunks=[c.model_dump() for c in story.chunks],
+                **await self._chunk_columns(story.chunks),
                 chapters=[c.model_dump() for c in story.chapters],
                 current_index=story.currentIndex,
                 stats=story.stats.model_dump(),
@@ -62,6 +99,7 @@ class Database:
                 is_complete=story.isComplete
             )
             session.add(db_item)
+            await search.index_chunks(session, story.id, user_id, story.chunks)
             await session.commit()
             return story
 
@@ -71,7 +109,24 @@ class Database:
                 select(DBLibraryItem).where(DBLibraryItem.id == story_id, DBLibraryItem.user_id == user_id)
             )
             db_item = result.scalar_one_or_none()
-            return self._to_pydantic_library_item(db_item) if db_item else None
+            if db_item is None:
+                return None
+            return await self._decoding(len(db_item.chunk_data or b""), self._to_pydantic_library_item, db_item)
+
+    async def get_story_version(self, story_id: str, user_id: str) -> Optional[int]:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(DBLibraryItem.version).where(DBLibraryItem.id == story_id, DBLibraryItem.user_id == user_id)
+            )
+            return result.scalar_one_or_none()
+
+    async def get_story_versions(self, user_id: str) -> List[Tuple[str, int]]:
+        """(id, version) for every story of a user, without loading chunk data."""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(DBLibraryItem.id, DBLibraryItem.version).where(DBLibraryItem.user_id == user_id)
+            )
+            return [(row[0], row[1]) for row in result.all()]
 
     async def update_story(self, story_id: str, story: LibraryItem, user_id: str) -> Optional[LibraryItem]:
         async with AsyncSessionLocal() as session:
@@ -81,44 +136,282 @@ class Database:
                 DBLibraryItem.user_id == user_id
             ).values(
                 title=story.title,
-                chunks=[c.model_dump() for c in story.chunks],
+                **await self._chunk_columns(story.chunks),
                 chapters=[c.model_dump() for c in story.chapters],
                 current_index=story.currentIndex,
                 stats=story.stats.model_dump(),
                 elapsed_time=story.elapsedTime,
                 last_read=story.lastRead,
-                is_complete=story.isComplete
+                is_complete=story.isComplete,
+                version=DBLibraryItem.version + 1
             )
             result = await session.execute(stmt)
+            if result.rowcount == 0:
+                return None
+            # Same transaction, so search never disagrees with the saved text
+            await search.sync_story(session, story_id, user_id, story.chunks)
             await session.commit()
-            if result.rowcount > 0:
-                return story
-            return None
+            return story
 
     async def delete_story(self, story_id: str, user_id: str) -> bool:
         async with AsyncSessionLocal() as session:
+            # Dependent row first (foreign key); rolled back below if the story isn't the user's
+            await session.execute(delete(DBStoryDocument).where(DBStoryDocument.story_id == story_id))
             stmt = delete(DBLibraryItem).where(
                 DBLibraryItem.id == story_id,
                 DBLibraryItem.user_id == user_id
             )
             result = await session.execute(stmt)
+            if result.rowcount == 0:
+                await session.rollback()
+                return False
+            await search.remove_story(session, story_id)
             await session.commit()
-            return result.rowcount > 0
+            return True
 
-    async def get_settings(self, user_id: str) -> ReadingSettings:
+    # --- Source documents ---
+
+    async def save_pdf_metadata(self, story_id: str, metadata: PdfMetadata) -> None:
         async with AsyncSessionLocal() as session:
-            result = await session.execute(select(DBReadingSettings).where(DBReadingSettings.user_id == user_id).limit(1))
-            db_settings = result.scalar_one_or_none()
-            if db_settings:
-                return self._to_pydantic_settings(db_settings)
-            
-            return ReadingSettings(
-                theme='light',
-                fontSize='md',
-                alignment='left',
-                lineHeight='normal',
-                width='standard'
+            await session.merge(DBStoryDocument(story_id=story_id, pdf_metadata=metadata.model_dump()))
+            await session.commit()
+
+    async def get_pdf_metadata(self, story_id: str) -> Optional[PdfMetadata]:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(DBStoryDocument.pdf_metadata).where(DBStoryDocument.story_id == story_id)
+            )
+            data = result.scalar()
+            return PdfMetadata(**data) if data else None
+
+    # --- Storage accounting ---
+
+    async def add_storage_bytes(self, story_id: str, size: int) -> None:
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(DBLibraryItem)
+                .where(DBLibraryItem.id == story_id)
+                .values(storage_bytes=DBLibraryItem.storage_bytes + size)
+            )
+            await session.commit()
+
+    async def get_storage_usage(self, user_id: str) -> int:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(func.coalesce(func.sum(DBLibraryItem.storage_bytes), 0)).where(DBLibraryItem.user_id == user_id)
+            )
+            return int(result.scalar())
+
+    async def get_story_storage(self, user_id: str) -> List[Tuple[str, str, int]]:
+        """(id, title, bytes) per story, largest first."""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(DBLibraryItem.id, DBLibraryItem.title, DBLibraryItem.storage_bytes)
+                .where(DBLibraryItem.user_id == user_id)
+                .order_by(DBLibraryItem.storage_bytes.desc())
+            )
+            return [(row[0], row[1], int(row[2] or 0)) for row in result.all()]
+
+    async def get_story_owners(self) -> Dict[str, str]:
+        """story id -> user id for every story."""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(DBLibraryItem.id, DBLibraryItem.user_id))
+            return {row[0]: row[1] for row in result.all()}
+
+    async def set_storage_bytes(self, sizes: Dict[str, int]) -> None:
+        if not sizes:
+            return
+        async with AsyncSessionLocal() as session:
+            # ORM bulk UPDATE by primary key: one executemany
+            await session.execute(
+                update(DBLibraryItem),
+                [{"id": story_id, "storage_bytes": size} for story_id, size in sizes.items()],
+            )
+            await session.commit()
+
+    async def get_upload_session_ids(self) -> List[str]:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(DBUploadSession.id))
+            return list(result.scalars().all())
+
+    # --- Upload sessions ---
+
+    async def create_upload_session(self, upload: DBUploadSession) -> DBUploadSession:
+        async with AsyncSessionLocal() as session:
+            session.add(upload)
+            await session.commit()
+            return upload
+
+    async def get_upload_session(self, upload_id: str, user_id: str) -> Optional[DBUploadSession]:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(DBUploadSession).where(DBUploadSession.id == upload_id, DBUploadSession.user_id == user_id)
+            )
+            return result.scalar_one_or_none()
+
+    async def set_upload_received(self, upload_id: str, received: int) -> None:
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(DBUploadSession).where(DBUploadSession.id == upload_id).values(received=received)
+            )
+            await session.commit()
+
+    async def delete_upload_session(self, upload_id: str) -> None:
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(DBUploadSession).where(DBUploadSession.id == upload_id))
+            await session.commit()
+
+    async def get_expired_upload_sessions(self, created_before: int) -> List[str]:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(DBUploadSession.id).where(DBUploadSession.created_at < created_before)
+            )
+            return list(result.scalars().all())
+
+    # --- AI usage ---
+
+    async def add_ai_usage(self, user_id: str, day: str, task: str, input_tokens: int, output_tokens: int) -> None:
+        # One upsert per call: concurrent calls for the same user add up instead of racing
+        stmt = _dialect_insert(DBAIUsage).values(
+            user_id=user_id, day=day, task=task, requests=1,
+            input_tokens=input_tokens, output_tokens=output_tokens,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DBAIUsage.user_id, DBAIUsage.day, DBAIUsage.task],
+            set_={
+                "requests": DBAIUsage.requests + 1,
+                "input_tokens": DBAIUsage.input_tokens + stmt.excluded.input_tokens,
+                "output_tokens": DBAIUsage.output_tokens + stmt.excluded.output_tokens,
+            },
+        )
+        async with AsyncSessionLocal() as session:
+            await session.execute(stmt)
+            await session.commit()
+
+    async def get_ai_usage(self, user_id: str, day: str) -> Tuple[int, int]:
+        """(requests, tokens) the user has used on `day`, over all tasks."""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(
+                    func.coalesce(func.sum(DBAIUsage.requests), 0),
+                    func.coalesce(func.sum(DBAIUsage.input_tokens + DBAIUsage.output_tokens), 0),
+                ).where(DBAIUsage.user_id == user_id, DBAIUsage.day == day)
+            )
+            requests, tokens = result.one()
+            return int(requests), int(tokens)
+
+    async def get_ai_usage_by_task(self, user_id: str, day: str) -> List[Tuple[str, int, int, int]]:
+        """(task, requests, input tokens, output tokens) for the user on `day`."""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(DBAIUsage.task, DBAIUsage.requests, DBAIUsage.input_tokens, DBAIUsage.output_tokens)
+                .where(DBAIUsage.user_id == user_id, DBAIUsage.day == day)
+                .order_by(DBAIUsage.task)
+            )
+            return [(row[0], int(row[1]), int(row[2]), int(row[3])) for row in result.all()]
+
+    # --- Reading log ---
+
+    async def add_reading_events(self, user_id: str, events: List[ReadingEvent], utc_offset_minutes: int = 0) -> int:
+        """
+        Append a batch of events and add them to the daily rollups, in one transaction.
+        Events for stories the user doesn't own, and ones already stored, are dropped;
+        returns how many were added.
+        """
+        story_ids = {e.storyId for e in events}
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(DBLibraryItem.id).where(DBLibraryItem.user_id == user_id, DBLibraryItem.id.in_(story_ids))
+            )
+            owned = set(result.scalars().all())
+            events = [e for e in events if e.storyId in owned]
+            if not events:
+                return 0
+            # Events already stored (a batch resent after a lost response) conflict on
+            # (user_id, event_id) and are skipped; only the rows actually inserted are rolled up
+            stmt = _dialect_insert(DBReadingEvent).on_conflict_do_nothing(
+                index_elements=[DBReadingEvent.user_id, DBReadingEvent.event_id]
+            ).returning(
+                DBReadingEvent.story_id, DBReadingEvent.kind, DBReadingEvent.at, DBReadingEvent.pages,
+                DBReadingEvent.words, DBReadingEvent.seconds, DBReadingEvent.correct,
+            )
+            result = await session.execute(stmt, [
+                {
+                    "user_id": user_id, "event_id": e.id, "story_id": e.storyId, "kind": e.type, "at": e.at,
+                    "day": reading_log.event_day(e.at, utc_offset_minutes),
+                    "pages": e.pages, "words": e.words, "seconds": e.seconds, "correct": e.correct,
+                }
+                for e in events
+            ])
+            events = [
+                ReadingEvent(storyId=row[0], type=row[1], at=row[2], pages=row[3], words=row[4], seconds=row[5], correct=row[6])
+                for row in result.all()
+            ]
+            if not events:
+                return 0
+            # One upsert per (day, story): concurrent batches add up instead of racing
+            upsert = _dialect_insert(DBReadingDaily)
+            upsert = upsert.on_conflict_do_update(
+                index_elements=[DBReadingDaily.user_id, DBReadingDaily.day, DBReadingDaily.story_id],
+                set_={f: getattr(DBReadingDaily, f) + getattr(upsert.excluded, f) for f in reading_log.ROLLUP_FIELDS},
+            )
+            await session.execute(upsert, [
+                {"user_id": user_id, "day": day, "story_id": story_id, **totals}
+                for (day, story_id), totals in reading_log.rollup(events, utc_offset_minutes).items()
+            ])
+            await session.commit()
+            return len(events)
+
+    async def get_reading_days(self, user_id: str, since: str, story_id: Optional[str] = None) -> List[ReadingDay]:
+        """The user's daily totals from `since` on, oldest first; per story if story_id is given."""
+        sums = [func.sum(getattr(DBReadingDaily, f)) for f in reading_log.ROLLUP_FIELDS]
+        stmt = (
+            select(DBReadingDaily.day, *sums)
+            .where(DBReadingDaily.user_id == user_id, DBReadingDaily.day >= since)
+            .group_by(DBReadingDaily.day)
+            .order_by(DBReadingDaily.day)
+        )
+        if story_id is not None:
+            stmt = stmt.where(DBReadingDaily.story_id == story_id)
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(stmt)
+            return [
+                ReadingDay(day=row[0], **{f: int(v or 0) for f, v in zip(reading_log.ROLLUP_FIELDS, row[1:])})
+                for row in result.all()
+            ]
+
+    async def get_reading_dates(self, user_id: str) -> List[str]:
+        """Every day the user read on (sessions, pages or quiz answers), for streaks."""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(DBReadingDaily.day).where(DBReadingDaily.user_id == user_id).distinct()
             )
+            return list(result.scalars().all())
+
+    # --- Search ---
+
+    async def retrieve_chunks(self, story_id: str, user_id: str, question: str, limit: int) -> List[Tuple[int, str]]:
+        """(chunk index, text) of the story's chunks most relevant to a chat question."""
+        async with AsyncSessionLocal() as session:
+            return await search.retrieve(session, story_id, user_id, question, limit)
+
+    async def search_chunks(self, user_id: str, query: str, limit: int = 20, offset: int = 0) -> SearchResults:
+        async with AsyncSessionLocal() as session:
+            # Fetch one extra row to know whether there is a next page
+            hits = await search.search(session, user_id, query, limit + 1, offset)
+            next_offset = offset + limit if len(hits) > limit else None
+            return SearchResults(hits=hits[:limit], nextOffset=next_offset)
+
+    async def get_settings(self, user_id: str) -> ReadingSettings:
+        async with AsyncSessionLocal() as session:
+            return await self._get_settings(session, user_id)
+
+    async def _get_settings(self, session: AsyncSession, user_id: str) -> ReadingSettings:
+        result = await session.execute(select(DBReadingSettings).where(DBReadingSettings.user_id == user_id).limit(1))
+        db_settings = result.scalar_one_or_none()
+        if db_settings:
+            return self._to_pydantic_settings(db_settings)
+        return DEFAULT_SETTINGS.model_copy()
 
     async def update_settings(self, settings: ReadingSettings, user_id: str) -> ReadingSettings:
         async with AsyncSessionLocal() as session:
@@ -127,12 +420,16 @@ class Database:
             db_settings = result.scalar_one_or_none()
             
             if db_settings:
+                if self._to_pydantic_settings(db_settings) == settings:
+                    return settings  # No-op write (the client echoing what it just loaded)
                 db_settings.theme = settings.theme
                 db_settings.font_size = settings.fontSize
                 db_settings.alignment = settings.alignment
                 db_settings.line_height = settings.lineHeight
                 db_settings.width = settings.width
             else:
+                if settings == DEFAULT_SETTINGS:
+                    return settings  # Defaults are implied by a missing row
                 db_settings = DBReadingSettings(
                     user_id=user_id,
                     theme=settings.theme,
@@ -146,9 +443,101 @@ class Database:
             await session.commit()
             return settings
 
+    # --- Bootstrap ---
+
+    async def get_bootstrap(self, username: str) -> Optional[Bootstrap]:
+        """User, settings and library summary for app start-up, from one session."""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(DBUser).where(DBUser.username == username))
+            db_user = result.scalar_one_or_none()
+            if db_user is None:
+                return None
+            settings = await self._get_settings(session, db_user.id)
+            # Chunk count comes from the database; the chunk JSON itself is not loaded
+            result = await session.execute(
+                select(
+                    DBLibraryItem.id,
+                    DBLibraryItem.title,
+                    func.coalesce(DBLibraryItem.chunk_count, func.json_array_length(DBLibraryItem.chunks), 0),
+                    DBLibraryItem.current_index,
+                    DBLibraryItem.stats,
+                    DBLibraryItem.elapsed_time,
+                    DBLibraryItem.last_read,
+                    DBLibraryItem.is_complete,
+                ).where(DBLibraryItem.user_id == db_user.id)
+            )
+            library = [
+                LibrarySummary(
+                    id=row[0],
+                    title=row[1],
+                    chunkCount=row[2],
+                    currentIndex=row[3] or 0,
+                    stats=SessionStats(**row[4]) if row[4] else DEFAULT_STATS,
+                    elapsedTime=row[5] or 0,
+                    lastRead=row[6] or 0,
+                    isComplete=bool(row[7]),
+                )
+                for row in result.all()
+            ]
+            return Bootstrap(user=User.model_validate(db_user), settings=settings, library=library)
+
+    # --- Fast read path ---
+    # Chunks, chapters and stats were validated by the LibraryItem model when written,
+    # so reads can send the stored JSON text straight out instead of rebuilding
+    # (and FastAPI re-validating) a Chunk/Chapter object per element.
+
+    _RAW_COLUMNS = (
+        DBLibraryItem.id,
+        DBLibraryItem.title,
+        cast(DBLibraryItem.chunks, Text),
+        cast(DBLibraryItem.chapters, Text),
+        DBLibraryItem.current_index,
+        cast(DBLibraryItem.stats, Text),
+        DBLibraryItem.elapsed_time,
+        DBLibraryItem.last_read,
+        DBLibraryItem.is_complete,
+        DBLibraryItem.chunk_data,
+    )
+
+    _EMPTY_STATS = '{"correctAnswers":0,"totalQuestions":0,"startTime":0,"wordCount":0,"endTime":null,"date":null,"title":null}'
+
+    def _raw_library_item(self, row) -> dict:
+        id, title, chunks, chapters, current_index, stats, elapsed_time, last_read, is_complete, chunk_data = row
+        # Same keys and order as LibraryItem
+        return {
+            "id": id,
+            "title": title,
+            "chunks": chunk_codec.decode(chunk_data) if chunk_data is not None else raw_json(chunks, "[]"),
+            "chapters": raw_json(chapters, "[]"),
+            "currentIndex": current_index,
+            "stats": raw_json(stats, self._EMPTY_STATS),
+            "elapsedTime": elapsed_time,
+            "lastRead": last_read,
+            "isComplete": is_complete,
+        }
+
+    async def get_stories_json(self, user_id: str) -> bytes:
+        """Serialized List[LibraryItem] for a user, without building Pydantic objects."""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(*self._RAW_COLUMNS).where(DBLibraryItem.user_id == user_id))
+            rows = result.all()
+        size = sum(len(row.chunk_data or b"") for row in rows)
+        return await self._decoding(size, lambda: dumps([self._raw_library_item(row) for row in rows]))
+
+    async def get_story_json(self, story_id: str, user_id: str) -> Optional[bytes]:
+        """Serialized LibraryItem, without building Pydantic objects."""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(*self._RAW_COLUMNS).where(DBLibraryItem.id == story_id, DBLibraryItem.user_id == user_id)
+            )
+            row = result.one_or_none()
+        if row is None:
+            return None
+        return await self._decoding(len(row.chunk_data or b""), lambda: dumps(self._raw_library_item(row)))
+
     def _to_pydantic_library_item(self, db_item: DBLibraryItem) -> LibraryItem:
         from models import Chunk, SessionStats, Chapter
-        chunks = [Chunk(**c) for c in db_item.chunks] if db_item.chunks else []
+        chunks = [Chunk(**c) for c in self._chunk_dicts(db_item.chunk_data, db_item.chunks)]
         chapters = [Chapter(**c) for c in db_item.chapters] if db_item.chapters else []
         stats = SessionStats(**db_item.stats) if db_item.stats else SessionStats(correctAnswers=0, totalQuestions=0, startTime=0, wordCount=0)
         
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, JSON, BigInteger, Boolean, ForeignKey
+from sqlalchemy import Column, String, Integer, JSON, BigInteger, Boolean, ForeignKey, Index, LargeBinary
 from sqlalchemy.orm import DeclarativeBase
 
 class Base(DeclarativeBase):
@@ -19,13 +19,28 @@ class DBLibraryItem(Base):
     user_id = Column(String, ForeignKey("users.id"), index=True)
     title = Column(String)
     # Store complex nested objects as JSON
+    # Chunks are stored compressed in chunk_data (see chunk_codec.py); `chunks` only holds
+    # rows written before that, and is NULL once chunk_data is set
     chunks = Column(JSON)
+    chunk_data = Column(LargeBinary)
+    chunk_count = Column(Integer)
     chapters = Column(JSON, default=[])
     current_index = Column(Integer)
     stats = Column(JSON)
     elapsed_time = Column(Integer)
     last_read = Column(BigInteger)
     is_complete = Column(Boolean)
+    # Bumped on every update; used as the story's ETag
+    version = Column(Integer, default=1, nullable=False)
+    # Bytes of stored artifacts (source, pages, thumbnail); reconciled by storage_gc
+    storage_bytes = Column(BigInteger, default=0, nullable=False)
+
+class DBStoryDocument(Base):
+    __tablename__ = "story_documents"
+
+    # Inspection results for the story's source PDF, recorded once at upload
+    story_id = Column(String, ForeignKey("library_items.id"), primary_key=True)
+    pdf_metadata = Column(JSON)
 
 class DBReadingSettings(Base):
     __tablename__ = "reading_settings"
@@ -37,3 +52,67 @@ class DBReadingSettings(Base):
     alignment = Column(String)
     line_height = Column(String)
     width = Column(String)
+
+class DBSchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True)
+
+class DBUploadSession(Base):
+    __tablename__ = "upload_sessions"
+
+    # Resumable upload in progress; bytes live in PARTIAL_UPLOAD_DIR/{id}
+    id = Column(String, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id"), index=True)
+    filename = Column(String)
+    size = Column(BigInteger, nullable=False)
+    received = Column(BigInteger, nullable=False, default=0)
+    sha256 = Column(String)
+    created_at = Column(BigInteger)
+
+class DBAIUsage(Base):
+    __tablename__ = "ai_usage"
+
+    # Model calls charged to a user per UTC day and task; budgets are checked against the day's sum
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    day = Column(String, primary_key=True)  # YYYY-MM-DD
+    task = Column(String, primary_key=True)
+    requests = Column(Integer, nullable=False, default=0)
+    input_tokens = Column(BigInteger, nullable=False, default=0)
+    output_tokens = Column(BigInteger, nullable=False, default=0)
+
+class DBReadingEvent(Base):
+    __tablename__ = "reading_events"
+
+    # Append-only log of what happened while reading; never updated. No foreign key to the
+    # story, so history outlives deleted books. Totals are kept in reading_daily.
+    # event_id is the client's id for the event: a resent batch matches the stored rows and
+    # is ignored. Events from clients that don't send one (NULL) are never deduplicated.
+    __table_args__ = (Index("ux_reading_events_event", "user_id", "event_id", unique=True),)
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    event_id = Column(String)
+    story_id = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # session_start, session_end, page, quiz
+    at = Column(BigInteger, nullable=False)  # Client time, ms since the epoch
+    day = Column(String, nullable=False)  # YYYY-MM-DD in the reader's time zone
+    pages = Column(Integer, nullable=False, default=0)
+    words = Column(Integer, nullable=False, default=0)
+    seconds = Column(Integer, nullable=False, default=0)
+    correct = Column(Boolean)  # Quiz answers only
+
+class DBReadingDaily(Base):
+    __tablename__ = "reading_daily"
+
+    # reading_events summed per user, day and story as events arrive. A user's day is the
+    # sum of their rows for it (the primary key's prefix), so one table serves both.
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    day = Column(String, primary_key=True)
+    story_id = Column(String, primary_key=True)
+    sessions = Column(Integer, nullable=False, default=0)
+    seconds = Column(Integer, nullable=False, default=0)
+    pages = Column(Integer, nullable=False, default=0)
+    words = Column(Integer, nullable=False, default=0)
+    questions = Column(Integer, nullable=False, default=0)
+    correct = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,34 @@
+import hashlib
+from typing import Iterable, Optional, Tuple
+from fastapi import Request, Response
+from storage import OBJECT_CACHE_CONTROL
+
+# Rendered pages and source files never change once written under their key.
+IMMUTABLE_CACHE_CONTROL = OBJECT_CACHE_CONTROL
+# Story data is per-user and changes on update: let clients keep it, but always revalidate.
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+def story_etag(story_id: str, version: int) -> str:
+    return f'"{story_id}-v{version}"'
+
+def library_etag(versions: Iterable[Tuple[str, int]]) -> str:
+    """ETag for a whole library: changes when any story is added, removed or updated."""
+    digest = hashlib.sha256()
+    for story_id, version in sorted(versions):
+        digest.update(f"{story_id}:{version};".encode())
+    return f'"lib-{digest.hexdigest()[:32]}"'
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    if not etag:
+        return False
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    # Weak comparison, as required for If-None-Match
+    return etag in candidates or f"W/{etag}" in candidates
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
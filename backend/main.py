@@ -1,15 +1,28 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from routers import ai, stories, settings, auth, leaderboard, upload
+from routers import ai, stories, settings, auth, leaderboard, upload, uploads, bootstrap, admin, reading
 
 from contextlib import asynccontextmanager
 from database import db
+from compression import CompressionMiddleware
+from profiling import ProfilingMiddleware
+from storage_gc import STORAGE_GC_INTERVAL, run_periodically
+from circuit_breaker import CircuitOpenError
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await db.init_db()
+    sweeper = None
+    if STORAGE_GC_INTERVAL:
+        sweeper = asyncio.create_task(run_periodically(STORAGE_GC_INTERVAL))
     yield
+    if sweeper:
+        sweeper.cancel()
+    from story_processing import ocr_retries
+    ocr_retries.cancel_all()
 
 app = FastAPI(
     title="FocusRead API",
@@ -31,11 +44,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON payloads (story lists with hundreds of OCR'd chunks)
+app.add_middleware(CompressionMiddleware)
+
+# Admin-only: profile a single request flagged with `X-Profile: 1` (see profiling.py).
+# Added last so it is outermost and the profile covers compression too.
+app.add_middleware(ProfilingMiddleware)
+
+# The model API is down: fail fast and tell clients when to retry
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "AI service unavailable"},
+        headers={"Retry-After": str(max(1, int(exc.retry_after)))},
+    )
+
 # Include Routers
 app.include_router(auth.router)
+app.include_router(bootstrap.router)
 app.include_router(ai.router)
 app.include_router(stories.router)
 app.include_router(settings.router)
 app.include_router(leaderboard.router)
+app.include_router(reading.router)
 app.include_router(upload.router)
+app.include_router(uploads.router)
+app.include_router(admin.router)
 
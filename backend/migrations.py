@@ -0,0 +1,153 @@
+from typing import Awaitable, Callable, List, NamedTuple, Optional
+from sqlalchemy import inspect, null, select, text, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from db_models import (
+    Base, DBAIUsage, DBLibraryItem, DBReadingDaily, DBReadingEvent, DBReadingSettings, DBSchemaVersion,
+    DBStoryDocument, DBUploadSession, DBUser,
+)
+from models import Chunk
+import chunk_codec
+import search
+
+# Versioned schema migrations for SQLite and Postgres.
+#
+# Each step runs once, in order, and records its version in schema_version.
+# Steps must be idempotent (check before altering) so that databases created by the
+# old ad-hoc create_all/PRAGMA code, which may already have some of these changes,
+# can be brought up to date safely. Append new steps at the end; never renumber.
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[AsyncConnection], Awaitable[None]]
+
+def _columns(sync_conn, table: str) -> List[str]:
+    return [c["name"] for c in inspect(sync_conn).get_columns(table)]
+
+async def _add_column(conn: AsyncConnection, table: str, column: str, ddl: str) -> None:
+    columns = await conn.run_sync(_columns, table)
+    if column not in columns:
+        print(f"Migrating: Adding '{column}' column to {table}")
+        await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+async def _create_tables(conn: AsyncConnection, *models) -> None:
+    await conn.run_sync(Base.metadata.create_all, tables=[m.__table__ for m in models])
+
+# --- Steps ---
+
+async def _initial_schema(conn: AsyncConnection) -> None:
+    await _create_tables(conn, DBUser, DBLibraryItem, DBReadingSettings)
+
+async def _add_chapters(conn: AsyncConnection) -> None:
+    await _add_column(conn, "library_items", "chapters", "JSON DEFAULT '[]'")
+
+async def _add_story_version(conn: AsyncConnection) -> None:
+    await _add_column(conn, "library_items", "version", "INTEGER NOT NULL DEFAULT 1")
+
+async def _create_search_index(conn: AsyncConnection) -> None:
+    if await search.index_exists(conn):
+        return
+    await search.create_index(conn)
+    # Backfill stories created before the index existed
+    result = await conn.execute(select(DBLibraryItem.id, DBLibraryItem.user_id, DBLibraryItem.chunks))
+    for story_id, user_id, chunks in result.all():
+        await search.index_chunks(conn, story_id, user_id, [Chunk(**c) for c in chunks or []])
+
+async def _create_story_documents(conn: AsyncConnection) -> None:
+    await _create_tables(conn, DBStoryDocument)
+
+async def _create_upload_sessions(conn: AsyncConnection) -> None:
+    await _create_tables(conn, DBUploadSession)
+
+async def _add_storage_bytes(conn: AsyncConnection) -> None:
+    await _add_column(conn, "library_items", "storage_bytes", "BIGINT NOT NULL DEFAULT 0")
+
+async def _create_ai_usage(conn: AsyncConnection) -> None:
+    await _create_tables(conn, DBAIUsage)
+
+async def _compress_chunks(conn: AsyncConnection) -> None:
+    binary = "BYTEA" if conn.dialect.name == "postgresql" else "BLOB"
+    await _add_column(conn, "library_items", "chunk_data", binary)
+    await _add_column(conn, "library_items", "chunk_count", "INTEGER")
+    # Rewrite existing stories one at a time, so only one book's chunks are in memory
+    result = await conn.execute(
+        select(DBLibraryItem.id).where(DBLibraryItem.chunk_data.is_(None), DBLibraryItem.chunks.is_not(None))
+    )
+    story_ids = result.scalars().all()
+    if story_ids:
+        print(f"Migrating: Compressing chunks of {len(story_ids)} stories")
+    for story_id in story_ids:
+        chunks = (await conn.execute(select(DBLibraryItem.chunks).where(DBLibraryItem.id == story_id))).scalar()
+        chunks = chunks or []
+        await conn.execute(
+            update(DBLibraryItem).where(DBLibraryItem.id == story_id)
+            .values(chunk_data=chunk_codec.encode(chunks), chunk_count=len(chunks), chunks=null())
+        )
+
+async def _create_reading_log(conn: AsyncConnection) -> None:
+    await _create_tables(conn, DBReadingEvent, DBReadingDaily)
+
+async def _create_search_row_map(conn: AsyncConnection) -> None:
+    if conn.dialect.name != "postgresql":
+        await search.create_row_map(conn)
+
+async def _add_reading_event_ids(conn: AsyncConnection) -> None:
+    await _add_column(conn, "reading_events", "event_id", "VARCHAR")
+    await conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_reading_events_event ON reading_events (user_id, event_id)"
+    ))
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "initial schema", _initial_schema),
+    Migration(2, "library_items.chapters", _add_chapters),
+    Migration(3, "library_items.version", _add_story_version),
+    Migration(4, "full-text search index", _create_search_index),
+    Migration(5, "story_documents", _create_story_documents),
+    Migration(6, "upload_sessions", _create_upload_sessions),
+    Migration(7, "library_items.storage_bytes", _add_storage_bytes),
+    Migration(8, "ai_usage", _create_ai_usage),
+    Migration(9, "library_items.chunk_data", _compress_chunks),
+    Migration(10, "reading_events and reading_daily", _create_reading_log),
+    Migration(11, "chunk_fts_rows", _create_search_row_map),
+    Migration(12, "reading_events.event_id", _add_reading_event_ids),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+# --- Runner ---
+
+async def get_version(engine: AsyncEngine) -> Optional[int]:
+    async with engine.connect() as conn:
+        try:
+            result = await conn.execute(text("SELECT MAX(version) FROM schema_version"))
+            return result.scalar()
+        except Exception:
+            # Fresh database: the table doesn't exist yet
+            return None
+
+async def run_migrations(engine: AsyncEngine) -> int:
+    """Apply pending migrations and return the resulting schema version."""
+    # Fast path for warm starts: one SELECT, no schema inspection
+    if await get_version(engine) == LATEST_VERSION:
+        return LATEST_VERSION
+
+    async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # Several API replicas may start at once; only one migrates, the rest wait here
+            await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('focusread_migrations'))"))
+        await _create_tables(conn, DBSchemaVersion)
+
+        result = await conn.execute(text("SELECT MAX(version) FROM schema_version"))
+        current = result.scalar() or 0
+        for migration in MIGRATIONS:
+            if migration.version <= current:
+                continue
+            print(f"Applying migration {migration.version}: {migration.name}")
+            await migration.apply(conn)
+            await conn.execute(
+                text("INSERT INTO schema_version (version) VALUES (:version)"),
+                {"version": migration.version},
+            )
+            current = migration.version
+        return current
@@ -0,0 +1,171 @@
+import asyncio
+import math
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, NamedTuple, Optional
+
+from ai_client import get_client, MODEL_NAME
+from ai_quota import FairScheduler, record_usage
+from circuit_breaker import CircuitBreaker
+
+# Model routing for AI work: which model each task uses, with hedging and fallback.
+#
+# - Per-task model from AI_MODEL_<TASK> (default AI_MODEL), fallback from
+#   AI_FALLBACK_MODEL_<TASK> (default AI_FALLBACK_MODEL).
+# - Hedging: when a call is still running after the task's observed p95 latency
+#   (AI_HEDGE_PERCENTILE), a duplicate is sent; the first success wins and the other is cancelled.
+#   No hedging until AI_HEDGE_MIN_SAMPLES latencies have been seen.
+# - Fallback: if the primary model errors or exceeds AI_TIMEOUT_SECONDS, the call is
+#   retried once on the fallback model.
+# - Fair share: with a scheduler (ai_quota.FairScheduler), each call first waits for a slot
+#   in its user's queue, and successful calls are charged to the user through `on_usage`.
+# - Circuit breaker: with a breaker (circuit_breaker.CircuitBreaker), calls fail fast with
+#   CircuitOpenError while the API is erroring or slow, instead of each waiting for its timeout.
+
+TASKS = ("ocr", "ocr_batch", "format", "quiz", "chat")
+
+FALLBACK_MODEL = os.getenv("AI_FALLBACK_MODEL", "gemini-2.5-flash-lite")
+AI_TIMEOUT_SECONDS = float(os.getenv("AI_TIMEOUT_SECONDS", "60"))
+AI_HEDGE_PERCENTILE = float(os.getenv("AI_HEDGE_PERCENTILE", "95"))
+AI_HEDGE_MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = 200  # Recent successful calls per task used for the percentile
+
+class Route(NamedTuple):
+    model: str
+    fallback: Optional[str]
+    hedge: bool = True
+
+def default_routes() -> Dict[str, Route]:
+    routes = {}
+    for task in TASKS:
+        model = os.getenv(f"AI_MODEL_{task.upper()}", MODEL_NAME)
+        fallback = os.getenv(f"AI_FALLBACK_MODEL_{task.upper()}", FALLBACK_MODEL) or None
+        routes[task] = Route(model, fallback if fallback != model else None)
+    return routes
+
+
+class LatencyTracker:
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> float:
+        ordered = sorted(self.samples)
+        index = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+        return ordered[index]
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        client_factory: Callable[[], Any] = get_client,
+        routes: Optional[Dict[str, Route]] = None,
+        timeout: float = AI_TIMEOUT_SECONDS,
+        hedge_percentile: float = AI_HEDGE_PERCENTILE,
+        hedge_min_samples: int = AI_HEDGE_MIN_SAMPLES,
+        scheduler=None,
+        breaker: Optional[CircuitBreaker] = None,
+        on_usage: Optional[Callable[[Optional[str], str, Any], Awaitable[None]]] = None,
+    ):
+        self.client_factory = client_factory
+        self.routes = routes or default_routes()
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.scheduler = scheduler
+        self.breaker = breaker
+        self.on_usage = on_usage
+        self.latency: Dict[str, LatencyTracker] = {task: LatencyTracker() for task in self.routes}
+        self.hedges = 0
+        self.fallbacks = 0
+
+    def hedge_delay(self, task: str) -> Optional[float]:
+        """Seconds to wait before sending a duplicate, or None if not hedging (yet)."""
+        tracker = self.latency[task]
+        if not self.routes[task].hedge or len(tracker.samples) < self.hedge_min_samples:
+            return None
+        return tracker.percentile(self.hedge_percentile)
+
+    async def generate(self, task: str, contents: Any, user_id: Optional[str] = None, config: Any = None) -> Any:
+        """generate_content on the task's model. Raises if both primary and fallback fail."""
+        # Checked before queueing for a slot, so calls fail fast while the API is down
+        probe = self.breaker.before_call() if self.breaker is not None else False
+        request = {"contents": contents}
+        if config is not None:
+            request["config"] = config
+        try:
+            if self.scheduler is None:
+                response = await self._guarded(task, request, probe)
+            else:
+                async with self.scheduler.slot(user_id or "", task):
+                    response = await self._guarded(task, request, probe)
+        except BaseException:
+            # A probe cancelled while queued or mid-call has no outcome; without this the
+            # breaker would stay half-open, rejecting every call, with no probe to end it
+            if probe:
+                self.breaker.release_probe()
+            raise
+        if self.on_usage is not None:
+            await self.on_usage(user_id, task, response)
+        return response
+
+    async def _guarded(self, task: str, request: Dict[str, Any], probe: bool = False) -> Any:
+        if self.breaker is None:
+            return await self._generate(task, request)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            response = await self._generate(task, request)
+        except Exception:
+            self.breaker.record(False, loop.time() - start, probe)
+            raise
+        self.breaker.record(True, loop.time() - start, probe)
+        return response
+
+    async def _generate(self, task: str, request: Dict[str, Any]) -> Any:
+        client = self.client_factory()
+        route = self.routes[task]
+        try:
+            return await asyncio.wait_for(self._hedged(client, task, route.model, request), self.timeout)
+        except Exception as e:
+            if not route.fallback:
+                raise
+            print(f"AI {task}: {route.model} failed ({e!r}), falling back to {route.fallback}")
+            self.fallbacks += 1
+            return await asyncio.wait_for(self._call(client, route.fallback, request), self.timeout)
+
+    async def _hedged(self, client, task: str, model: str, request: Dict[str, Any]) -> Any:
+        attempts = [asyncio.ensure_future(self._call(client, model, request, task))]
+        try:
+            delay = self.hedge_delay(task)
+            if delay is not None:
+                done, _ = await asyncio.wait(attempts, timeout=delay)
+                if not done:
+                    self.hedges += 1
+                    attempts.append(asyncio.ensure_future(self._call(client, model, request, task)))
+
+            # First success wins; an error only counts once every attempt has failed
+            pending, error = set(attempts), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        return attempt.result()
+                    error = attempt.exception()
+            raise error
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    async def _call(self, client, model: str, request: Dict[str, Any], task: Optional[str] = None) -> Any:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        response = await client.aio.models.generate_content(model=model, **request)
+        if task is not None:
+            self.latency[task].record(loop.time() - start)
+        return response
+
+# Global instance
+models = ModelRouter(scheduler=FairScheduler(), breaker=CircuitBreaker(), on_usage=record_usage)
@@ -1,5 +1,5 @@
-from typing import List, Optional
-from pydantic import BaseModel
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
 
 # --- Shared Models (Frontend <-> Backend) ---
 
@@ -27,6 +27,12 @@ class Chapter(BaseModel):
     title: str
     pageIndex: int
 
+class PdfMetadata(BaseModel):
+    pageCount: int
+    pageSizes: List[List[float]] # [width, height] in PDF points, per page
+    chapters: List[Chapter] = []
+    hasTextLayer: bool = False
+
 class LibraryItem(BaseModel):
     id: str
     title: str
@@ -38,6 +44,54 @@ class LibraryItem(BaseModel):
     lastRead: int
     isComplete: bool
 
+class SearchHit(BaseModel):
+    storyId: str
+    storyTitle: str
+    chunkIndex: int
+    snippet: str
+    score: float
+
+class SearchResults(BaseModel):
+    hits: List[SearchHit]
+    nextOffset: Optional[int] = None # None when there are no more results
+
+class StoryUsage(BaseModel):
+    id: str
+    title: str
+    bytes: int
+
+class StorageUsage(BaseModel):
+    usedBytes: int
+    quotaBytes: Optional[int] = None # None when unlimited
+    stories: List[StoryUsage]
+
+class TaskUsage(BaseModel):
+    task: str
+    requests: int
+    inputTokens: int
+    outputTokens: int
+
+class AIUsage(BaseModel):
+    day: str # UTC
+    requests: int
+    tokens: int
+    requestLimit: Optional[int] = None # None when unlimited
+    tokenLimit: Optional[int] = None
+    resetSeconds: int
+    tasks: List[TaskUsage]
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int # Total bytes the client will send
+    sha256: Optional[str] = None # Hex digest; checked at finalize when given
+
+class UploadSession(BaseModel):
+    id: str
+    filename: str
+    size: int
+    offset: int # Bytes received so far; the next PUT starts here
+    complete: bool
+
 class ReadingSettings(BaseModel):
     theme: str # 'light' | 'sepia' | 'dark'
     fontSize: str # 'sm' | 'md' | 'lg' | 'xl'
@@ -66,6 +120,9 @@ class ChatRequest(BaseModel):
     currentText: str
     history: List[ChatMessage]
     message: str
+    # When set, passages from the rest of this story relevant to the message are added to the context
+    storyId: Optional[str] = None
+    chunkIndex: Optional[int] = None
 
 class ChatResponse(BaseModel):
     response: str
@@ -86,3 +143,47 @@ class UserLogin(BaseModel):
 class User(UserBase):
     id: str
     model_config = {"from_attributes": True}
+
+class LibrarySummary(BaseModel):
+    # LibraryItem without chunks/chapters: enough for the library grid and totals
+    id: str
+    title: str
+    chunkCount: int
+    currentIndex: int
+    stats: SessionStats
+    elapsedTime: int
+    lastRead: int
+    isComplete: bool = False
+
+class Bootstrap(BaseModel):
+    user: User
+    settings: ReadingSettings
+    library: List[LibrarySummary]
+
+class ReadingEvent(BaseModel):
+    id: Optional[str] = Field(None, max_length=64) # Client-generated; resent events with a stored id are ignored
+    storyId: str
+    type: Literal["session_start", "session_end", "page", "quiz"]
+    at: int # ms since the epoch, client clock
+    pages: int = Field(0, ge=0, le=10000) # page: pages advanced
+    words: int = Field(0, ge=0, le=1000000) # page/quiz: words read
+    seconds: int = Field(0, ge=0, le=86400) # session_end: time spent reading
+    correct: Optional[bool] = None # quiz
+
+class ReadingEventBatch(BaseModel):
+    events: List[ReadingEvent] = Field(max_length=1000)
+    utcOffsetMinutes: int = Field(0, ge=-14 * 60, le=14 * 60) # Reader's time zone, for day boundaries
+
+class ReadingDay(BaseModel):
+    day: str # YYYY-MM-DD, reader's time zone
+    sessions: int
+    seconds: int
+    pages: int
+    words: int
+    questions: int
+    correct: int
+
+class ReadingHistory(BaseModel):
+    days: List[ReadingDay] # Oldest first; days without reading are left out
+    currentStreak: int # Consecutive days with reading, ending today or yesterday
+    longestStreak: int
@@ -0,0 +1,91 @@
+import asyncio
+import io
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+from ai_client import get_client
+from model_router import models
+
+OCR_PROMPT = "Transcribe the text on this page exactly. If there are diagrams or images, describe them briefly in [brackets] inline with the text. Do not use markdown code blocks for the Output."
+
+# Pages per OCR request. Pages in one call share the prompt and per-request overhead, so a
+# saturated deployment (or one limited by requests per minute) gets more pages per second,
+# but each call takes longer, so a lone 5-page /process batch finishes later than with
+# parallel single-page calls. Off (1) by default; see benchmarks/bench_ocr_batching.py.
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "1"))
+
+OCR_BATCH_PROMPT = (
+    "Each image below is one page of a book, preceded by its page number. Transcribe the text on each page exactly. "
+    "If there are diagrams or images, describe them briefly in [brackets] inline with the text. "
+    "Return one entry per page with its page number and its transcription; do not merge or skip pages."
+)
+OCR_BATCH_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {"page": {"type": "INTEGER"}, "text": {"type": "STRING"}},
+        "required": ["page", "text"],
+    },
+}
+
+async def ocr_page(jpeg: bytes, page_num: int, user_id: Optional[str] = None) -> Optional[str]:
+    """Transcribe one rendered page, charged to user_id. None if the model call failed."""
+    client = get_client()
+    if not client:
+        return ""
+
+    from PIL import Image
+    try:
+        response = await models.generate("ocr", [OCR_PROMPT, Image.open(io.BytesIO(jpeg))], user_id)
+        return response.text
+    except Exception as e:
+        print(f"OCR Error Page {page_num}: {e}")
+        return None
+
+def parse_batch(text: str, page_nums: List[int]) -> Dict[int, str]:
+    """Transcriptions by page from a batch response; pages missing or malformed are left out."""
+    try:
+        entries = json.loads(text)
+    except (TypeError, ValueError):
+        return {}
+    texts = {}
+    if isinstance(entries, list):
+        for entry in entries:
+            if isinstance(entry, dict) and entry.get("page") in page_nums and isinstance(entry.get("text"), str):
+                texts.setdefault(entry["page"], entry["text"])
+    return texts
+
+async def ocr_pages(pages: List[Tuple[int, bytes]], user_id: Optional[str] = None) -> Dict[int, Optional[str]]:
+    """
+    Transcribe several rendered pages in one request with a per-page JSON schema.
+    Pages the response doesn't account for are retried one at a time with ocr_page.
+    """
+    if len(pages) == 1 or not get_client():
+        return await _ocr_singly(pages, user_id)
+
+    from PIL import Image
+    page_nums = [n for n, _ in pages]
+    contents = [OCR_BATCH_PROMPT]
+    for n, jpeg in pages:
+        contents += [f"Page {n}:", Image.open(io.BytesIO(jpeg))]
+    config = {"response_mime_type": "application/json", "response_schema": OCR_BATCH_SCHEMA}
+    try:
+        response = await models.generate("ocr_batch", contents, user_id, config)
+    except Exception as e:
+        # The call itself failed: single-page calls would most likely fail the same way
+        print(f"OCR Error Pages {page_nums[0]}-{page_nums[-1]}: {e}")
+        return {n: None for n in page_nums}
+
+    texts: Dict[int, Optional[str]] = parse_batch(response.text, page_nums)
+    missing = [(n, jpeg) for n, jpeg in pages if n not in texts]
+    if missing:
+        print(f"OCR batch response incomplete, retrying {len(missing)} of {len(pages)} pages singly")
+        texts.update(await _ocr_singly(missing, user_id))
+    return texts
+
+async def _ocr_singly(pages: List[Tuple[int, bytes]], user_id: Optional[str]) -> Dict[int, Optional[str]]:
+    texts = await asyncio.gather(*(ocr_page(jpeg, n, user_id) for n, jpeg in pages))
+    return {n: text for (n, _), text in zip(pages, texts)}
+
+def page_markdown(page_num: int, image_url: str, text: str) -> str:
+    return f"![Page {page_num}]({image_url})\n\n{text}"
@@ -0,0 +1,101 @@
+import hashlib
+import os
+from typing import Dict, Tuple
+
+import anyio
+
+from storage import UPLOAD_DIR
+
+# On-disk side of resumable uploads. Each session's bytes are appended to one file;
+# a running SHA-256 is kept per session so finalizing never re-reads the file.
+#
+# The directory sits next to UPLOAD_DIR (on the same volume in production, so any
+# replica can continue a session) but outside it, so partial files are never served
+# by /uploads.
+
+PARTIAL_UPLOAD_DIR = os.getenv(
+    "PARTIAL_UPLOAD_DIR", os.path.join(os.path.dirname(os.path.abspath(UPLOAD_DIR)), "partial_uploads")
+)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))  # Seconds
+
+_hashers: Dict[str, Tuple[int, "hashlib._Hash"]] = {}  # session id -> (offset hashed up to, hasher)
+
+def partial_path(upload_id: str) -> str:
+    return os.path.join(PARTIAL_UPLOAD_DIR, upload_id)
+
+def create(upload_id: str) -> None:
+    os.makedirs(PARTIAL_UPLOAD_DIR, exist_ok=True)
+    open(partial_path(upload_id), "wb").close()
+    _hashers[upload_id] = (0, hashlib.sha256())
+
+def _hasher(upload_id: str, offset: int):
+    state = _hashers.get(upload_id)
+    if state is None or state[0] != offset:
+        # Session continued on another replica or after a restart: rehash what is on disk once
+        hasher = hashlib.sha256()
+        with open(partial_path(upload_id), "rb") as f:
+            remaining = offset
+            while remaining:
+                block = f.read(min(remaining, 1024 * 1024))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+        state = (offset, hasher)
+    return state[1]
+
+class PartialWriter:
+    """
+    Appends bytes at `offset`, hashing as it writes. Bytes past `limit` are refused.
+    File I/O, hashing and fsync run in a worker thread so a slow disk doesn't stall the event loop.
+    """
+    def __init__(self, upload_id: str, offset: int, limit: int):
+        self.upload_id = upload_id
+        self.offset = offset
+        self.limit = limit
+        self._hasher = None
+        self._file = None
+
+    @classmethod
+    async def open(cls, upload_id: str, offset: int, limit: int) -> "PartialWriter":
+        writer = cls(upload_id, offset, limit)
+        await anyio.to_thread.run_sync(writer._open)
+        return writer
+
+    def _open(self) -> None:
+        self._hasher = _hasher(self.upload_id, self.offset)
+        self._file = open(partial_path(self.upload_id), "r+b")
+        # Drop any tail a dropped connection left beyond the recorded offset
+        self._file.truncate(self.offset)
+        self._file.seek(self.offset)
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._hasher.update(data)
+
+    async def write(self, data: bytes) -> None:
+        if self.offset + len(data) > self.limit:
+            raise ValueError("Upload exceeds declared size")
+        await anyio.to_thread.run_sync(self._write, data)
+        self.offset += len(data)
+
+    def _close(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    async def close(self) -> int:
+        """Flush to disk and return the new offset."""
+        await anyio.to_thread.run_sync(self._close)
+        _hashers[self.upload_id] = (self.offset, self._hasher)
+        return self.offset
+
+def digest(upload_id: str, size: int) -> str:
+    return _hasher(upload_id, size).hexdigest()
+
+def remove(upload_id: str) -> None:
+    _hashers.pop(upload_id, None)
+    path = partial_path(upload_id)
+    if os.path.exists(path):
+        os.remove(path)
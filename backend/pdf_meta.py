@@ -0,0 +1,158 @@
+import asyncio
+import os
+import tempfile
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+from models import Chapter, PdfMetadata
+from singleflight import KeyedLocks
+from storage import storage, source_key
+
+# A PDF is parsed once, at upload: page count, page sizes, outline and text-layer presence
+# are persisted as a PdfMetadata record. Later batch processing reads that record and
+# a cached local handle on the source file instead of re-inspecting the PDF.
+
+PDF_HANDLE_CACHE_SIZE = int(os.getenv("PDF_HANDLE_CACHE_SIZE", "8"))
+
+def _parse_outline(reader, outline) -> List[Chapter]:
+    items = []
+    for item in outline:
+        if isinstance(item, list):
+            items.extend(_parse_outline(reader, item))
+        else:
+            # pypdf outline item
+            try:
+                # page_number is 0-indexed using reader.get_destination_page_number
+                page_index = reader.get_destination_page_number(item)
+                if page_index is not None:
+                    items.append(Chapter(title=item.title, pageIndex=page_index))
+            except Exception:
+                continue
+    return items
+
+def _has_fonts(page) -> bool:
+    # Scanned pages are just images; a page with text has font resources
+    try:
+        resources = page.get("/Resources")
+        resources = resources.get_object() if resources is not None else {}
+        return "/Font" in resources
+    except Exception:
+        return False
+
+def inspect_pdf(path: str) -> PdfMetadata:
+    """Parse the PDF once and collect everything later steps need. Blocking."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    page_sizes = []
+    has_text = False
+    for page in reader.pages:
+        box = page.mediabox
+        page_sizes.append([float(box.width), float(box.height)])
+        has_text = has_text or _has_fonts(page)
+
+    chapters: List[Chapter] = []
+    try:
+        if reader.outline:
+            chapters = _parse_outline(reader, reader.outline)
+    except Exception as e:
+        print(f"Chapter Extraction Error: {e}")
+
+    return PdfMetadata(
+        pageCount=len(page_sizes),
+        pageSizes=page_sizes,
+        chapters=chapters,
+        hasTextLayer=has_text,
+    )
+
+
+class OpenDocument:
+    def __init__(self, story_id: str, path: str, metadata: PdfMetadata, temporary: bool):
+        self.story_id = story_id
+        self.path = path
+        self.metadata = metadata
+        self.temporary = temporary  # Local copy of a remote source; deleted on eviction
+        self.users = 0
+
+    def close(self):
+        if self.temporary and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class DocumentCache:
+    """
+    Bounded LRU of open source documents, keyed by story id.
+    For remote storage this keeps the downloaded copy, so consecutive
+    /process calls on a book don't download or inspect it again.
+    """
+    def __init__(self, max_size: int = PDF_HANDLE_CACHE_SIZE):
+        self.max_size = max_size
+        self._docs: "OrderedDict[str, OpenDocument]" = OrderedDict()
+        self._locks = KeyedLocks()  # Per story, kept only while held or awaited
+
+    @asynccontextmanager
+    async def open(self, story_id: str) -> AsyncIterator[Optional[OpenDocument]]:
+        """Yield the story's source document, or None if it has no PDF source."""
+        doc = await self._get(story_id)
+        if doc is None:
+            yield None
+            return
+        doc.users += 1
+        try:
+            yield doc
+        finally:
+            doc.users -= 1
+            self._evict()
+
+    def discard(self, story_id: str) -> None:
+        doc = self._docs.pop(story_id, None)
+        if doc and doc.users == 0:
+            doc.close()
+
+    async def _get(self, story_id: str) -> Optional[OpenDocument]:
+        async with self._locks(story_id):
+            doc = self._docs.get(story_id)
+            if doc is not None:
+                self._docs.move_to_end(story_id)
+                return doc
+
+            doc = await self._load(story_id)
+            if doc is not None:
+                self._docs[story_id] = doc
+                self._evict()
+            return doc
+
+    async def _load(self, story_id: str) -> Optional[OpenDocument]:
+        from database import db
+
+        key = source_key(story_id)
+        path = storage.file_path(key)
+        temporary = False
+        if path is None:
+            if not await asyncio.to_thread(storage.exists, key):
+                return None
+            fd, path = tempfile.mkstemp(suffix=".pdf")
+            os.close(fd)
+            await asyncio.to_thread(storage.download_to, key, path)
+            temporary = True
+
+        metadata = await db.get_pdf_metadata(story_id)
+        if metadata is None:
+            # Stories uploaded before metadata was recorded: inspect once and persist
+            metadata = await asyncio.to_thread(inspect_pdf, path)
+            await db.save_pdf_metadata(story_id, metadata)
+        return OpenDocument(story_id, path, metadata, temporary)
+
+    def _evict(self):
+        # Never close a document that a request is still rendering from
+        for story_id in list(self._docs):
+            if len(self._docs) <= self.max_size:
+                break
+            doc = self._docs[story_id]
+            if doc.users == 0:
+                del self._docs[story_id]
+                doc.close()
+
+# Global instance
+documents = DocumentCache()
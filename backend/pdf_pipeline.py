@@ -0,0 +1,144 @@
+import asyncio
+import os
+import subprocess
+import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, List, NamedTuple, Optional, Tuple, Union
+import multiprocessing
+
+from ocr import OCR_BATCH_SIZE, ocr_page
+
+# Rendering (pdftoppm, CPU-bound) runs in a process pool across all cores; OCR (network-bound)
+# runs in threads. Each page is handed to OCR as soon as it is rasterized, so the two overlap
+# instead of rendering the whole batch before the first model call.
+
+RENDER_DPI = 200
+
+def _available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))  # Respects container CPU limits
+    except AttributeError:
+        return os.cpu_count() or 1
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0")) or _available_cpus()
+OCR_CONCURRENCY = int(os.getenv("OCR_CONCURRENCY", "4"))
+
+class RenderedPage(NamedTuple):
+    page_num: int
+    jpeg: bytes
+    text: Optional[str]  # None when OCR failed
+
+_render_pool: Optional[ProcessPoolExecutor] = None
+
+def get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    if _render_pool is None:
+        # spawn, not fork: the API process has an event loop and threads running
+        _render_pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _render_pool
+
+def render_page(pdf_path: str, page_num: int, dpi: int = RENDER_DPI) -> bytes:
+    """Rasterize one page straight to JPEG bytes. Runs in a worker process."""
+    # pdftoppm is called directly: pdf2image would first run pdfinfo on the whole
+    # document for every page, and the page count is already known from PdfMetadata.
+    with tempfile.TemporaryDirectory() as out_dir:
+        prefix = os.path.join(out_dir, "page")
+        subprocess.run(
+            ["pdftoppm", "-r", str(dpi), "-f", str(page_num), "-l", str(page_num),
+             "-jpeg", "-singlefile", pdf_path, prefix],
+            check=True, capture_output=True,
+        )
+        with open(prefix + ".jpg", "rb") as f:
+            return f.read()
+
+async def render_and_ocr(
+    pdf_path: str,
+    page_nums: Iterable[int],
+    render: Callable[[str, int], bytes] = render_page,
+    ocr: Callable[[bytes, int], Union[Optional[str], Awaitable[Optional[str]]]] = ocr_page,
+    executor: Optional[Executor] = None,
+    ocr_concurrency: int = OCR_CONCURRENCY,
+    ocr_batch: Optional[Callable[[List[Tuple[int, bytes]], Any], Any]] = None,
+    batch_size: int = OCR_BATCH_SIZE,
+) -> AsyncIterator[RenderedPage]:
+    """
+    Render and OCR pages, yielding each page as soon as its OCR finishes (not in page order).
+    With `ocr_batch` (pages -> {page_num: text}) and batch_size > 1, up to batch_size rendered
+    pages share one OCR call; otherwise `ocr` is called per page.
+    Raises the first rendering error after cancelling outstanding work.
+    """
+    loop = asyncio.get_running_loop()
+    executor = executor or get_render_pool()
+    semaphore = asyncio.Semaphore(ocr_concurrency)
+
+    async def one_page(page_num: int) -> RenderedPage:
+        jpeg = await loop.run_in_executor(executor, render, pdf_path, page_num)
+        async with semaphore:
+            if asyncio.iscoroutinefunction(ocr):
+                text = await ocr(jpeg, page_num)
+            else:
+                text = await asyncio.to_thread(ocr, jpeg, page_num)
+        return RenderedPage(page_num, jpeg, text)
+
+    if ocr_batch is not None and batch_size > 1:
+        async for page in _render_and_ocr_batched(pdf_path, page_nums, render, ocr_batch, executor, semaphore, batch_size):
+            yield page
+        return
+
+    tasks = [asyncio.ensure_future(one_page(n)) for n in page_nums]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def _render_and_ocr_batched(pdf_path, page_nums, render, ocr_batch, executor, semaphore, batch_size):
+    # Rendered pages are grouped in the order they finish; a group goes to OCR as soon as it
+    # is full (or rendering is done), so OCR of early groups still overlaps later rendering
+    loop = asyncio.get_running_loop()
+    results = {n: loop.create_future() for n in page_nums}
+    ocr_tasks = []
+
+    async def render_one(page_num: int):
+        return page_num, await loop.run_in_executor(executor, render, pdf_path, page_num)
+
+    async def ocr_group(group):
+        try:
+            async with semaphore:
+                if asyncio.iscoroutinefunction(ocr_batch):
+                    texts = await ocr_batch(group)
+                else:
+                    texts = await asyncio.to_thread(ocr_batch, group)
+            for n, jpeg in group:
+                if not results[n].done():
+                    results[n].set_result(RenderedPage(n, jpeg, texts.get(n)))
+        except Exception as e:
+            for n, _ in group:
+                if not results[n].done():
+                    results[n].set_exception(e)
+
+    async def group_renders():
+        group = []
+        try:
+            for next_render in asyncio.as_completed(renders):
+                group.append(await next_render)
+                if len(group) == batch_size:
+                    ocr_tasks.append(asyncio.ensure_future(ocr_group(group)))
+                    group = []
+        except Exception as e:
+            for future in results.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        if group:
+            ocr_tasks.append(asyncio.ensure_future(ocr_group(group)))
+
+    renders = [asyncio.ensure_future(render_one(n)) for n in results]
+    grouper = asyncio.ensure_future(group_renders())
+    try:
+        for next_done in asyncio.as_completed(list(results.values())):
+            yield await next_done
+    finally:
+        for task in [grouper, *renders, *ocr_tasks]:
+            task.cancel()
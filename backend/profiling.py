@@ -0,0 +1,139 @@
+import os
+import re
+import time
+import uuid
+from typing import List, NamedTuple, Optional
+
+import anyio
+
+from storage import UPLOAD_DIR
+
+# On-demand profiling of single requests. An admin adds `X-Profile: 1` (or `?profile=1`)
+# to any request; it runs under a sampling profiler and the result is written to
+# PROFILE_DIR as `{request id}.speedscope.json` (open in https://www.speedscope.app).
+# The id is the client's X-Request-ID if it sent one, and is echoed in X-Profile-Id.
+# Other users' flags are ignored, so the response is the same with or without them.
+
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(UPLOAD_DIR)), "profiles")
+)
+PROFILE_RETENTION = int(os.getenv("PROFILE_RETENTION", "50"))  # Newest profiles kept
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))  # Sampling interval, seconds
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()}
+
+PROFILE_SUFFIX = ".speedscope.json"
+_SAFE_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+class ProfileInfo(NamedTuple):
+    id: str
+    size: int
+    created: float
+
+def is_admin(username: Optional[str]) -> bool:
+    return username is not None and username in ADMIN_USERNAMES
+
+def profile_path(profile_id: str) -> Optional[str]:
+    """Path of a saved profile, or None for ids that could escape PROFILE_DIR."""
+    if not _SAFE_ID.match(profile_id) or profile_id.startswith("."):
+        return None
+    return os.path.join(PROFILE_DIR, profile_id + PROFILE_SUFFIX)
+
+def list_profiles() -> List[ProfileInfo]:
+    """Saved profiles, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for entry in os.scandir(PROFILE_DIR):
+        if entry.name.endswith(PROFILE_SUFFIX):
+            stat = entry.stat()
+            profiles.append(ProfileInfo(entry.name[:-len(PROFILE_SUFFIX)], stat.st_size, stat.st_mtime))
+    return sorted(profiles, key=lambda p: -p.created)
+
+def save_profile(profile_id: str, data: str, retention: int = PROFILE_RETENTION) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = profile_path(profile_id)
+    with open(path + ".tmp", "w") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+    for old in list_profiles()[retention:]:
+        try:
+            os.remove(profile_path(old.id))
+        except FileNotFoundError:
+            pass  # Pruned concurrently by another request
+
+def _pyinstrument():
+    """(Profiler, SpeedscopeRenderer), imported on the first profiled request so normal
+    starts don't load the profiler; None when it isn't installed."""
+    try:
+        from pyinstrument import Profiler
+        from pyinstrument.renderers import SpeedscopeRenderer
+    except ImportError:  # Optional: pip install focusread-backend[profiling]
+        return None
+    return Profiler, SpeedscopeRenderer
+
+def _wants_profile(scope) -> bool:
+    headers = dict(scope.get("headers") or [])
+    if headers.get(b"x-profile", b"").strip() in (b"1", b"true"):
+        return True
+    query = scope.get("query_string", b"").split(b"&")
+    return b"profile=1" in query or b"profile=true" in query
+
+def _request_username(scope) -> Optional[str]:
+    from fastapi import HTTPException
+    from starlette.requests import Request
+    from auth_utils import get_token_username
+    try:
+        return get_token_username(Request(scope))
+    except HTTPException:
+        return None
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling flagged requests from admins (ADMIN_USERNAMES).
+    Unflagged requests only pay for a header lookup.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        pyinstrument = None
+        if (
+            scope["type"] == "http"
+            and ADMIN_USERNAMES
+            and _wants_profile(scope)
+            and is_admin(_request_username(scope))
+        ):
+            pyinstrument = _pyinstrument()
+        if pyinstrument is None:
+            await self.app(scope, receive, send)
+            return
+        Profiler, SpeedscopeRenderer = pyinstrument
+
+        headers = dict(scope.get("headers") or [])
+        requested_id = headers.get(b"x-request-id", b"").decode("latin-1")
+        profile_id = requested_id if profile_path(requested_id) else uuid.uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())],
+                }
+            await send(message)
+
+        # async_mode="enabled" attributes time spent awaiting to the awaiting frame,
+        # so slow DB queries and model calls show up where they were made
+        profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="enabled")
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            elapsed = time.perf_counter() - started
+            try:
+                data = profiler.output(SpeedscopeRenderer())
+                await anyio.to_thread.run_sync(save_profile, profile_id, data)
+                print(f"Profiled {scope['method']} {scope['path']} in {elapsed:.3f}s -> {profile_id}")
+            except Exception as e:
+                print(f"Failed to save profile {profile_id}: {e}")
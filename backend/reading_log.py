@@ -0,0 +1,67 @@
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models import ReadingEvent
+
+# Reading history.
+#
+# The client queues ReadingEvents as they happen (session start and end, pages advanced,
+# quiz answers) and POSTs them to /reading/events in batches. Each batch is one
+# transaction: the events are appended to reading_events with a single multi-row INSERT,
+# and their totals are added to reading_daily with one upsert per (day, story) the batch
+# touches. History, streaks and period leaderboards read reading_daily only.
+# reading_events stays as the record the rollups can be rebuilt or extended from.
+#
+# Days are the reader's local days (the batch carries their UTC offset), so a streak
+# doesn't break at UTC midnight.
+
+# Events queued offline are accepted for this long; older or future-dated ones are dropped
+READING_EVENT_MAX_AGE = 30 * 24 * 3600
+READING_EVENT_MAX_SKEW = 24 * 3600
+
+ROLLUP_FIELDS = ("sessions", "seconds", "pages", "words", "questions", "correct")
+
+def event_day(at_ms: int, utc_offset_minutes: int = 0) -> str:
+    moment = datetime.fromtimestamp(at_ms / 1000, timezone.utc) + timedelta(minutes=utc_offset_minutes)
+    return moment.strftime("%Y-%m-%d")
+
+def local_today(utc_offset_minutes: int = 0, now: Optional[float] = None) -> str:
+    return event_day(int((time.time() if now is None else now) * 1000), utc_offset_minutes)
+
+def is_current(event: ReadingEvent, now: Optional[float] = None) -> bool:
+    now_ms = (time.time() if now is None else now) * 1000
+    return now_ms - READING_EVENT_MAX_AGE * 1000 <= event.at <= now_ms + READING_EVENT_MAX_SKEW * 1000
+
+def rollup(events: Iterable[ReadingEvent], utc_offset_minutes: int = 0) -> Dict[Tuple[str, str], Dict[str, int]]:
+    """What a batch of events adds to reading_daily, by (day, story)."""
+    totals: Dict[Tuple[str, str], Dict[str, int]] = {}
+    for e in events:
+        t = totals.setdefault((event_day(e.at, utc_offset_minutes), e.storyId), dict.fromkeys(ROLLUP_FIELDS, 0))
+        if e.type == "session_start":
+            t["sessions"] += 1
+        elif e.type == "session_end":
+            t["seconds"] += e.seconds
+        elif e.type == "page":
+            t["pages"] += e.pages
+            t["words"] += e.words
+        elif e.type == "quiz":
+            t["questions"] += 1
+            t["correct"] += 1 if e.correct else 0
+            t["words"] += e.words
+    return totals
+
+def streaks(days: List[str], today: str) -> Tuple[int, int]:
+    """(current, longest) runs of consecutive reading days. The current streak ends today,
+    or yesterday if there's been no reading yet today."""
+    ordinals = sorted({date.fromisoformat(d).toordinal() for d in days})
+    longest = run = 0
+    previous = None
+    for n in ordinals:
+        run = run + 1 if previous == n - 1 else 1
+        longest = max(longest, run)
+        previous = n
+    current = 0
+    if ordinals and ordinals[-1] >= date.fromisoformat(today).toordinal() - 1:
+        current = run
+    return current, longest
@@ -0,0 +1,34 @@
+import json
+from typing import Any, Optional
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Optional speedup; falls back to the stdlib encoder
+    orjson = None
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson when it is installed.
+    Used by routers that return large LibraryItem payloads (hundreds of OCR'd chunks).
+    """
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+def dumps(content: Any) -> bytes:
+    if orjson is None:
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+def raw_json(text: Optional[str], default: str) -> Any:
+    """
+    Value that serializes as the already-encoded JSON `text` (or `default` when NULL).
+    With orjson the text is spliced in as-is, so the cost is a copy rather than a parse.
+    """
+    if text is None or text == "null":
+        text = default
+    if orjson is not None and hasattr(orjson, "Fragment"):
+        return orjson.Fragment(text)
+    return json.loads(text)
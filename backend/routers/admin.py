@@ -0,0 +1,33 @@
+import os
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+from auth_utils import get_current_user
+from models import User
+from responses import FastJSONResponse
+import profiling
+
+router = APIRouter(prefix="/admin", tags=["Admin"], default_response_class=FastJSONResponse)
+
+class Profile(BaseModel):
+    id: str
+    size: int
+    created: float
+
+async def require_admin(current_user: User = Depends(get_current_user)) -> User:
+    if not profiling.is_admin(current_user.username):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
+    return current_user
+
+@router.get("/profiles", response_model=List[Profile])
+async def list_profiles(_: User = Depends(require_admin)):
+    """Saved request profiles, newest first. Profile a request by sending it with `X-Profile: 1`."""
+    return [Profile(**p._asdict()) for p in profiling.list_profiles()]
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, _: User = Depends(require_admin)):
+    path = profiling.profile_path(profile_id)
+    if not path or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=os.path.basename(path))
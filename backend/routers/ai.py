@@ -1,18 +1,57 @@
 import os
 import json
 import re
-from google import genai
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from models import (
     QuizRequest, QuizQuestion, 
     FormatRequest, FormatResponse, 
-    ChatRequest, ChatResponse
+    ChatRequest, ChatResponse,
+    AIUsage, TaskUsage, User
 )
 
-from ai_client import client, MODEL_NAME
+from ai_client import get_client, estimate_tokens
+from model_router import models
+from singleflight import ai_flight, content_key
+from ai_quota import require_ai_budget
+from circuit_breaker import CircuitOpenError
+from auth_utils import get_current_user
+from database import db
+import ai_quota
 
 router = APIRouter(prefix="/ai", tags=["AI"])
 
+# Chat context beyond the current page: the story's chunks that best match the question
+# (BM25 over the search index), capped at CHAT_RETRIEVAL_K passages and ~CHAT_CONTEXT_TOKENS on top of the page
+CHAT_RETRIEVAL_K = int(os.getenv("CHAT_RETRIEVAL_K", "8"))
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "3000"))
+
+async def book_context(request: ChatRequest, user_id: str) -> str:
+    """Passages from elsewhere in the story relevant to the chat message, in reading order."""
+    if not request.storyId or CHAT_RETRIEVAL_K <= 0:
+        return ""
+    try:
+        # Extra candidates to fill in for the current page and passages too long for the budget
+        hits = await db.retrieve_chunks(request.storyId, user_id, request.message, CHAT_RETRIEVAL_K * 2 + 1)
+    except Exception as e:
+        print(f"Chat retrieval failed for {request.storyId}: {e}")
+        return ""
+    budget = CHAT_CONTEXT_TOKENS
+    passages = []
+    for index, text in hits:
+        if index == request.chunkIndex:
+            continue  # Already sent as currentText
+        if len(passages) == CHAT_RETRIEVAL_K:
+            break
+        cost = estimate_tokens(text)
+        if cost > budget:
+            continue  # A shorter, lower-ranked passage may still fit
+        budget -= cost
+        passages.append((index, text))
+    if not passages:
+        return ""
+    sections = "\n\n".join(f"[Section {index + 1}]\n{text}" for index, text in sorted(passages))
+    return f"Relevant passages from elsewhere in the book:\n{sections}\n\n"
+
 def extract_json(text: str) -> dict:
     """Helper to extract JSON from response text"""
     try:
@@ -34,7 +73,8 @@ def extract_json(text: str) -> dict:
         return None
 
 @router.post("/quiz", response_model=QuizQuestion)
-async def generate_quiz(request: QuizRequest):
+async def generate_quiz(request: QuizRequest, current_user: User = Depends(require_ai_budget)):
+    client = get_client()
     if not client:
         return QuizQuestion(
             question="API Key Missing. What is the capital of France?",
@@ -55,24 +95,29 @@ async def generate_quiz(request: QuizRequest):
     {request.chunk}
     """
 
-    try:
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=prompt
-        )
+    async def generate():
+        response = await models.generate("quiz", prompt, current_user.id)
         
         data = extract_json(response.text)
         if not data:
             raise ValueError("Failed to parse JSON from AI response")
             
         return QuizQuestion(**data)
+
+    try:
+        # Identical chunks requested concurrently (several tabs) share one model call. Keyed
+        # per user: the call is charged to whoever started it, so users never share one
+        return await ai_flight.do(content_key("quiz", current_user.id, request.chunk), generate)
+    except CircuitOpenError:
+        raise
     except Exception as e:
         print(f"Quiz Gen Error: {e}")
         # Fallback or error
         raise HTTPException(status_code=500, detail=f"AI Error: {str(e)}")
 
 @router.post("/format", response_model=FormatResponse)
-async def format_chunk(request: FormatRequest):
+async def format_chunk(request: FormatRequest, current_user: User = Depends(require_ai_budget)):
+    client = get_client()
     if not client:
         return FormatResponse(formattedText=f"**API Key Missing**\n\n{request.chunk}")
 
@@ -86,18 +131,21 @@ async def format_chunk(request: FormatRequest):
     {request.chunk}
     """
 
-    try:
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=prompt
-        )
+    async def generate():
+        response = await models.generate("format", prompt, current_user.id)
         return FormatResponse(formattedText=response.text)
+
+    try:
+        return await ai_flight.do(content_key("format", current_user.id, request.chunk), generate)
+    except CircuitOpenError:
+        raise
     except Exception as e:
         print(f"Format Gen Error: {e}")
         raise HTTPException(status_code=500, detail="Failed to format text")
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat_with_ai(request: ChatRequest):
+async def chat_with_ai(request: ChatRequest, current_user: User = Depends(require_ai_budget)):
+    client = get_client()
     if not client:
         return ChatResponse(response="API Key Missing.")
 
@@ -111,7 +159,7 @@ async def chat_with_ai(request: ChatRequest):
         
         # Add context as system Instruction or first user content?
         # gemini-2.0 often supports system instructions better but let's stick to user prompt for Context
-        context_msg = f"Context from text:\n{request.currentText}\n\n"
+        context_msg = f"Context from text:\n{request.currentText}\n\n" + await book_context(request, current_user.id)
         
         # Rebuild history
         # Note: 'role' in new SDK is strictly 'user' or 'model'
@@ -132,13 +180,26 @@ async def chat_with_ai(request: ChatRequest):
         # Actually, new SDK usually supports 'chats.create' for multi-turn.
         # But 'generate_content' with a list of contents works as multi-turn input.
         
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=contents
-        )
+        response = await models.generate("chat", contents, current_user.id)
         
         return ChatResponse(response=response.text)
 
+    except CircuitOpenError:
+        return ChatResponse(response="The AI service is temporarily unavailable. Please try again in a minute.")
     except Exception as e:
         print(f"Chat Error: {e}")
         return ChatResponse(response="Sorry, I encountered an error.")
+
+@router.get("/usage", response_model=AIUsage)
+async def ai_usage(current_user: User = Depends(get_current_user)):
+    day = ai_quota.usage_day()
+    tasks = [TaskUsage(task=t, requests=r, inputTokens=i, outputTokens=o) for t, r, i, o in await db.get_ai_usage_by_task(current_user.id, day)]
+    return AIUsage(
+        day=day,
+        requests=sum(t.requests for t in tasks),
+        tokens=sum(t.inputTokens + t.outputTokens for t in tasks),
+        requestLimit=ai_quota.AI_DAILY_REQUESTS or None,
+        tokenLimit=ai_quota.AI_DAILY_TOKENS or None,
+        resetSeconds=ai_quota.seconds_until_reset(),
+        tasks=tasks,
+    )
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, HTTPException, Request, status
+from models import Bootstrap
+from database import db
+from auth_utils import get_token_username
+from responses import FastJSONResponse
+
+router = APIRouter(tags=["Bootstrap"], default_response_class=FastJSONResponse)
+
+@router.get("/bootstrap", response_model=Bootstrap)
+async def bootstrap(request: Request):
+    """Everything the app needs on load (user, settings, library summary) in one round-trip."""
+    # The user lookup happens inside get_bootstrap's session, not in a separate dependency
+    data = await db.get_bootstrap(get_token_username(request))
+    if data is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    return data
@@ -1,9 +1,11 @@
-from typing import List
-from fastapi import APIRouter, Depends
+from datetime import date, timedelta
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel
-from sqlalchemy import select, desc
-from db_models import DBLibraryItem, DBUser
+from sqlalchemy import select, desc, func, case
+from db_models import DBLibraryItem, DBReadingDaily, DBUser
 from database import AsyncSessionLocal
+import reading_log
 
 router = APIRouter(prefix="/leaderboard", tags=["Leaderboard"])
 
@@ -14,40 +16,62 @@ class LeaderboardEntry(BaseModel):
     total_correct_answers: int
 
 @router.get("", response_model=List[LeaderboardEntry])
-async def get_leaderboard():
+async def get_leaderboard(days: Optional[int] = Query(None, ge=1, le=366)):
+    """All-time totals, or with `days`, words read and correct answers over the last `days` days."""
+    if days is not None:
+        return await _recent_leaderboard(days)
+    async with AsyncSessionLocal() as session:
+        # Aggregate in the database: only the small stats JSON is read, never chunks.
+        # JSON element access compiles to json_extract() on SQLite and ->> on Postgres.
+        books = func.sum(case((DBLibraryItem.is_complete, 1), else_=0))
+        words = func.sum(func.coalesce(DBLibraryItem.stats["wordCount"].as_integer(), 0))
+        correct = func.sum(func.coalesce(DBLibraryItem.stats["correctAnswers"].as_integer(), 0))
+
+        stmt = (
+            select(DBUser.username, books, words, correct)
+            .join(DBLibraryItem, DBLibraryItem.user_id == DBUser.id)
+            .group_by(DBUser.username)
+            # Sort by books completed, then words read
+            .order_by(desc(books), desc(words))
+        )
+        result = await session.execute(stmt)
+
+        return [
+            LeaderboardEntry(
+                username=username,
+                total_books_completed=int(total_books or 0),
+                total_words_read=int(total_words or 0),
+                total_correct_answers=int(total_correct or 0)
+            )
+            for username, total_books, total_words, total_correct in result.all()
+        ]
+
+async def _recent_leaderboard(days: int) -> List[LeaderboardEntry]:
+    # Summed from the daily reading rollups, not from every story's stats
+    since = (date.fromisoformat(reading_log.local_today()) - timedelta(days=days - 1)).isoformat()
+    books = (
+        select(func.count())
+        .where(DBLibraryItem.user_id == DBUser.id, DBLibraryItem.is_complete)
+        .correlate(DBUser)
+        .scalar_subquery()
+    )
+    words = func.sum(DBReadingDaily.words)
+    correct = func.sum(DBReadingDaily.correct)
+    stmt = (
+        select(DBUser.username, books, words, correct)
+        .join(DBReadingDaily, DBReadingDaily.user_id == DBUser.id)
+        .where(DBReadingDaily.day >= since)
+        .group_by(DBUser.id, DBUser.username)
+        .order_by(desc(words), desc(correct))
+    )
     async with AsyncSessionLocal() as session:
-        # We need to aggregate stats per user
-        # For simplicity in this SQL-light version, we'll fetch all items and aggregate in Python
-        # In a real heavy-load scenario, we would write a GROUP BY query
-        
-        # Join User to get usernames
-        stmt = select(DBLibraryItem, DBUser).join(DBUser, DBLibraryItem.user_id == DBUser.id)
         result = await session.execute(stmt)
-        rows = result.all()
-        
-        user_stats = {}
-        
-        for item, user in rows:
-            if user.username not in user_stats:
-                user_stats[user.username] = {
-                    "username": user.username,
-                    "total_books_completed": 0,
-                    "total_words_read": 0,
-                    "total_correct_answers": 0
-                }
-            
-            stats = item.stats # JSON dict
-            if stats:
-                user_stats[user.username]["total_words_read"] += stats.get("wordCount", 0)
-                user_stats[user.username]["total_correct_answers"] += stats.get("correctAnswers", 0)
-            
-            if item.is_complete:
-                user_stats[user.username]["total_books_completed"] += 1
-        
-        # Convert to list
-        leaderboard = list(user_stats.values())
-        
-        # Sort by books completed, then words read
-        leaderboard.sort(key=lambda x: (x["total_books_completed"], x["total_words_read"]), reverse=True)
-        
-        return leaderboard
+        return [
+            LeaderboardEntry(
+                username=username,
+                total_books_completed=int(total_books or 0),
+                total_words_read=int(total_words or 0),
+                total_correct_answers=int(total_correct or 0)
+            )
+            for username, total_books, total_words, total_correct in result.all()
+        ]
@@ -0,0 +1,34 @@
+from datetime import date, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel
+from models import ReadingEventBatch, ReadingHistory, User
+from database import db
+from auth_utils import get_current_user
+import reading_log
+
+router = APIRouter(prefix="/reading", tags=["Reading"])
+
+class EventsAccepted(BaseModel):
+    accepted: int
+
+@router.post("/events", response_model=EventsAccepted)
+async def add_events(batch: ReadingEventBatch, current_user: User = Depends(get_current_user)):
+    """Append a batch of reading events. Events for unknown stories or too far from now are dropped."""
+    events = [e for e in batch.events if reading_log.is_current(e)]
+    accepted = await db.add_reading_events(current_user.id, events, batch.utcOffsetMinutes) if events else 0
+    return EventsAccepted(accepted=accepted)
+
+@router.get("/history", response_model=ReadingHistory)
+async def history(
+    days: int = Query(30, ge=1, le=366),
+    storyId: Optional[str] = None,
+    utcOffsetMinutes: int = Query(0, ge=-14 * 60, le=14 * 60),
+    current_user: User = Depends(get_current_user),
+):
+    """Daily reading totals for the last `days` days (of one story, with storyId) and reading streaks."""
+    today = reading_log.local_today(utcOffsetMinutes)
+    since = (date.fromisoformat(today) - timedelta(days=days - 1)).isoformat()
+    reading_days = await db.get_reading_days(current_user.id, since, storyId)
+    current, longest = reading_log.streaks(await db.get_reading_dates(current_user.id), today)
+    return ReadingHistory(days=reading_days, currentStreak=current, longestStreak=longest)
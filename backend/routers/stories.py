@@ -1,25 +1,63 @@
+import asyncio
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, status, Depends
-from models import LibraryItem, User
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Response, Query
+from models import LibraryItem, User, SearchResults, StorageUsage, StoryUsage
 from database import db
 from auth_utils import get_current_user
+from ai_quota import require_ai_budget
+from responses import FastJSONResponse
+from http_cache import REVALIDATE_CACHE_CONTROL, story_etag, library_etag, etag_matches, not_modified
 
-router = APIRouter(prefix="/stories", tags=["Stories"])
+router = APIRouter(prefix="/stories", tags=["Stories"], default_response_class=FastJSONResponse)
 
 @router.get("", response_model=List[LibraryItem])
-async def get_stories(current_user: User = Depends(get_current_user)):
-    return await db.get_stories(current_user.id)
+async def get_stories(request: Request, current_user: User = Depends(get_current_user)):
+    # Cheap (id, version) query first so an unchanged library never loads chunk data
+    etag = library_etag(await db.get_story_versions(current_user.id))
+    if etag_matches(request, etag):
+        return not_modified(etag, REVALIDATE_CACHE_CONTROL)
+
+    # Stored JSON is already validated; skip the response_model round-trip
+    body = await db.get_stories_json(current_user.id)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL})
+
+@router.get("/search", response_model=SearchResults)
+async def search_stories(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user)
+):
+    return await db.search_chunks(current_user.id, q, limit, offset)
+
+@router.get("/usage", response_model=StorageUsage)
+async def storage_usage(current_user: User = Depends(get_current_user)):
+    from storage_gc import STORAGE_QUOTA_BYTES
+    stories = [StoryUsage(id=i, title=t, bytes=b) for i, t, b in await db.get_story_storage(current_user.id)]
+    return StorageUsage(
+        usedBytes=sum(s.bytes for s in stories),
+        quotaBytes=STORAGE_QUOTA_BYTES or None,
+        stories=stories,
+    )
 
 @router.post("", response_model=LibraryItem, status_code=status.HTTP_201_CREATED)
 async def create_story(story: LibraryItem, current_user: User = Depends(get_current_user)):
     return await db.create_story(story, current_user.id)
 
 @router.get("/{id}", response_model=LibraryItem)
-async def get_story(id: str, current_user: User = Depends(get_current_user)):
-    story = await db.get_story(id, current_user.id)
-    if not story:
+async def get_story(id: str, request: Request, current_user: User = Depends(get_current_user)):
+    version = await db.get_story_version(id, current_user.id)
+    if version is None:
         raise HTTPException(status_code=404, detail="Story not found")
-    return story
+
+    etag = story_etag(id, version)
+    if etag_matches(request, etag):
+        return not_modified(etag, REVALIDATE_CACHE_CONTROL)
+
+    body = await db.get_story_json(id, current_user.id)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Story not found")
+    return Response(content=body, media_type="application/json", headers={"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL})
 
 @router.put("/{id}", response_model=LibraryItem)
 async def update_story(id: str, story: LibraryItem, current_user: User = Depends(get_current_user)):
@@ -37,13 +75,18 @@ async def delete_story(id: str, current_user: User = Depends(get_current_user)):
     success = await db.delete_story(id, current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Story not found")
+    from pdf_meta import documents
+    from storage import storage
+    documents.discard(id)
+    # Source PDF, pages and thumbnail; anything missed here is left to storage_gc
+    await asyncio.to_thread(storage.delete_prefix, id)
 
 @router.post("/{id}/process", response_model=LibraryItem)
 async def process_story_batch(
     id: str, 
     batch_size: int = 5, 
     start_index: Optional[int] = None, 
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(require_ai_budget)
 ):
     story = await db.get_story(id, current_user.id)
     if not story:
@@ -89,56 +132,19 @@ async def process_story_batch(
     last_page = end_index 
     # Logic check: if start_index=5 (6th chunk), page is 6. Correct.
 
-    import os
-    from pdf2image import convert_from_path
-    from ai_client import client, MODEL_NAME
+    from circuit_breaker import OPEN, CircuitOpenError
+    from model_router import models
+    from story_processing import process_pages
 
-    UPLOAD_DIR = "/data/uploads"
-    story_dir = os.path.join(UPLOAD_DIR, id)
-    source_pdf_path = os.path.join(story_dir, "source.pdf")
-
-    if not os.path.exists(source_pdf_path):
-         # If source doesn't exist, we can't process. Maybe it was an imported text, not PDF.
-         # Or it's a legacy upload.
-         return story
+    # While the model API is failing there is nothing to gain from rendering pages;
+    # the client is told when to come back instead (503, see main.py)
+    if models.breaker is not None and models.breaker.state == OPEN:
+        raise CircuitOpenError(models.breaker.retry_after())
 
+    # Pages whose OCR fails stay unprocessed and are retried in the background
     try:
-        images = convert_from_path(source_pdf_path, first_page=first_page, last_page=last_page, dpi=200)
+        updated = await process_pages(id, current_user.id, range(first_page, last_page + 1))
     except Exception as e:
         print(f"Batch Processing Convert Error: {e}")
         raise HTTPException(status_code=500, detail="Failed to convert PDF batch")
-
-    # Process
-    for i, image in enumerate(images):
-        chunk_idx = start_index + i
-        page_num = first_page + i # or chunk_idx + 1
-        
-        image_filename = f"{page_num}.jpg"
-        image_path = os.path.join(story_dir, image_filename)
-        
-        image.save(image_path, "JPEG")
-        
-        chunk_text = ""
-        if client:
-            try:
-                prompt = "Transcribe the text on this page exactly. If there are diagrams or images, describe them briefly in [brackets] inline with the text. Do not use markdown code blocks for the Output."
-                response = client.models.generate_content(
-                    model=MODEL_NAME,
-                    contents=[prompt, image]
-                )
-                chunk_text = response.text
-            except Exception as e:
-                print(f"OCR Error Page {page_num}: {e}")
-                chunk_text = "[Error extracting text]"
-        
-        image_url = f"/uploads/{id}/{image_filename}"
-        final_text = f"![Page {page_num}]({image_url})\n\n{chunk_text}"
-        
-        # Update Chunk in place
-        story.chunks[chunk_idx].text = final_text
-        story.chunks[chunk_idx].formattedText = final_text
-        story.chunks[chunk_idx].isProcessed = True
-
-    # Save updates
-    updated = await db.update_story(id, story, current_user.id)
-    return updated
+    return updated or story
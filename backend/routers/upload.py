@@ -1,41 +1,209 @@
+import asyncio
 import os
+import re
+import time
 import uuid
+from functools import partial
 import tempfile
 import shutil
 from typing import List
-from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, status
-from pdf2image import convert_from_path
-from models import LibraryItem, Chunk, SessionStats, User
+from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, Request, status
+from starlette.requests import ClientDisconnect
+from models import LibraryItem, Chunk, SessionStats, User, UploadSession, UploadSessionCreate
+from db_models import DBUploadSession
 from auth_utils import get_current_user
+from ai_quota import require_ai_budget
+from responses import FastJSONResponse
 from database import db
-from ai_client import client, MODEL_NAME
-from PIL import Image
+from storage import storage, source_key, save_page_jpeg
+from ocr import ocr_page, ocr_pages, page_markdown
+from pdf_pipeline import render_and_ocr
+from singleflight import KeyedLocks
+from storage_gc import check_quota
+import partial_uploads
 
-router = APIRouter(prefix="/upload", tags=["Upload"])
-
-UPLOAD_DIR = os.getenv("UPLOAD_DIR", "/data/uploads")
+router = APIRouter(prefix="/upload", tags=["Upload"], default_response_class=FastJSONResponse)
 
 @router.post("/pdf", response_model=LibraryItem)
-async def upload_pdf(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+async def upload_pdf(file: UploadFile = File(...), current_user: User = Depends(require_ai_budget)):
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="File must be a PDF")
 
     story_id = str(uuid.uuid4())
-    story_dir = os.path.join(UPLOAD_DIR, story_id)
-    os.makedirs(story_dir, exist_ok=True)
 
-    # Save uploaded PDF to persistent source file
-    source_pdf_path = os.path.join(story_dir, "source.pdf")
+    # Work on a local copy; it is handed to storage as the story's source once parsed
+    work_dir = tempfile.mkdtemp()
+    source_pdf_path = os.path.join(work_dir, "source.pdf")
     with open(source_pdf_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
 
+    quota_error = await check_quota(current_user.id, os.path.getsize(source_pdf_path))
+    if quota_error:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise HTTPException(status_code=413, detail=quota_error)
+
+    try:
+        return await _ingest_pdf(story_id, source_pdf_path, file.filename, current_user)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# --- Resumable uploads ---
+# POST /upload/sessions              -> session (offset 0)
+# PUT  /upload/sessions/{id}         -> append bytes; Content-Range: bytes {offset}-{last}/{size}
+# GET  /upload/sessions/{id}         -> current offset, to resume after a dropped connection
+# POST /upload/sessions/{id}/complete -> ingest the PDF in place
+# DELETE /upload/sessions/{id}       -> abandon
+
+_CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+upload_locks = KeyedLocks()
+
+def _session_response(upload: DBUploadSession) -> UploadSession:
+    return UploadSession(
+        id=upload.id, filename=upload.filename, size=upload.size,
+        offset=upload.received, complete=upload.received == upload.size,
+    )
+
+async def _get_upload(upload_id: str, current_user: User) -> DBUploadSession:
+    upload = await db.get_upload_session(upload_id, current_user.id)
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return upload
+
+async def _expire_upload_sessions():
+    cutoff = int((time.time() - partial_uploads.UPLOAD_SESSION_TTL) * 1000)
+    for upload_id in await db.get_expired_upload_sessions(cutoff):
+        partial_uploads.remove(upload_id)
+        await db.delete_upload_session(upload_id)
+
+@router.post("/sessions", response_model=UploadSession, status_code=status.HTTP_201_CREATED)
+async def create_upload_session(body: UploadSessionCreate, current_user: User = Depends(get_current_user)):
+    if not body.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+    if body.size <= 0 or body.size > partial_uploads.MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File must be between 1 and {partial_uploads.MAX_UPLOAD_BYTES} bytes",
+        )
+    quota_error = await check_quota(current_user.id, body.size)
+    if quota_error:
+        raise HTTPException(status_code=413, detail=quota_error)
+    await _expire_upload_sessions()
+
+    upload = DBUploadSession(
+        id=str(uuid.uuid4()), user_id=current_user.id, filename=body.filename,
+        size=body.size, received=0, sha256=body.sha256.lower() if body.sha256 else None,
+        created_at=int(time.time() * 1000),
+    )
+    await asyncio.to_thread(partial_uploads.create, upload.id)
+    await db.create_upload_session(upload)
+    return _session_response(upload)
+
+@router.get("/sessions/{upload_id}", response_model=UploadSession)
+async def get_upload_session(upload_id: str, current_user: User = Depends(get_current_user)):
+    return _session_response(await _get_upload(upload_id, current_user))
+
+@router.put("/sessions/{upload_id}", response_model=UploadSession)
+async def put_upload_range(upload_id: str, request: Request, current_user: User = Depends(get_current_user)):
+    match = _CONTENT_RANGE.match(request.headers.get("content-range", ""))
+    if not match:
+        raise HTTPException(status_code=400, detail="Content-Range: bytes {start}-{end}/{size} required")
+    start, end, total = (int(g) for g in match.groups())
+
+    async with upload_locks(upload_id):
+        upload = await _get_upload(upload_id, current_user)
+        if total != upload.size or end < start or end >= upload.size:
+            raise HTTPException(status_code=416, detail="Range outside the declared file size")
+        if start != upload.received:
+            # Client is out of sync (e.g. a retry of a range that did land); tell it where to resume
+            raise HTTPException(status_code=409, detail={"offset": upload.received})
+
+        # Streamed straight to disk: memory use is one network chunk, whatever the range size
+        writer = await partial_uploads.PartialWriter.open(upload_id, start, end + 1)
+        try:
+            async for data in request.stream():
+                await writer.write(data)
+        except ValueError:
+            raise HTTPException(status_code=413, detail="Body longer than Content-Range")
+        except ClientDisconnect:
+            pass  # Keep what arrived; the client resumes from the recorded offset
+        finally:
+            upload.received = await writer.close()
+            await db.set_upload_received(upload_id, upload.received)
+    return _session_response(upload)
+
+@router.delete("/sessions/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_upload_session(upload_id: str, current_user: User = Depends(get_current_user)):
+    async with upload_locks(upload_id):
+        await _get_upload(upload_id, current_user)
+        partial_uploads.remove(upload_id)
+        await db.delete_upload_session(upload_id)
+
+@router.post("/sessions/{upload_id}/complete", response_model=LibraryItem)
+async def complete_upload_session(upload_id: str, current_user: User = Depends(require_ai_budget)):
+    async with upload_locks(upload_id):
+        upload = await _get_upload(upload_id, current_user)
+        if upload.received != upload.size:
+            raise HTTPException(status_code=409, detail={"offset": upload.received})
+        if upload.sha256 and await asyncio.to_thread(partial_uploads.digest, upload_id, upload.size) != upload.sha256:
+            partial_uploads.remove(upload_id)
+            await db.delete_upload_session(upload_id)
+            raise HTTPException(status_code=422, detail="Checksum mismatch; upload discarded")
+
+        # The assembled file is ingested where it is and then moved into storage, not copied.
+        # If ingestion fails the session is kept, so /complete can be retried without re-sending.
+        story = await _ingest_pdf(str(uuid.uuid4()), partial_uploads.partial_path(upload_id), upload.filename, current_user)
+        partial_uploads.remove(upload_id)
+        await db.delete_upload_session(upload_id)
+        return story
+
+@router.post("/epub", response_model=LibraryItem)
+async def upload_epub(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+    if not file.filename.lower().endswith('.epub'):
+        raise HTTPException(status_code=400, detail="File must be an EPUB")
+    from text_ingest import parse_epub
     try:
-        from pdf2image import pdfinfo_from_path
-        info = pdfinfo_from_path(source_pdf_path)
-        total_pages = info["Pages"]
+        book = await asyncio.to_thread(parse_epub, file.file)
+    except Exception as e:
+        print(f"EPUB Parse Error: {e}")
+        raise HTTPException(status_code=400, detail="Failed to read EPUB")
+    return await _create_text_story(book, file.filename, current_user)
+
+@router.post("/text", response_model=LibraryItem)
+async def upload_text(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+    if not file.filename.lower().endswith(('.txt', '.md', '.markdown')):
+        raise HTTPException(status_code=400, detail="File must be plain text or Markdown")
+    from text_ingest import parse_text
+    book = await asyncio.to_thread(parse_text, file.file)
+    return await _create_text_story(book, file.filename, current_user)
+
+async def _create_text_story(book, filename: str, current_user: User) -> LibraryItem:
+    # Already text: every chunk is ready, nothing to render or OCR later
+    if not book.chunks:
+        raise HTTPException(status_code=400, detail="No readable text found")
+    new_story = LibraryItem(
+        id=str(uuid.uuid4()),
+        title=book.title or os.path.splitext(filename)[0],
+        chunks=book.chunks,
+        chapters=book.chapters,
+        currentIndex=0,
+        stats=SessionStats(correctAnswers=0, totalQuestions=0, startTime=0, wordCount=0),
+        elapsedTime=0,
+        lastRead=0,
+        isComplete=False
+    )
+    await db.create_story(new_story, current_user.id)
+    return new_story
+
+async def _ingest_pdf(story_id: str, source_pdf_path: str, filename: str, current_user: User) -> LibraryItem:
+    # PDF libraries are only imported on the upload path, not at startup
+    from pdf_meta import inspect_pdf
+
+    # One parse for page count, page sizes, outline and text layer; stored for later batches
+    try:
+        metadata = await asyncio.to_thread(inspect_pdf, source_pdf_path)
+        total_pages = metadata.pageCount
     except Exception as e:
         print(f"PDF Info Error: {e}")
-        # Fallback: convert all (danger for large files) or fail
         raise HTTPException(status_code=500, detail="Failed to read PDF info")
 
     chunks: List[Chunk] = []
@@ -45,46 +213,38 @@ async def upload_pdf(file: UploadFile = File(...), current_user: User = Depends(
     BATCH_SIZE = 5
     initial_pages = min(total_pages, BATCH_SIZE)
     
+    # 1. Process Initial Batch (rendered across cores, each page OCR'd as soon as it is ready)
+    pages = {}
     try:
-        images = convert_from_path(source_pdf_path, first_page=1, last_page=initial_pages, dpi=200)
+        ocr = partial(ocr_page, user_id=current_user.id)
+        ocr_batch = partial(ocr_pages, user_id=current_user.id)
+        async for page in render_and_ocr(source_pdf_path, range(1, initial_pages + 1), ocr=ocr, ocr_batch=ocr_batch):
+            pages[page.page_num] = page
     except Exception as e:
         print(f"PDF Conversion Error: {e}")
         raise HTTPException(status_code=500, detail="Failed to convert PDF initial batch")
 
-    # 1. Process Initial Batch
-    for i, image in enumerate(images):
+    stored_bytes = 0
+    failed = []
+    for i in range(total_pages):
         page_num = i + 1
-        image_filename = f"{page_num}.jpg"
-        image_path = os.path.join(story_dir, image_filename)
-        
-        image.save(image_path, "JPEG")
-        
-        chunk_text = ""
-        if client:
-            try:
-                prompt = "Transcribe the text on this page exactly. If there are diagrams or images, describe them briefly in [brackets] inline with the text. Do not use markdown code blocks for the Output."
-                response = client.models.generate_content(
-                    model=MODEL_NAME,
-                    contents=[prompt, image]
-                )
-                chunk_text = response.text
-            except Exception as e:
-                print(f"OCR Error Page {page_num}: {e}")
-                chunk_text = "[Error extracting text]"
-        
-        image_url = f"/uploads/{story_id}/{image_filename}"
-        final_text = f"![Page {page_num}]({image_url})\n\n{chunk_text}"
-        
-        chunks.append(Chunk(
-            id=i, 
-            text=final_text, 
-            formattedText=final_text,
-            isProcessed=True
-        ))
+        page = pages.get(page_num)
+        if page is not None and page.text is not None:
+            image_url = await asyncio.to_thread(save_page_jpeg, storage, story_id, page_num, page.jpeg)
+            stored_bytes += len(page.jpeg)
+            final_text = page_markdown(page_num, image_url, page.text)
 
-    # 2. Create Placeholders for Remaining
-    for i in range(initial_pages, total_pages):
-        page_num = i + 1
+            chunks.append(Chunk(
+                id=i, 
+                text=final_text, 
+                formattedText=final_text,
+                isProcessed=True
+            ))
+            continue
+
+        # 2. Placeholders for the remaining pages, and for initial pages whose OCR failed
+        if page is not None:
+            failed.append(page_num)
         # No image yet
         chunks.append(Chunk(
             id=i,
@@ -92,45 +252,12 @@ async def upload_pdf(file: UploadFile = File(...), current_user: User = Depends(
             isProcessed=False
         ))
 
-    # Extract Chapters (Outline)
-    chapters_list: List[Chapter] = []
-    try:
-        from pypdf import PdfReader
-        from models import Chapter
-        
-        reader = PdfReader(source_pdf_path)
-        
-        # Recursive function to parse outline
-        def parse_outline(outline, level=0):
-            items = []
-            for item in outline:
-                if isinstance(item, list):
-                     items.extend(parse_outline(item, level + 1))
-                else:
-                    # pypdf outline item
-                    try:
-                        title = item.title
-                        # page_number is 0-indexed using reader.get_destination_page_number
-                        # But item might just have /Page object reference
-                        page_index = reader.get_destination_page_number(item)
-                        if page_index is not None:
-                            items.append(Chapter(title=title, pageIndex=page_index))
-                    except Exception:
-                         continue
-            return items
-
-        if reader.outline:
-            chapters_list = parse_outline(reader.outline)
-            
-    except Exception as e:
-        print(f"Chapter Extraction Error: {e}")
-
     # Create LibraryItem
     new_story = LibraryItem(
         id=story_id,
-        title=file.filename.replace(".pdf", ""),
+        title=filename.replace(".pdf", ""),
         chunks=chunks,
-        chapters=chapters_list,
+        chapters=metadata.chapters,
         currentIndex=0,
         stats=SessionStats(
             correctAnswers=0, 
@@ -143,6 +270,14 @@ async def upload_pdf(file: UploadFile = File(...), current_user: User = Depends(
         isComplete=False
     )
 
+    stored_bytes += os.path.getsize(source_pdf_path)
+    # A multi-megabyte upload on S3: keep it off the event loop
+    await asyncio.to_thread(storage.put_file, source_key(story_id), source_pdf_path, "application/pdf")
     await db.create_story(new_story, current_user.id)
+    await db.save_pdf_metadata(story_id, metadata)
+    await db.add_storage_bytes(story_id, stored_bytes)
+    if failed:
+        from story_processing import ocr_retries
+        ocr_retries.schedule(story_id, current_user.id, failed)
     
     return new_story
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, RedirectResponse
+from storage import storage
+from http_cache import IMMUTABLE_CACHE_CONTROL, etag_matches, not_modified
+
+router = APIRouter(prefix="/uploads", tags=["Uploads"])
+
+@router.get("/{key:path}")
+async def get_upload(key: str, request: Request):
+    # Local driver: stream from disk. Object store: send the client straight to the bucket
+    # so image bytes never pass through the API process.
+    path = storage.file_path(key)
+    if path:
+        etag = storage.etag(key)
+        if etag_matches(request, etag):
+            return not_modified(etag, IMMUTABLE_CACHE_CONTROL)
+        return FileResponse(path, headers={"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL})
+
+    url = storage.direct_url(key)
+    if url:
+        return RedirectResponse(url, status_code=307)
+
+    raise HTTPException(status_code=404, detail="File not found")
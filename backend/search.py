@@ -0,0 +1,251 @@
+import re
+from typing import List, Sequence, Tuple
+from sqlalchemy import text
+
+from models import Chunk, SearchHit
+
+# Full-text index over chunk text.
+# SQLite: an FTS5 virtual table ranked with bm25(). Postgres: a table with a generated
+# tsvector column and a GIN index, ranked with ts_rank(). Both are keyed by (story_id, chunk_index)
+# and carry user_id so a library-wide search is one indexed query.
+#
+# FTS5 can't index its UNINDEXED columns, so filtering chunk_fts on story_id or user_id
+# reads every row. On SQLite chunk_fts_rows maps (story_id, chunk_index) and user_id to the
+# FTS rowid: writes find their rows through it, and queries let MATCH pick the candidate rows
+# and join the map on rowid to keep the user's or story's. (Driving from the map instead runs
+# the MATCH once per row and is far slower.)
+
+SNIPPET_START = "**"
+SNIPPET_END = "**"
+
+_IMAGE_MARKDOWN = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_TERM = re.compile(r"\w+", re.UNICODE)
+# Dropped from chat questions before retrieval; they match nearly every chunk
+_QUESTION_STOPWORDS = frozenset(
+    "a an and are as at be but by can did do does for from had has have he her his how i if in into is it its "
+    "me my not of on or she so that the their them they this to was we were what when where which who why "
+    "will with would you your about tell explain happened".split()
+)
+
+def _dialect(conn) -> str:
+    # Works for both AsyncConnection (init) and AsyncSession (request paths)
+    dialect = getattr(conn, "dialect", None) or conn.bind.dialect
+    return dialect.name
+
+def searchable_text(chunk: Chunk) -> str:
+    """Chunk text without the embedded page image link."""
+    return _IMAGE_MARKDOWN.sub("", chunk.text).strip()
+
+async def index_exists(conn) -> bool:
+    if _dialect(conn) == "postgresql":
+        result = await conn.execute(text("SELECT to_regclass('chunk_search') IS NOT NULL"))
+        return bool(result.scalar())
+    result = await conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'chunk_fts'"))
+    return result.scalar() is not None
+
+async def create_row_map(conn) -> None:
+    """chunk_fts_rows, filled from chunk_fts rows indexed before it existed. SQLite only."""
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS chunk_fts_rows ("
+        " id INTEGER PRIMARY KEY,"
+        " story_id VARCHAR NOT NULL,"
+        " chunk_index INTEGER NOT NULL,"
+        " user_id VARCHAR NOT NULL,"
+        " UNIQUE (story_id, chunk_index))"
+    ))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_chunk_fts_rows_user ON chunk_fts_rows (user_id)"))
+    await conn.execute(text(
+        "INSERT OR IGNORE INTO chunk_fts_rows (id, story_id, chunk_index, user_id)"
+        " SELECT rowid, story_id, chunk_index, user_id FROM chunk_fts"
+    ))
+
+async def create_index(conn) -> None:
+    if _dialect(conn) == "postgresql":
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS chunk_search ("
+            " story_id VARCHAR NOT NULL,"
+            " user_id VARCHAR NOT NULL,"
+            " chunk_index INTEGER NOT NULL,"
+            " text TEXT NOT NULL,"
+            " tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', text)) STORED,"
+            " PRIMARY KEY (story_id, chunk_index))"
+        ))
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_chunk_search_tsv ON chunk_search USING GIN (tsv)"))
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_chunk_search_user ON chunk_search (user_id)"))
+    else:
+        await conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunk_fts USING fts5("
+            "text, story_id UNINDEXED, user_id UNINDEXED, chunk_index UNINDEXED, tokenize='unicode61')"
+        ))
+        await create_row_map(conn)
+
+async def _delete_chunks(conn, story_id: str, chunk_indexes: Sequence[int]) -> None:
+    if not chunk_indexes:
+        return
+    keys = [{"story_id": story_id, "chunk_index": i} for i in chunk_indexes]
+    if _dialect(conn) == "postgresql":
+        await conn.execute(
+            text("DELETE FROM chunk_search WHERE story_id = :story_id AND chunk_index = :chunk_index"), keys
+        )
+        return
+    await conn.execute(
+        text(
+            "DELETE FROM chunk_fts WHERE rowid ="
+            " (SELECT id FROM chunk_fts_rows WHERE story_id = :story_id AND chunk_index = :chunk_index)"
+        ),
+        keys,
+    )
+    await conn.execute(
+        text("DELETE FROM chunk_fts_rows WHERE story_id = :story_id AND chunk_index = :chunk_index"), keys
+    )
+
+async def index_chunks(conn, story_id: str, user_id: str, chunks: Sequence[Chunk]) -> None:
+    """(Re)index the given chunks of a story. Unprocessed placeholders are skipped."""
+    chunks = [c for c in chunks if c.isProcessed]
+    if not chunks:
+        return
+    await _delete_chunks(conn, story_id, [c.id for c in chunks])
+    rows = []
+    for c in chunks:
+        body = searchable_text(c)
+        if body:
+            rows.append({"story_id": story_id, "user_id": user_id, "chunk_index": c.id, "text": body})
+    if not rows:
+        return
+    if _dialect(conn) == "postgresql":
+        await conn.execute(
+            text("INSERT INTO chunk_search (story_id, user_id, chunk_index, text) VALUES (:story_id, :user_id, :chunk_index, :text)"),
+            rows,
+        )
+        return
+    await conn.execute(
+        text("INSERT INTO chunk_fts_rows (story_id, chunk_index, user_id) VALUES (:story_id, :chunk_index, :user_id)"),
+        rows,
+    )
+    await conn.execute(
+        text(
+            "INSERT INTO chunk_fts (rowid, story_id, user_id, chunk_index, text)"
+            " SELECT id, story_id, user_id, chunk_index, :text FROM chunk_fts_rows"
+            " WHERE story_id = :story_id AND chunk_index = :chunk_index"
+        ),
+        rows,
+    )
+
+async def sync_story(conn, story_id: str, user_id: str, chunks: Sequence[Chunk]) -> None:
+    """Bring a story's index in line with its saved chunks, rewriting only the chunks whose text changed."""
+    if _dialect(conn) == "postgresql":
+        stmt = text("SELECT chunk_index, text FROM chunk_search WHERE story_id = :story_id")
+    else:
+        stmt = text(
+            "SELECT m.chunk_index, f.text FROM chunk_fts_rows m"
+            " JOIN chunk_fts f ON f.rowid = m.id WHERE m.story_id = :story_id"
+        )
+    indexed = {int(row[0]): row[1] for row in (await conn.execute(stmt, {"story_id": story_id})).all()}
+    wanted = {c.id: searchable_text(c) for c in chunks if c.isProcessed}
+    changed = [c for c in chunks if c.isProcessed and wanted[c.id] != indexed.get(c.id, "")]
+    await _delete_chunks(conn, story_id, [i for i in indexed if not wanted.get(i)])
+    await index_chunks(conn, story_id, user_id, changed)
+
+async def remove_story(conn, story_id: str) -> None:
+    if _dialect(conn) == "postgresql":
+        await conn.execute(text("DELETE FROM chunk_search WHERE story_id = :story_id"), {"story_id": story_id})
+        return
+    await conn.execute(
+        text("DELETE FROM chunk_fts WHERE rowid IN (SELECT id FROM chunk_fts_rows WHERE story_id = :story_id)"),
+        {"story_id": story_id},
+    )
+    await conn.execute(text("DELETE FROM chunk_fts_rows WHERE story_id = :story_id"), {"story_id": story_id})
+
+def _fts5_query(query: str) -> str:
+    # Quote every term so user input can't inject FTS5 syntax; prefix-match the last one
+    terms = _TERM.findall(query)
+    if not terms:
+        return ""
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def _tsquery(query: str) -> str:
+    # Same rules for Postgres: AND of sanitised terms, last one as a prefix
+    terms = _TERM.findall(query)
+    if not terms:
+        return ""
+    terms[-1] += ":*"
+    return " & ".join(terms)
+
+async def search(conn, user_id: str, query: str, limit: int, offset: int) -> List[SearchHit]:
+    if _dialect(conn) == "postgresql":
+        tsquery = _tsquery(query)
+        if not tsquery:
+            return []
+        stmt = text(
+            "SELECT s.story_id, l.title, s.chunk_index,"
+            " ts_headline('english', s.text, q, :headline_opts) AS snippet,"
+            " ts_rank(s.tsv, q) AS score"
+            " FROM chunk_search s"
+            " JOIN library_items l ON l.id = s.story_id,"
+            " to_tsquery('english', :query) q"
+            " WHERE s.user_id = :user_id AND s.tsv @@ q"
+            " ORDER BY score DESC, s.story_id, s.chunk_index"
+            " LIMIT :limit OFFSET :offset"
+        )
+        params = {
+            "query": tsquery,
+            "headline_opts": f"StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxWords=24, MinWords=8",
+        }
+    else:
+        match = _fts5_query(query)
+        if not match:
+            return []
+        # bm25() is "lower is better"; negate it so score is "higher is better" on both backends
+        stmt = text(
+            "SELECT m.story_id, l.title, m.chunk_index,"
+            " snippet(chunk_fts, 0, :start, :end, '…', 16) AS snippet,"
+            " -bm25(chunk_fts) AS score"
+            " FROM chunk_fts"
+            " JOIN chunk_fts_rows m ON m.id = chunk_fts.rowid"
+            " JOIN library_items l ON l.id = m.story_id"
+            " WHERE chunk_fts MATCH :query AND m.user_id = :user_id"
+            " ORDER BY bm25(chunk_fts), m.story_id, m.chunk_index"
+            " LIMIT :limit OFFSET :offset"
+        )
+        params = {"query": match, "start": SNIPPET_START, "end": SNIPPET_END}
+
+    result = await conn.execute(stmt, {**params, "user_id": user_id, "limit": limit, "offset": offset})
+    return [
+        SearchHit(storyId=row[0], storyTitle=row[1], chunkIndex=int(row[2]), snippet=row[3], score=float(row[4]))
+        for row in result.all()
+    ]
+
+def _question_terms(question: str) -> List[str]:
+    terms = []
+    for term in _TERM.findall(question.lower()):
+        if term not in _QUESTION_STOPWORDS and term not in terms:
+            terms.append(term)
+    return terms
+
+async def retrieve(conn, story_id: str, user_id: str, question: str, limit: int) -> List[Tuple[int, str]]:
+    """
+    Chunks of one story most relevant to a free-form question, best first, as (chunk_index, text).
+    Unlike search(), any term may match (OR), so a question ranks chunks by how much they share with it.
+    """
+    terms = _question_terms(question)
+    if not terms:
+        return []
+    if _dialect(conn) == "postgresql":
+        stmt = text(
+            "SELECT chunk_index, text FROM chunk_search, to_tsquery('english', :query) q"
+            " WHERE story_id = :story_id AND user_id = :user_id AND tsv @@ q"
+            " ORDER BY ts_rank(tsv, q) DESC, chunk_index LIMIT :limit"
+        )
+        query = " | ".join(terms)
+    else:
+        stmt = text(
+            "SELECT m.chunk_index, chunk_fts.text FROM chunk_fts"
+            " JOIN chunk_fts_rows m ON m.id = chunk_fts.rowid"
+            " WHERE chunk_fts MATCH :query AND m.story_id = :story_id AND m.user_id = :user_id"
+            " ORDER BY bm25(chunk_fts), m.chunk_index LIMIT :limit"
+        )
+        query = " OR ".join(f'"{t}"' for t in terms)
+    result = await conn.execute(stmt, {"query": query, "story_id": story_id, "user_id": user_id, "limit": limit})
+    return [(int(row[0]), row[1]) for row in result.all()]
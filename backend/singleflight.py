@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import weakref
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterable, List, Tuple
+
+# Request coalescing. Concurrent identical requests share one in-flight computation
+# instead of each paying for it (model calls, page rendering + OCR).
+#
+# The shared work runs in its own task, so a caller that disconnects or is cancelled
+# doesn't cancel the result the other callers are waiting for. Errors are shared too.
+# This is per process: replicas don't coalesce with each other.
+
+def content_key(*parts: str) -> str:
+    """Stable key for a request body (e.g. endpoint name + chunk text)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution of fn."""
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+
+class PageFlight:
+    """
+    Coalesces work on overlapping page sets of one document.
+
+    Each request asks for a set of pages; pages another request is already producing are
+    waited on, and only the rest are handed to `produce`. Two requests for pages 6-10 and
+    8-12 therefore render 6-12 once between them.
+    """
+    def __init__(self):
+        self._pages: Dict[Tuple[Hashable, int], asyncio.Future] = {}
+        self._tasks = set()  # Strong references to running producers
+
+    async def run(
+        self,
+        doc_key: Hashable,
+        page_nums: Iterable[int],
+        produce: Callable[[List[int]], AsyncIterator[Tuple[int, Any]]],
+    ) -> Dict[int, Any]:
+        """Return {page_num: value} for all requested pages. `produce` yields (page_num, value) in any order."""
+        loop = asyncio.get_running_loop()
+        page_nums = list(page_nums)
+        claimed = []
+        for n in page_nums:
+            if (doc_key, n) not in self._pages:
+                self._pages[(doc_key, n)] = loop.create_future()
+                claimed.append(n)
+        futures = {n: self._pages[(doc_key, n)] for n in page_nums}
+
+        if claimed:
+            task = asyncio.ensure_future(self._produce(doc_key, claimed, produce))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return {n: await asyncio.shield(f) for n, f in futures.items()}
+
+    async def _produce(self, doc_key, claimed: List[int], produce) -> None:
+        try:
+            async for n, value in produce(claimed):
+                future = self._pages.pop((doc_key, n), None)
+                if future is not None and not future.done():
+                    future.set_result(value)
+            missing = [n for n in claimed if (doc_key, n) in self._pages]
+            if missing:
+                raise RuntimeError(f"Pages not produced: {missing}")
+        except asyncio.CancelledError:
+            for n in claimed:
+                future = self._pages.pop((doc_key, n), None)
+                if future is not None:
+                    future.cancel()
+            raise
+        except Exception as e:
+            for n in claimed:
+                future = self._pages.pop((doc_key, n), None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+                    # Mark retrieved so an unawaited failure doesn't log "exception never retrieved"
+                    future.exception()
+
+
+class KeyedLocks:
+    """One asyncio.Lock per key, dropped once nobody holds or waits on it."""
+    def __init__(self):
+        self._locks = weakref.WeakValueDictionary()
+
+    def __call__(self, key: Hashable) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[key] = lock
+        return lock
+
+
+# Global instances
+ai_flight = SingleFlight()
+page_flight = PageFlight()
+story_locks = KeyedLocks()
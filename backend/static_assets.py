@@ -0,0 +1,127 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import Response
+from fastapi.responses import FileResponse
+
+from compression import brotli, choose_encoding
+
+# The built SPA (frontend/dist), served from memory.
+#
+# At startup every file is read once and hashed, and compressible ones get brotli and gzip
+# variants: the .br/.gz files next to it if the build wrote them (modal_app.py does, at
+# brotli quality 11), otherwise compressed here at STATIC_BROTLI_QUALITY, since 11 takes
+# seconds per megabyte of JavaScript and would delay cold starts. Requests are then a dict
+# lookup: no filesystem calls, no per-request compression. Vite's fingerprinted bundles (assets/name-<hash>.js) never change under the
+# same name, so they are cached for a year; everything else (index.html, favicon, ...) is
+# revalidated with its ETag on each use, so a deploy is picked up on the next page load.
+
+STATIC_MAX_MEMORY_FILE = int(os.getenv("STATIC_MAX_MEMORY_FILE", str(4 * 1024 * 1024)))
+STATIC_MIN_COMPRESS_SIZE = 512
+STATIC_BROTLI_QUALITY = int(os.getenv("STATIC_BROTLI_QUALITY", "9"))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# name-<hash>.ext as emitted by Vite/Rollup (8+ url-safe base64 characters)
+_FINGERPRINT = re.compile(r"-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$")
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/manifest+json")
+_VARIANT_SUFFIXES = {".br": "br", ".gz": "gzip"}
+
+class Asset(NamedTuple):
+    media_type: str
+    etag: str  # Content hash; each encoding gets its own tag derived from it
+    cache_control: str
+    body: Optional[bytes]  # None: too big to hold, served from `path`
+    path: str
+    variants: Dict[str, bytes]  # Content-Encoding -> compressed body
+
+def is_fingerprinted(rel_path: str) -> bool:
+    return rel_path.startswith("assets/") and bool(_FINGERPRINT.search(rel_path))
+
+def _media_type(rel_path: str) -> str:
+    media_type = mimetypes.guess_type(rel_path)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type == "application/javascript":
+        media_type += "; charset=utf-8"
+    return media_type
+
+def _load(root: str, rel_path: str, brotli_quality: int) -> Asset:
+    path = os.path.join(root, rel_path)
+    media_type = _media_type(rel_path)
+    cache_control = IMMUTABLE if is_fingerprinted(rel_path) else REVALIDATE
+    if os.path.getsize(path) > STATIC_MAX_MEMORY_FILE:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return Asset(media_type, digest.hexdigest()[:20], cache_control, None, path, {})
+
+    with open(path, "rb") as f:
+        body = f.read()
+    etag = hashlib.sha256(body).hexdigest()[:20]
+    variants = {}
+    for suffix, encoding in _VARIANT_SUFFIXES.items():
+        if os.path.isfile(path + suffix):
+            with open(path + suffix, "rb") as f:
+                variants[encoding] = f.read()
+    if len(body) >= STATIC_MIN_COMPRESS_SIZE and media_type.startswith(_COMPRESSIBLE):
+        if "gzip" not in variants:
+            variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+        if "br" not in variants and brotli is not None:
+            variants["br"] = brotli.compress(body, quality=brotli_quality)
+    # A variant that doesn't save anything isn't worth the Vary
+    variants = {e: v for e, v in variants.items() if len(v) < len(body)}
+    return Asset(media_type, etag, cache_control, body, path, variants)
+
+
+class StaticSite:
+    """Index of a built single-page app: files by URL path, falling back to index.html."""
+    def __init__(self, assets: Dict[str, Asset], index: str = "index.html"):
+        self.assets = assets
+        self.index = assets.get(index)
+
+    @classmethod
+    def build(cls, root: str, brotli_quality: int = STATIC_BROTLI_QUALITY) -> "StaticSite":
+        assets = {}
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                assets[os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, "/")] = None
+        # Precompressed siblings (app.js.br) belong to their file, not the URL space
+        for rel_path in [p for p in assets if os.path.splitext(p)[1] in _VARIANT_SUFFIXES]:
+            if os.path.splitext(rel_path)[0] in assets:
+                del assets[rel_path]
+        site = cls({p: _load(root, p, brotli_quality) for p in assets})
+        stored = sum(len(a.body or b"") + sum(map(len, a.variants.values())) for a in site.assets.values())
+        print(f"Static assets: {len(site.assets)} files from {root}, {stored / 1024:.0f} KiB in memory")
+        return site
+
+    def lookup(self, path: str) -> Optional[Asset]:
+        """The asset for a URL path; unknown paths get index.html (client-side routes), except
+        under assets/, where a miss is a stale bundle name and must not be answered with HTML."""
+        path = path.lstrip("/")
+        asset = self.assets.get(path)
+        if asset is None and not path.startswith("assets/"):
+            asset = self.index
+        return asset
+
+    def response(self, path: str, accept_encoding: str = "", if_none_match: str = "") -> Response:
+        asset = self.lookup(path)
+        if asset is None:
+            return Response(status_code=404)
+        encoding = choose_encoding(accept_encoding, available=tuple(asset.variants)) if asset.variants else None
+        etag = f'"{asset.etag}-{encoding}"' if encoding else f'"{asset.etag}"'
+        headers = {"Cache-Control": asset.cache_control, "ETag": etag}
+        if asset.variants:
+            headers["Vary"] = "Accept-Encoding"
+        if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers=headers)
+        if asset.body is None:
+            return FileResponse(asset.path, media_type=asset.media_type, headers=headers)
+        if encoding is None:
+            return Response(asset.body, media_type=asset.media_type, headers=headers)
+        headers["Content-Encoding"] = encoding
+        return Response(asset.variants[encoding], media_type=asset.media_type, headers=headers)
@@ -0,0 +1,310 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterator, NamedTuple, Optional
+
+# Where story artifacts live. "local" keeps the old UPLOAD_DIR layout on disk
+# (the Modal volume in production), "s3" talks to any S3-compatible store (AWS, R2, MinIO).
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "/data/uploads")
+
+S3_BUCKET = os.getenv("S3_BUCKET", "focusread")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. http://localhost:9000 for MinIO
+S3_REGION = os.getenv("S3_REGION")
+S3_PUBLIC_URL = os.getenv("S3_PUBLIC_URL")  # Public bucket / CDN base, if any
+S3_PRESIGN_EXPIRY = int(os.getenv("S3_PRESIGN_EXPIRY", "3600"))
+
+THUMBNAIL_SIZE = (320, 320)
+OBJECT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# --- Keys ---
+# Every artifact of a story lives under "{story_id}/", so a story can be removed with one prefix delete.
+
+def source_key(story_id: str) -> str:
+    return f"{story_id}/source.pdf"
+
+def page_key(story_id: str, page_num: int) -> str:
+    return f"{story_id}/{page_num}.jpg"
+
+def thumbnail_key(story_id: str) -> str:
+    return f"{story_id}/thumbnail.jpg"
+
+
+class StoredObject(NamedTuple):
+    key: str
+    size: int
+    modified: float  # Unix time
+
+
+class Storage:
+    """
+    Interface for storing story artifacts (source PDFs, rendered pages, thumbnails).
+    Keys are relative, "/"-separated paths such as "<story_id>/3.jpg".
+    """
+    def put_bytes(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        raise NotImplementedError
+
+    def put_file(self, key: str, src_path: str, content_type: Optional[str] = None) -> None:
+        """Store the file at src_path under key. The source file is consumed (moved or deleted)."""
+        raise NotImplementedError
+
+    def get_bytes(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def download_to(self, key: str, dest_path: str) -> None:
+        """Copy the object at key to dest_path."""
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix: str) -> None:
+        raise NotImplementedError
+
+    def list_objects(self) -> Iterator[StoredObject]:
+        """Every stored object, in no particular order. Used by the storage sweeper."""
+        raise NotImplementedError
+
+    def local_path(self, key: str):
+        """Context manager yielding a filesystem path for key, for tools that need a real file (pdftoppm, pypdf)."""
+        raise NotImplementedError
+
+    def file_path(self, key: str) -> Optional[str]:
+        """Path on this machine the API can stream key from, or None if the bytes live elsewhere."""
+        return None
+
+    def direct_url(self, key: str) -> Optional[str]:
+        """URL a client can fetch key from without going through the API (public or presigned)."""
+        return None
+
+    def etag(self, key: str) -> Optional[str]:
+        """Strong ETag (content hash) for key, if this backend serves the bytes itself."""
+        return None
+
+    def url(self, key: str) -> str:
+        """Stable URL to embed in chunk text. Must not expire, so presigned URLs are never returned here."""
+        return f"/uploads/{key}"
+
+
+class LocalStorage(Storage):
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        root = os.path.abspath(self.root)
+        path = os.path.abspath(os.path.join(root, key))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def put_bytes(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def put_file(self, key: str, src_path: str, content_type: Optional[str] = None) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.move(src_path, path)
+
+    def get_bytes(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self._path(key))
+
+    def download_to(self, key: str, dest_path: str) -> None:
+        shutil.copyfile(self._path(key), dest_path)
+
+    def delete_prefix(self, prefix: str) -> None:
+        path = self._path(prefix)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.isfile(path):
+            os.remove(path)
+
+    def list_objects(self) -> Iterator[StoredObject]:
+        root = os.path.abspath(self.root)
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue  # Deleted while walking
+                key = os.path.relpath(path, root).replace(os.sep, "/")
+                yield StoredObject(key, stat.st_size, stat.st_mtime)
+
+    @contextmanager
+    def local_path(self, key: str) -> Iterator[str]:
+        yield self._path(key)
+
+    def file_path(self, key: str) -> Optional[str]:
+        try:
+            path = self._path(key)
+        except ValueError:
+            return None
+        return path if os.path.isfile(path) else None
+
+    def etag(self, key: str) -> Optional[str]:
+        path = self.file_path(key)
+        if not path:
+            return None
+        stat = os.stat(path)
+        return _file_digest(path, stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=4096)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    # mtime/size are part of the cache key so a rewritten file is rehashed
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+class S3Storage(Storage):
+    """
+    S3-compatible driver. `client` is a boto3 S3 client (or anything exposing the same calls),
+    created lazily so boto3 is only needed when this backend is configured.
+    """
+    def __init__(
+        self,
+        bucket: str,
+        client=None,
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        public_url: Optional[str] = None,
+        presign_expiry: int = 3600,
+    ):
+        self.bucket = bucket
+        self._client = client
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.public_url = public_url.rstrip("/") if public_url else None
+        self.presign_expiry = presign_expiry
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+            self._client = boto3.client("s3", endpoint_url=self.endpoint_url, region_name=self.region)
+        return self._client
+
+    def _extra_args(self, content_type: Optional[str]) -> dict:
+        # Keys are never rewritten with different content, so the bucket/CDN can cache them forever
+        extra = {"CacheControl": OBJECT_CACHE_CONTROL}
+        if content_type:
+            extra["ContentType"] = content_type
+        return extra
+
+    def put_bytes(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, **self._extra_args(content_type))
+
+    def put_file(self, key: str, src_path: str, content_type: Optional[str] = None) -> None:
+        self.client.upload_file(src_path, self.bucket, key, ExtraArgs=self._extra_args(content_type))
+        os.remove(src_path)
+
+    def get_bytes(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+    def exists(self, key: str) -> bool:
+        result = self.client.list_objects_v2(Bucket=self.bucket, Prefix=key, MaxKeys=1)
+        return any(obj["Key"] == key for obj in result.get("Contents", []))
+
+    def download_to(self, key: str, dest_path: str) -> None:
+        self.client.download_file(self.bucket, key, dest_path)
+
+    def delete_prefix(self, prefix: str) -> None:
+        prefix = prefix.rstrip("/") + "/"
+        token = None
+        while True:
+            kwargs = {"Bucket": self.bucket, "Prefix": prefix}
+            if token:
+                kwargs["ContinuationToken"] = token
+            result = self.client.list_objects_v2(**kwargs)
+            objects = [{"Key": obj["Key"]} for obj in result.get("Contents", [])]
+            if objects:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects})
+            if not result.get("IsTruncated"):
+                break
+            token = result.get("NextContinuationToken")
+
+    def list_objects(self) -> Iterator[StoredObject]:
+        token = None
+        while True:
+            kwargs = {"Bucket": self.bucket, "Prefix": ""}
+            if token:
+                kwargs["ContinuationToken"] = token
+            result = self.client.list_objects_v2(**kwargs)
+            for obj in result.get("Contents", []):
+                yield StoredObject(obj["Key"], obj["Size"], obj["LastModified"].timestamp())
+            if not result.get("IsTruncated"):
+                break
+            token = result.get("NextContinuationToken")
+
+    @contextmanager
+    def local_path(self, key: str) -> Iterator[str]:
+        suffix = os.path.splitext(key)[1]
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        try:
+            self.download_to(key, path)
+            yield path
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def direct_url(self, key: str) -> Optional[str]:
+        if self.public_url:
+            return f"{self.public_url}/{key}"
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=self.presign_expiry,
+        )
+
+    def url(self, key: str) -> str:
+        # With a public bucket/CDN the image URL can point there directly.
+        # Otherwise /uploads/{key} redirects to a fresh presigned URL on each fetch.
+        if self.public_url:
+            return f"{self.public_url}/{key}"
+        return super().url(key)
+
+
+def save_page_jpeg(store: Storage, story_id: str, page_num: int, jpeg: bytes) -> str:
+    """Store a rendered page (already JPEG-encoded) and return the URL to embed in the chunk."""
+    key = page_key(story_id, page_num)
+    store.put_bytes(key, jpeg, "image/jpeg")
+
+    if page_num == 1:
+        from PIL import Image
+        thumb = Image.open(io.BytesIO(jpeg))
+        thumb.thumbnail(THUMBNAIL_SIZE)
+        buffer = io.BytesIO()
+        thumb.convert("RGB").save(buffer, "JPEG")
+        store.put_bytes(thumbnail_key(story_id), buffer.getvalue(), "image/jpeg")
+
+    return store.url(key)
+
+
+def create_storage() -> Storage:
+    if STORAGE_BACKEND == "s3":
+        return S3Storage(
+            bucket=S3_BUCKET,
+            endpoint_url=S3_ENDPOINT_URL,
+            region=S3_REGION,
+            public_url=S3_PUBLIC_URL,
+            presign_expiry=S3_PRESIGN_EXPIRY,
+        )
+    return LocalStorage(UPLOAD_DIR)
+
+# Global instance
+storage = create_storage()
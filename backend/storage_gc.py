@@ -0,0 +1,112 @@
+import asyncio
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional
+
+from storage import Storage, storage
+import partial_uploads
+
+# Storage sweeper: reconciles stored artifacts against library_items.
+#
+# - Prefixes ("{story_id}/...") with no matching story are deleted: stories deleted before
+#   artifacts were cleaned up, and uploads that failed half-way.
+# - Partial upload files without a session are deleted.
+# - library_items.storage_bytes is reset to what is actually stored, which is what
+#   per-user usage and quotas are computed from.
+#
+# Anything modified within STORAGE_GC_GRACE_SECONDS is left alone, so an upload that is
+# still being ingested (pages written before its story row exists) is never swept.
+
+STORAGE_GC_INTERVAL = int(os.getenv("STORAGE_GC_INTERVAL", str(6 * 3600)))  # Seconds; 0 disables
+STORAGE_GC_GRACE_SECONDS = int(os.getenv("STORAGE_GC_GRACE_SECONDS", "3600"))
+STORAGE_QUOTA_BYTES = int(os.getenv("STORAGE_QUOTA_BYTES", "0"))  # Per user; 0 is unlimited
+
+class SweepReport(NamedTuple):
+    orphans_deleted: List[str]
+    bytes_freed: int
+    partials_deleted: int
+    user_bytes: Dict[str, int]
+
+async def sweep(store: Storage = storage, dry_run: bool = False, grace: int = STORAGE_GC_GRACE_SECONDS) -> SweepReport:
+    from database import db
+
+    # One listing of the whole store, grouped by story prefix
+    objects = await asyncio.to_thread(list, store.list_objects())
+    sizes: Dict[str, int] = defaultdict(int)
+    newest: Dict[str, float] = defaultdict(float)
+    for obj in objects:
+        prefix = obj.key.split("/", 1)[0]
+        sizes[prefix] += obj.size
+        newest[prefix] = max(newest[prefix], obj.modified)
+
+    # Read after listing: a story created meanwhile is in the DB, not an orphan
+    owners = await db.get_story_owners()
+    cutoff = time.time() - grace
+    orphans = [p for p in sizes if p not in owners and newest[p] < cutoff]
+    if not dry_run:
+        for prefix in orphans:
+            await asyncio.to_thread(store.delete_prefix, prefix)
+        await db.set_storage_bytes({story_id: sizes.get(story_id, 0) for story_id in owners})
+
+    partials = await _sweep_partial_uploads(cutoff, dry_run)
+
+    user_bytes: Dict[str, int] = defaultdict(int)
+    for story_id, user_id in owners.items():
+        user_bytes[user_id] += sizes.get(story_id, 0)
+    return SweepReport(orphans, sum(sizes[p] for p in orphans), partials, dict(user_bytes))
+
+async def _sweep_partial_uploads(cutoff: float, dry_run: bool) -> int:
+    from database import db
+
+    directory = partial_uploads.PARTIAL_UPLOAD_DIR
+    if not os.path.isdir(directory):
+        return 0
+    sessions = set(await db.get_upload_session_ids())
+    deleted = 0
+    for entry in os.scandir(directory):
+        if entry.name in sessions or entry.stat().st_mtime >= cutoff:
+            continue
+        if not dry_run:
+            partial_uploads.remove(entry.name)
+        deleted += 1
+    return deleted
+
+def print_report(report: SweepReport) -> None:
+    print(
+        f"Storage sweep: {len(report.orphans_deleted)} orphaned stories ({report.bytes_freed} bytes), "
+        f"{report.partials_deleted} partial uploads removed"
+    )
+    for user_id, size in sorted(report.user_bytes.items(), key=lambda item: -item[1]):
+        print(f"  {user_id}: {size} bytes")
+
+async def run_periodically(interval: int = STORAGE_GC_INTERVAL) -> None:
+    """Background task started from the app lifespan. Waits one interval before the first sweep."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            print_report(await sweep())
+        except Exception as e:
+            print(f"Storage sweep failed: {e}")
+
+async def check_quota(user_id: str, incoming_bytes: int) -> Optional[str]:
+    """Error message if storing incoming_bytes more would put the user over quota."""
+    if not STORAGE_QUOTA_BYTES:
+        return None
+    from database import db
+    used = await db.get_storage_usage(user_id)
+    if used + incoming_bytes > STORAGE_QUOTA_BYTES:
+        return f"Storage quota exceeded: {used} of {STORAGE_QUOTA_BYTES} bytes used, upload needs {incoming_bytes}"
+    return None
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Delete orphaned upload artifacts and report per-user usage")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    async def main():
+        from database import db
+        await db.init_db()
+        print_report(await sweep(dry_run=args.dry_run))
+    asyncio.run(main())
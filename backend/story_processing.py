@@ -0,0 +1,151 @@
+import asyncio
+import os
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from database import db
+from models import LibraryItem
+
+# Rendering + OCR of a story's pending PDF pages, for /stories/{id}/process and for retries.
+#
+# A page whose OCR fails (model error, timeout, circuit breaker open) is not saved: its chunk
+# stays unprocessed with its placeholder rather than having an error message saved as its
+# text. The page is queued for another attempt after OCR_RETRY_DELAY seconds, doubling per
+# attempt (and never before the circuit breaker lets calls through), up to OCR_RETRY_ATTEMPTS.
+# Retries are per process; a page that runs out of attempts (or was queued on a replica that
+# restarted) is still picked up by the next /process request that reaches it.
+
+OCR_RETRY_DELAY = float(os.getenv("OCR_RETRY_DELAY", "30"))
+OCR_RETRY_ATTEMPTS = int(os.getenv("OCR_RETRY_ATTEMPTS", "5"))
+
+async def process_pages(story_id: str, user_id: str, page_nums: Iterable[int]) -> Optional[LibraryItem]:
+    """
+    Render and OCR pages (1-based) and save them into the story. Returns the updated story,
+    or None when the story has no source PDF or is gone. Pages past the PDF's end are ignored.
+    """
+    from storage import storage, save_page_jpeg
+    from ocr import ocr_page, ocr_pages, page_markdown
+    from pdf_pipeline import render_and_ocr
+    from pdf_meta import documents
+    from singleflight import page_flight, story_locks
+
+    # Pages are rendered across cores and each is OCR'd as soon as it is rasterized.
+    # The source PDF and its metadata come from the document cache, so consecutive
+    # batches of the same book neither re-download nor re-inspect it.
+    async def produce(pages):
+        async with documents.open(story_id) as doc:
+            stored = 0
+            ocr = partial(ocr_page, user_id=user_id)
+            ocr_batch = partial(ocr_pages, user_id=user_id)
+            async for page in render_and_ocr(doc.path, pages, ocr=ocr, ocr_batch=ocr_batch):
+                if page.text is None:
+                    yield page.page_num, None
+                    continue
+                # Thumbnail encoding and the storage upload (a round-trip on S3) stay off the event loop
+                image_url = await asyncio.to_thread(save_page_jpeg, storage, story_id, page.page_num, page.jpeg)
+                stored += len(page.jpeg)
+                yield page.page_num, page_markdown(page.page_num, image_url, page.text)
+            await db.add_storage_bytes(story_id, stored)
+
+    async with documents.open(story_id) as doc:
+        if doc is None:
+            # If source doesn't exist, we can't process. Maybe it was an imported text, not PDF.
+            # Or it's a legacy upload.
+            return None
+        page_nums = [n for n in page_nums if 1 <= n <= doc.metadata.pageCount]
+        # Concurrent requests for overlapping ranges (double clicks, effects firing twice)
+        # share pages: each page is rendered and OCR'd once, whoever asked first
+        texts = await page_flight.run(story_id, page_nums, produce)
+
+    # Apply to the latest stored story, one writer at a time, so pages written by a
+    # concurrent batch aren't overwritten with the placeholders this request read
+    async with story_locks(story_id):
+        story = await db.get_story(story_id, user_id)
+        if not story:
+            return None
+        changed = []
+        failed = []
+        for page_num, final_text in texts.items():
+            if page_num > len(story.chunks):
+                # The story was saved with fewer chunks while this batch was rendering
+                print(f"Skipping page {page_num} of {story_id}: story now has {len(story.chunks)} chunks")
+                continue
+            chunk = story.chunks[page_num - 1]
+            if final_text is None:
+                if not chunk.isProcessed:
+                    failed.append(page_num)
+                continue
+            # Update Chunk in place
+            chunk.text = final_text
+            chunk.formattedText = final_text
+            chunk.isProcessed = True
+            changed.append(chunk)
+
+        updated = story
+        if changed:
+            # Also reindexes the pages that got text
+            updated = await db.update_story(story_id, story, user_id)
+    ocr_retries.done(story_id, [n for n in texts if n not in failed])
+    if failed:
+        ocr_retries.schedule(story_id, user_id, failed)
+    return updated
+
+
+class OcrRetries:
+    """Pages whose OCR failed, retried in the background with exponential backoff."""
+    def __init__(self, delay: float = OCR_RETRY_DELAY, attempts: int = OCR_RETRY_ATTEMPTS):
+        self.delay = delay
+        self.attempts = attempts
+        self._failures: Dict[Tuple[str, int], int] = {}  # (story, page) -> failed attempts
+        self._pending: Dict[str, Tuple[str, Set[int]]] = {}  # story -> (user, pages)
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def pending(self, story_id: str) -> Set[int]:
+        return set(self._pending.get(story_id, ("", set()))[1])
+
+    def schedule(self, story_id: str, user_id: str, page_nums: List[int]) -> None:
+        pages = self._pending.setdefault(story_id, (user_id, set()))[1]
+        for n in page_nums:
+            failures = self._failures.get((story_id, n), 0) + 1
+            self._failures[(story_id, n)] = failures
+            if failures <= self.attempts:
+                pages.add(n)
+            else:
+                # Left for the next /process request that reaches it, which starts a fresh count
+                del self._failures[(story_id, n)]
+                print(f"OCR retry: giving up on page {n} of {story_id} after {self.attempts} retries")
+        if not pages:
+            self._pending.pop(story_id, None)
+        elif story_id not in self._tasks:
+            failures = min(self._failures[(story_id, n)] for n in pages)
+            self._tasks[story_id] = asyncio.ensure_future(self._retry(story_id, self.delay * 2 ** (failures - 1)))
+
+    def done(self, story_id: str, page_nums: List[int]) -> None:
+        for n in page_nums:
+            self._failures.pop((story_id, n), None)
+
+    def cancel_all(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self._pending.clear()
+
+    async def _retry(self, story_id: str, delay: float) -> None:
+        from model_router import models
+        from ai_quota import check_ai_budget
+        try:
+            await asyncio.sleep(delay)
+            if models.breaker is not None:
+                await asyncio.sleep(models.breaker.retry_after())
+        finally:
+            self._tasks.pop(story_id, None)
+        user_id, pages = self._pending.pop(story_id, ("", set()))
+        if not pages or await check_ai_budget(user_id):
+            return
+        try:
+            await process_pages(story_id, user_id, sorted(pages))
+        except Exception as e:
+            print(f"OCR retry failed for {story_id}: {e}")
+
+# Global instance
+ocr_retries = OcrRetries()
@@ -1,11 +1,17 @@
 import os
+import shutil
 import pytest
 import time
 from fastapi.testclient import TestClient
 
-# Set env var BEFORE importing app/database to override DB URL
+# Set env var BEFORE importing app/database to override DB URL.
+# TEST_DATABASE_URL runs the suite against another backend (e.g. an empty, throwaway Postgres database).
 TEST_DB = "./test_focusread.db"
-os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{TEST_DB}"
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite+aiosqlite:///{TEST_DB}")
+TEST_UPLOAD_DIR = "./test_uploads"
+os.environ["UPLOAD_DIR"] = TEST_UPLOAD_DIR
+TEST_PARTIAL_DIR = "./test_partial_uploads"
+os.environ["PARTIAL_UPLOAD_DIR"] = TEST_PARTIAL_DIR
 
 from main import app
 
@@ -32,6 +38,8 @@ def client():
     # Cleanup after run
     if os.path.exists(TEST_DB):
         os.remove(TEST_DB)
+    shutil.rmtree(TEST_UPLOAD_DIR, ignore_errors=True)
+    shutil.rmtree(TEST_PARTIAL_DIR, ignore_errors=True)
 
 def test_read_main(client):
     response = client.get("/")
@@ -44,7 +52,8 @@ def test_auth_flow(client):
     assert response.json()["username"] == "testuser"
 
 def test_ai_quiz(client):
-    # AI endpoints are currently public, but good to test with client
+    # AI endpoints need a user: calls are charged to them
+    assert TestClient(app).post("/ai/quiz", json={"chunk": "some text"}).status_code == 401
     response = client.post("/ai/quiz", json={"chunk": "some text"})
     assert response.status_code == 200
 
@@ -120,3 +129,609 @@ def test_leaderboard(client):
     assert user_entry is not None
     assert user_entry["total_books_completed"] >= 1
     assert user_entry["total_words_read"] >= 500
+
+def test_reading_events_roll_up_into_history(client):
+    story = {
+        "id": "log-story-1",
+        "title": "Log Story",
+        "chunks": [{"text": "One", "id": 0}, {"text": "Two", "id": 1}],
+        "currentIndex": 0,
+        "stats": {"correctAnswers": 0, "totalQuestions": 0, "startTime": 0, "wordCount": 0},
+        "elapsedTime": 0,
+        "lastRead": 0,
+        "isComplete": False
+    }
+    client.post("/stories", json=story)
+    now = int(time.time() * 1000)
+    yesterday = now - 24 * 3600 * 1000
+
+    ids = iter(range(1000))
+    def event(type, at=now, story_id="log-story-1", **fields):
+        return {"id": f"evt-{next(ids)}", "storyId": story_id, "type": type, "at": at, **fields}
+
+    batch = [
+        event("session_start", yesterday),
+        event("page", yesterday, pages=1),
+        event("session_end", yesterday, seconds=120),
+        event("session_start"),
+        event("page", pages=1),
+        event("quiz", correct=True, words=300),
+        event("quiz", correct=False, words=250),
+        event("page", story_id="someone-elses-story", pages=50),
+        event("page", now - 40 * 24 * 3600 * 1000, pages=50),  # Too old
+    ]
+    response = client.post("/reading/events", json={"events": batch})
+    assert response.status_code == 200
+    assert response.json() == {"accepted": 7}
+    # Resending a stored batch (its response was lost) doesn't count it twice
+    assert client.post("/reading/events", json={"events": batch}).json() == {"accepted": 0}
+    # A later batch adds to the same day's rollup
+    later = [event("page", pages=2), event("session_end", seconds=600)]
+    assert client.post("/reading/events", json={"events": later + batch[:2]}).json() == {"accepted": 2}
+
+    history = client.get("/reading/history", params={"days": 7}).json()
+    assert [d["day"] for d in history["days"]][-1] == time.strftime("%Y-%m-%d", time.gmtime(now / 1000))
+    today = history["days"][-1]
+    assert (today["sessions"], today["seconds"], today["pages"]) == (1, 600, 3)
+    assert (today["questions"], today["correct"], today["words"]) == (2, 1, 550)
+    assert history["days"][0]["seconds"] == 120
+    assert (history["currentStreak"], history["longestStreak"]) == (2, 2)
+
+    assert client.get("/reading/history", params={"storyId": "other"}).json()["days"] == []
+    assert client.post("/reading/events", json={"events": [event("skim")]}).status_code == 422
+
+    entry = next(u for u in client.get("/leaderboard", params={"days": 7}).json() if u["username"] == "testuser")
+    assert (entry["total_words_read"], entry["total_correct_answers"]) == (550, 1)
+
+def test_uploads_served_from_storage(client):
+    from storage import storage, page_key
+    storage.put_bytes(page_key("upload-story", 1), b"jpeg-bytes", "image/jpeg")
+
+    response = client.get("/uploads/upload-story/1.jpg")
+    assert response.status_code == 200
+    assert response.content == b"jpeg-bytes"
+
+    response = client.get("/uploads/upload-story/2.jpg")
+    assert response.status_code == 404
+
+def test_upload_images_are_immutable_and_conditional(client):
+    from storage import storage, page_key
+    storage.put_bytes(page_key("etag-story", 1), b"jpeg-bytes", "image/jpeg")
+
+    response = client.get("/uploads/etag-story/1.jpg")
+    etag = response.headers["etag"]
+    assert "immutable" in response.headers["cache-control"]
+
+    response = client.get("/uploads/etag-story/1.jpg", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+def test_story_conditional_get(client):
+    story = {
+        "id": "etag-story-1",
+        "title": "ETag Story",
+        "chunks": [{"text": "Chunk 1", "id": 0}],
+        "currentIndex": 0,
+        "stats": {"correctAnswers": 0, "totalQuestions": 0, "startTime": 0, "wordCount": 0},
+        "elapsedTime": 0,
+        "lastRead": 0,
+        "isComplete": False
+    }
+    client.post("/stories", json=story)
+
+    response = client.get("/stories/etag-story-1")
+    etag = response.headers["etag"]
+    list_etag = client.get("/stories").headers["etag"]
+
+    assert client.get("/stories/etag-story-1", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/stories", headers={"If-None-Match": list_etag}).status_code == 304
+
+    # An update bumps the version, so both validators change
+    story["currentIndex"] = 1
+    client.put("/stories/etag-story-1", json=story)
+    response = client.get("/stories/etag-story-1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["currentIndex"] == 1
+    assert client.get("/stories", headers={"If-None-Match": list_etag}).status_code == 200
+
+def test_large_json_is_compressed(client):
+    story = {
+        "id": "big-story-1",
+        "title": "Big Story",
+        "chunks": [{"text": f"Page {i} " + "lorem ipsum dolor " * 50, "id": i} for i in range(50)],
+        "currentIndex": 0,
+        "stats": {"correctAnswers": 0, "totalQuestions": 0, "startTime": 0, "wordCount": 0},
+        "elapsedTime": 0,
+        "lastRead": 0,
+        "isComplete": False
+    }
+    client.post("/stories", json=story)
+
+    response = client.get("/stories/big-story-1", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert len(response.json()["chunks"]) == 50  # httpx decodes transparently
+    # The compressed body isn't the bytes the story's ETag stands for, but still revalidates
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+    response = client.get("/stories/big-story-1", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+
+    # Small bodies are left alone
+    response = client.get("/auth/me", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+def test_fast_read_path_matches_model(client):
+    from models import LibraryItem
+    story = {
+        "id": "raw-story-1",
+        "title": "Raw Story",
+        "chunks": [{"text": "Chunk 1", "id": 0}, {"text": "Chunk 2", "id": 1, "isProcessed": False}],
+        "chapters": [{"title": "One", "pageIndex": 0}],
+        "currentIndex": 0,
+        "stats": {"correctAnswers": 1, "totalQuestions": 2, "startTime": 0, "wordCount": 10},
+        "elapsedTime": 0,
+        "lastRead": 0,
+        "isComplete": False
+    }
+    client.post("/stories", json=story)
+
+    expected = LibraryItem(**story).model_dump()
+    assert client.get("/stories/raw-story-1").json() == expected
+    assert expected in client.get("/stories").json()
+
+def test_full_text_search(client):
+    story = {
+        "id": "search-story-1",
+        "title": "Search Story",
+        "chunks": [
+            {"text": "![Page 1](/uploads/search-story-1/1.jpg)\n\nThe whale surfaced near the harbour.", "id": 0},
+            {"text": "Nothing to see on this page.", "id": 1},
+            {"text": "A second whale, then a third whale.", "id": 2},
+            {"text": "Page 4 is generating...", "id": 3, "isProcessed": False},
+        ],
+        "currentIndex": 0,
+        "stats": {"correctAnswers": 0, "totalQuestions": 0, "startTime": 0, "wordCount": 0},
+        "elapsedTime": 0,
+        "lastRead": 0,
+        "isComplete": False
+    }
+    client.post("/stories", json=story)
+
+    response = client.get("/stories/search", params={"q": "whale"})
+    assert response.status_code == 200
+    hits = response.json()["hits"]
+    assert [h["chunkIndex"] for h in hits] == [2, 0]  # Two mentions rank higher
+    assert hits[0]["storyTitle"] == "Search Story"
+    assert "**whale**" in hits[0]["snippet"]
+    assert "uploads" not in hits[1]["snippet"]  # Page image links are not indexed
+
+    # Pagination and prefix matching
+    response = client.get("/stories/search", params={"q": "wha", "limit": 1})
+    assert len(response.json()["hits"]) == 1
+    assert response.json()["nextOffset"] == 1
+    response = client.get("/stories/search", params={"q": "wha", "limit": 1, "offset": 1})
+    assert response.json()["nextOffset"] is None
+
+    # FTS syntax in user input is neutralised, placeholders are not indexed
+    assert client.get("/stories/search", params={"q": 'whale" OR ('}).status_code == 200
+    assert client.get("/stories/search", params={"q": "generating"}).json()["hits"] == []
+
+    # Saving the story reindexes the pages whose text changed
+    story["chunks"][2]["text"] = "A lone albatross."
+    story["chunks"][3] = {"text": "The harbour whale again.", "id": 3}
+    assert client.put("/stories/search-story-1", json=story).status_code == 200
+    hits = client.get("/stories/search", params={"q": "whale"}).json()["hits"]
+    assert sorted(h["chunkIndex"] for h in hits) == [0, 3]
+    assert [h["chunkIndex"] for h in client.get("/stories/search", params={"q": "albatross"}).json()["hits"]] == [2]
+
+    client.delete("/stories/search-story-1")
+    assert client.get("/stories/search", params={"q": "whale"}).json()["hits"] == []
+
+def test_chat_retrieves_passages_from_the_book(client, monkeypatch):
+    from types import SimpleNamespace
+    import routers.ai
+
+    story = {
+        "id": "chat-story-1",
+        "title": "Chat Story",
+        "chunks": [
+            {"text": "Captain Ahab lost his leg to the white whale.", "id": 0},
+            {"text": "The crew ate biscuits in the galley.", "id": 1},
+            {"text": "Ishmael signed on to the Pequod.", "id": 2},
+            {"text": "Ahab nailed a gold coin to the mast.", "id": 3},
+        ],
+        "currentIndex": 3,
+        "stats": {"correctAnswers": 0, "totalQuestions": 0, "startTime": 0, "wordCount": 0},
+        "elapsedTime": 0,
+        "lastRead": 0,
+        "isComplete": False
+    }
+    client.post("/stories", json=story)
+
+    sent = []
+    async def generate(task, contents, user_id=None, config=None):
+        sent.append(contents[-1]["parts"][0]["text"])
+        return SimpleNamespace(text="He lost it to Moby Dick.")
+    monkeypatch.setattr(routers.ai, "get_client", lambda: object())
+    monkeypatch.setattr(routers.ai.models, "generate", generate)
+
+    request = {"currentText": story["chunks"][3]["text"], "history": [], "message": "How did Ahab lose his leg?"}
+    assert client.post("/ai/chat", json={**request, "storyId": "chat-story-1", "chunkIndex": 3}).status_code == 200
+    prompt = sent[-1]
+    assert "[Section 1]\nCaptain Ahab lost his leg" in prompt
+    assert "biscuits" not in prompt and "Pequod" not in prompt
+    assert prompt.count("gold coin") == 1  # The current page isn't repeated
+
+    # Without a story only the current page is sent
+    client.post("/ai/chat", json=request)
+    assert "Relevant passages" not in sent[-1]
+
+    client.delete("/stories/chat-story-1")
+
+def test_chat_context_skips_passages_over_budget(monkeypatch):
+    import asyncio
+    import routers.ai
+    from models import ChatRequest
+
+    async def retrieve_chunks(story_id, user_id, question, limit):
+        return [(7, "Ahab " * 400), (0, "Captain Ahab lost his leg."), (2, "Ahab again.")]
+    monkeypatch.setattr(routers.ai.db, "retrieve_chunks", retrieve_chunks)
+    monkeypatch.setattr(routers.ai, "CHAT_CONTEXT_TOKENS", 100)
+
+    request = ChatRequest(currentText="", history=[], message="Ahab?", storyId="s", chunkIndex=3)
+    context = asyncio.run(routers.ai.book_context(request, "u"))
+    assert "[Section 1]" in context and "[Section 3]" in context
+    assert "[Section 8]" not in context
+
+def test_process_uses_stored_pdf_metadata(client, monkeypatch):
+    import asyncio
+    import io
+    from PIL import Image
+    from database import db
+    from models import PdfMetadata
+    from pdf_pipeline import RenderedPage
+    from storage import storage, source_key
+    import pdf_pipeline
+
+    # Chunks list is longer than the PDF; stored metadata caps the batch at the real page count
+    story = {
+        "id": "process-story",
+        "title": "Process Story",
+        "chunks": [{"text": f"Page {i + 1} is generating...", "id": i, "isProcessed": False} for i in range(3)],
+        "currentIndex": 0,
+        "stats": {"correctAnswers": 0, "totalQuestions": 0, "startTime": 0, "wordCount": 0},
+        "elapsedTime": 0,
+        "lastRead": 0,
+        "isComplete": False
+    }
+    client.post("/stories", json=story)
+    storage.put_bytes(source_key("process-story"), b"%PDF-1.4 stand-in", "application/pdf")
+    metadata = PdfMetadata(pageCount=2, pageSizes=[[612, 792], [612, 792]])
+    asyncio.run(db.save_pdf_metadata("process-story", metadata))
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (20, 30), "white").save(buffer, "JPEG")
+    rendered = []
+
+    async def fake_render_and_ocr(pdf_path, page_nums, ocr=None, ocr_batch=None):
+        for n in page_nums:
+            rendered.append(n)
+            yield RenderedPage(n, buffer.getvalue(), f"text of page {n}")
+
+    monkeypatch.setattr(pdf_pipeline, "render_and_ocr", fake_render_and_ocr)
+    response = client.post("/stories/process-story/process")
+    assert response.status_code == 200
+    assert rendered == [1, 2]
+    assert [c["isProcessed"] for c in response.json()["chunks"]] == [True, True, False]
+
+    assert client.delete("/stories/process-story").status_code == 204
+    assert asyncio.run(db.get_pdf_metadata("process-story")) is None
+
+def test_process_survives_story_shrinking_mid_run(client, monkeypatch):
+    import asyncio
+    import io
+    from PIL import Image
+    from database import db
+    from models import LibraryItem, PdfMetadata
+    from pdf_pipeline import RenderedPage
+    from storage import storage, source_key
+    import pdf_pipeline
+
+    story = {
+        "id": "shrink-story",
+        "title": "Shrink Story",
+        "chunks": [{"text": f"Page {i + 1} is generating...", "id": i, "isProcessed": False} for i in range(3)],
+        "currentIndex": 0,
+        "stats": {"correctAnswers": 0, "totalQuestions": 0, "startTime": 0, "wordCount": 0},
+        "elapsedTime": 0,
+        "lastRead": 0,
+        "isComplete": False
+    }
+    client.post("/stories", json=story)
+    storage.put_bytes(source_key("shrink-story"), b"%PDF-1.4 stand-in", "application/pdf")
+    asyncio.run(db.save_pdf_metadata("shrink-story", PdfMetadata(pageCount=3, pageSizes=[[612, 792]] * 3)))
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (20, 30), "white").save(buffer, "JPEG")
+    user_id = client.get("/auth/me").json()["id"]
+
+    async def fake_render_and_ocr(pdf_path, page_nums, ocr=None, ocr_batch=None):
+        for n in page_nums:
+            if n == 2:
+                # A client saves the story with only its first page while the batch is in flight
+                await db.update_story("shrink-story", LibraryItem(**{**story, "chunks": story["chunks"][:1]}), user_id)
+            yield RenderedPage(n, buffer.getvalue(), f"text of page {n}")
+
+    monkeypatch.setattr(pdf_pipeline, "render_and_ocr", fake_render_and_ocr)
+    response = client.post("/stories/shrink-story/process")
+    assert response.status_code == 200
+    chunks = response.json()["chunks"]
+    assert len(chunks) == 1 and chunks[0]["isProcessed"]
+    assert "text of page 1" in chunks[0]["text"]
+
+    assert client.delete("/stories/shrink-story").status_code == 204
+
+def test_upload_epub_and_text(client):
+    from tests.test_text_ingest import make_epub
+
+    response = client.post("/upload/epub", files={"file": ("lighthouse.epub", make_epub(), "application/epub+zip")})
+    assert response.status_code == 200
+    story = response.json()
+    assert story["title"] == "The Lighthouse"
+    assert [c["title"] for c in story["chapters"]] == ["One: The Keeper", "Two: The Storm"]
+    assert all(c["isProcessed"] for c in story["chunks"])
+    # Searchable straight away: no OCR pass to wait for
+    hits = client.get("/stories/search", params={"q": "rain"}).json()["hits"]
+    assert story["id"] in [h["storyId"] for h in hits]
+
+    response = client.post("/upload/text", files={"file": ("notes.md", b"# Intro\n\nHello there.\n", "text/markdown")})
+    assert response.status_code == 200
+    assert response.json()["title"] == "notes"
+    assert response.json()["chapters"] == [{"title": "Intro", "pageIndex": 0}]
+
+    assert client.post("/upload/epub", files={"file": ("bad.epub", b"not a zip", "application/epub+zip")}).status_code == 400
+    assert client.post("/upload/text", files={"file": ("empty.txt", b"\n\n", "text/plain")}).status_code == 400
+    assert client.post("/upload/text", files={"file": ("book.pdf", b"%PDF", "application/pdf")}).status_code == 400
+
+def test_resumable_upload(client, monkeypatch):
+    import hashlib
+    from routers import upload as upload_router
+
+    data = os.urandom(100_000)
+    ingested = {}
+
+    async def fake_ingest(story_id, path, filename, current_user):
+        with open(path, "rb") as f:
+            ingested["bytes"] = f.read()
+        return {"id": story_id, "title": filename, "chunks": [], "currentIndex": 0,
+                "stats": {"correctAnswers": 0, "totalQuestions": 0, "startTime": 0, "wordCount": 0},
+                "elapsedTime": 0, "lastRead": 0, "isComplete": False}
+    monkeypatch.setattr(upload_router, "_ingest_pdf", fake_ingest)
+
+    body = {"filename": "scan.pdf", "size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+    session = client.post("/upload/sessions", json=body).json()
+    url = f"/upload/sessions/{session['id']}"
+
+    def put(start, end):
+        return client.put(url, content=data[start:end + 1], headers={"Content-Range": f"bytes {start}-{end}/{len(data)}"})
+
+    assert put(0, 39_999).json()["offset"] == 40_000
+    # Retrying a range that already landed is refused with the offset to resume from
+    response = put(0, 39_999)
+    assert response.status_code == 409
+    assert response.json()["detail"]["offset"] == 40_000
+    assert client.get(url).json() == {**session, "offset": 40_000}
+    assert client.post(f"{url}/complete").status_code == 409
+
+    assert put(40_000, len(data) - 1).json()["complete"] is True
+    response = client.post(f"{url}/complete")
+    assert response.status_code == 200
+    assert ingested["bytes"] == data
+    assert client.get(url).status_code == 404
+
+    # Size limit, out-of-range writes and checksum mismatch
+    assert client.post("/upload/sessions", json={"filename": "big.pdf", "size": 10**12}).status_code == 413
+    session = client.post("/upload/sessions", json={**body, "sha256": "0" * 64}).json()
+    url = f"/upload/sessions/{session['id']}"
+    response = client.put(url, content=data, headers={"Content-Range": f"bytes 0-{len(data)}/{len(data) + 1}"})
+    assert response.status_code == 416
+    assert put(0, len(data) - 1).status_code == 200
+    assert client.post(f"{url}/complete").status_code == 422
+    assert client.get(url).status_code == 404
+
+def test_storage_usage_and_cleanup(client, monkeypatch):
+    import asyncio
+    import storage_gc
+    from storage import storage, page_key, source_key
+
+    story = {
+        "id": "usage-story", "title": "Usage Story", "chunks": [{"text": "hi", "id": 0}],
+        "currentIndex": 0, "stats": {"correctAnswers": 0, "totalQuestions": 0, "startTime": 0, "wordCount": 0},
+        "elapsedTime": 0, "lastRead": 0, "isComplete": False
+    }
+    client.post("/stories", json=story)
+    storage.put_bytes(source_key("usage-story"), b"x" * 300)
+    storage.put_bytes(page_key("usage-story", 1), b"x" * 200)
+
+    asyncio.run(storage_gc.sweep())
+    usage = client.get("/stories/usage").json()
+    assert {"id": "usage-story", "title": "Usage Story", "bytes": 500} in usage["stories"]
+    assert usage["usedBytes"] >= 500
+    assert usage["quotaBytes"] is None
+
+    monkeypatch.setattr(storage_gc, "STORAGE_QUOTA_BYTES", usage["usedBytes"] + 100)
+    response = client.post("/upload/sessions", json={"filename": "big.pdf", "size": 101})
+    assert response.status_code == 413
+    assert "quota" in response.json()["detail"]
+
+    # Deleting a story removes its artifacts too
+    assert client.delete("/stories/usage-story").status_code == 204
+    assert not storage.exists(source_key("usage-story"))
+    assert not storage.exists(page_key("usage-story", 1))
+
+def test_bootstrap(client):
+    story = {
+        "id": "bootstrap-story", "title": "Bootstrap Story",
+        "chunks": [{"text": "one", "id": 0}, {"text": "two", "id": 1}, {"text": "three", "id": 2}],
+        "currentIndex": 1, "stats": {"correctAnswers": 2, "totalQuestions": 3, "startTime": 0, "wordCount": 40},
+        "elapsedTime": 12, "lastRead": 1000, "isComplete": False
+    }
+    client.post("/stories", json=story)
+
+    response = client.get("/bootstrap")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["user"]["username"] == "testuser"
+    assert data["settings"] == client.get("/settings").json()
+    summary = next(s for s in data["library"] if s["id"] == "bootstrap-story")
+    assert summary["chunkCount"] == 3
+    assert summary["currentIndex"] == 1
+    assert summary["stats"]["wordCount"] == 40
+    assert "chunks" not in summary
+
+    client.delete("/stories/bootstrap-story")
+    assert TestClient(app).get("/bootstrap").status_code == 401
+
+def test_settings_noop_write_is_skipped(client, monkeypatch):
+    import database
+
+    current = client.get("/settings").json()
+    commits = []
+    original = database.AsyncSessionLocal
+
+    def counting_session():
+        session = original()
+        real_commit = session.commit
+        async def commit():
+            commits.append(1)
+            await real_commit()
+        session.commit = commit
+        return session
+    monkeypatch.setattr(database, "AsyncSessionLocal", counting_session)
+
+    assert client.put("/settings", json=current).json() == current
+    assert commits == []
+    changed = {**current, "theme": "sepia" if current["theme"] != "sepia" else "dark"}
+    assert client.put("/settings", json=changed).json() == changed
+    assert commits == [1]
+
+def test_admin_request_profiling(client, monkeypatch, tmp_path):
+    import subprocess
+    import sys
+    pytest.importorskip("pyinstrument")
+    import profiling
+
+    # The profiler is only imported once an admin asks for a profile, not at startup
+    started = subprocess.run(
+        [sys.executable, "-c", "import sys, main; sys.exit('pyinstrument' in sys.modules)"],
+        env={**os.environ, "DATABASE_URL": "sqlite+aiosqlite:///:memory:"},
+    )
+    assert started.returncode == 0
+
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "ADMIN_USERNAMES", set())
+
+    # Not an admin: flag ignored, admin routes closed
+    response = client.get("/stories", headers={"X-Profile": "1"})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+    assert client.get("/admin/profiles").status_code == 403
+
+    monkeypatch.setattr(profiling, "ADMIN_USERNAMES", {"testuser"})
+    assert "x-profile-id" not in client.get("/stories").headers
+
+    response = client.get("/stories", headers={"X-Profile": "1", "X-Request-ID": "req-1"})
+    assert response.status_code == 200
+    assert response.headers["x-profile-id"] == "req-1"
+    generated = client.get("/stories?profile=1").headers["x-profile-id"]
+
+    listed = [p["id"] for p in client.get("/admin/profiles").json()]
+    assert sorted(listed) == sorted(["req-1", generated])
+    profile = client.get("/admin/profiles/req-1")
+    assert profile.status_code == 200
+    assert "speedscope" in profile.json()["$schema"]
+    assert client.get("/admin/profiles/missing").status_code == 404
+
+    # Retention keeps only the newest
+    for i in range(3):
+        profiling.save_profile(f"extra-{i}", "{}", retention=2)
+        time.sleep(0.01)
+    assert len(profiling.list_profiles()) == 2
+
+def test_ai_daily_budget(client, monkeypatch):
+    import asyncio
+    import ai_quota
+    from database import db
+
+    user_id = client.get("/auth/me").json()["id"]
+    day = ai_quota.usage_day()
+    asyncio.run(db.add_ai_usage(user_id, day, "ocr", 1000, 200))
+    asyncio.run(db.add_ai_usage(user_id, day, "ocr", 500, 100))
+    asyncio.run(db.add_ai_usage(user_id, day, "chat", 50, 20))
+
+    usage = client.get("/ai/usage").json()
+    assert (usage["requests"], usage["tokens"]) == (3, 1870)
+    assert usage["requestLimit"] is None
+    assert {t["task"]: t["requests"] for t in usage["tasks"]} == {"chat": 1, "ocr": 2}
+
+    monkeypatch.setattr(ai_quota, "AI_DAILY_REQUESTS", 10)
+    monkeypatch.setattr(ai_quota, "AI_DAILY_TOKENS", 1500)
+    response = client.post("/ai/chat", json={"message": "hi", "history": [], "currentText": ""})
+    assert response.status_code == 429
+    assert "token limit" in response.json()["detail"]
+    assert 0 < int(response.headers["retry-after"]) <= 24 * 3600
+    assert client.post("/stories/any-story/process").status_code == 429
+
+    monkeypatch.setattr(ai_quota, "AI_DAILY_TOKENS", 0)
+    assert client.post("/ai/quiz", json={"chunk": "some text"}).status_code == 200
+
+def test_failed_ocr_page_stays_unprocessed(client, monkeypatch):
+    import asyncio
+    from database import db
+    from models import PdfMetadata
+    from pdf_pipeline import RenderedPage
+    from storage import storage, source_key
+    from story_processing import ocr_retries
+    import pdf_pipeline
+
+    story = {
+        "id": "flaky-story", "title": "Flaky Story",
+        "chunks": [{"text": f"Page {i + 1} is generating...", "id": i, "isProcessed": False} for i in range(3)],
+        "currentIndex": 0, "stats": {"correctAnswers": 0, "totalQuestions": 0, "startTime": 0, "wordCount": 0},
+        "elapsedTime": 0, "lastRead": 0, "isComplete": False
+    }
+    client.post("/stories", json=story)
+    storage.put_bytes(source_key("flaky-story"), b"%PDF-1.4 stand-in", "application/pdf")
+    asyncio.run(db.save_pdf_metadata("flaky-story", PdfMetadata(pageCount=3, pageSizes=[[612, 792]] * 3)))
+
+    import io
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (20, 30), "white").save(buffer, "JPEG")
+
+    async def fake_render_and_ocr(pdf_path, page_nums, ocr=None, ocr_batch=None):
+        for n in page_nums:
+            # Page 2's model call fails
+            yield RenderedPage(n, buffer.getvalue(), None if n == 2 else f"text of page {n}")
+
+    monkeypatch.setattr(pdf_pipeline, "render_and_ocr", fake_render_and_ocr)
+    monkeypatch.setattr(ocr_retries, "delay", 3600)
+    response = client.post("/stories/flaky-story/process")
+    assert response.status_code == 200
+    chunks = response.json()["chunks"]
+    assert [c["isProcessed"] for c in chunks] == [True, False, True]
+    assert chunks[1]["text"] == "Page 2 is generating..."
+    assert ocr_retries.pending("flaky-story") == {2}
+
+    # While the breaker is open, /process fails fast with Retry-After
+    from model_router import models
+    for _ in range(models.breaker.min_calls):
+        models.breaker.record(False, 0.1)
+    try:
+        response = client.post("/stories/flaky-story/process")
+        assert response.status_code == 503
+        assert int(response.headers["retry-after"]) > 0
+    finally:
+        models.breaker._close()
+
+    client.delete("/stories/flaky-story")
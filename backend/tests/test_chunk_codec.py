@@ -0,0 +1,35 @@
+import pytest
+import chunk_codec
+
+def test_round_trip_restores_deduplicated_formatted_text():
+    chunks = [
+        {"text": "Page one", "formattedText": "Page one", "id": 0, "isProcessed": True},
+        {"text": "Page two", "formattedText": "**Page** two", "id": 1, "isProcessed": True},
+        {"text": "Page 3 is generating...", "formattedText": None, "id": 2, "isProcessed": False},
+    ]
+    data = chunk_codec.encode(chunks)
+    decoded = chunk_codec.decode(data)
+    assert decoded == chunks
+    assert [list(c) for c in decoded] == [list(c) for c in chunks]  # Field order kept for the raw read path
+    assert chunk_codec.decode(chunk_codec.encode([])) == []
+
+def test_duplicate_text_is_stored_once():
+    text = "The keeper climbed the spiral stair. " * 50
+    same = chunk_codec.encode([{"text": text, "formattedText": text, "id": 0, "isProcessed": True}], level=0)
+    alone = chunk_codec.encode([{"text": text, "id": 0, "isProcessed": True}], level=0)
+    assert len(same) == len(alone)
+
+def test_zlib_without_zstandard(monkeypatch):
+    chunks = [{"text": "Page one", "formattedText": "Page one", "id": 0, "isProcessed": True}]
+    zstd_data = chunk_codec.encode(chunks)
+    monkeypatch.setattr(chunk_codec, "zstandard", None)
+    data = chunk_codec.encode(chunks)
+    assert data[0] == chunk_codec.FORMAT_ZLIB
+    assert chunk_codec.decode(data) == chunks
+    if zstd_data[0] == chunk_codec.FORMAT_ZSTD:
+        with pytest.raises(RuntimeError):
+            chunk_codec.decode(zstd_data)
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        chunk_codec.decode(b"\x7f garbage")
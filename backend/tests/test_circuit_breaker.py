@@ -0,0 +1,106 @@
+import asyncio
+import pytest
+
+from ai_client import FakeClient
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from ai_quota import FairScheduler
+from model_router import ModelRouter, Route
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def make_breaker(clock, **kwargs):
+    options = dict(window=10, min_calls=4, rate=0.5, slow_seconds=5, cooldown=30, clock=clock)
+    options.update(kwargs)
+    return CircuitBreaker(**options)
+
+def test_opens_on_error_rate_and_fails_fast():
+    clock = Clock()
+    breaker = make_breaker(clock)
+    for ok in (True, False, True):
+        breaker.before_call()
+        breaker.record(ok, 0.1)
+    assert breaker.state == CLOSED  # Too few calls to judge
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+
+    clock.now = 10
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_after == 20
+    assert breaker.rejected == 1
+
+def test_opens_on_slow_calls():
+    breaker = make_breaker(Clock())
+    for seconds in (6, 7, 0.1, 8):
+        breaker.record(True, seconds)
+    assert breaker.state == OPEN
+
+def test_half_open_lets_one_probe_through():
+    clock = Clock()
+    breaker = make_breaker(clock, min_calls=1)
+    breaker.record(False, 0.1)
+    clock.now = 30
+    assert breaker.state == HALF_OPEN
+    assert breaker.before_call()  # The probe
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(True, 0.1)  # A call from before the breaker opened doesn't decide
+    assert breaker.state == HALF_OPEN
+
+    breaker.record(False, 0.1, probe=True)  # Probe failed: open for another cooldown
+    assert breaker.state == OPEN
+    clock.now = 60
+    assert breaker.before_call()
+    breaker.record(True, 0.1, probe=True)
+    assert breaker.state == CLOSED
+    assert not breaker.before_call()
+
+def test_router_stops_calling_the_api_while_open():
+    def respond(model, contents):
+        raise RuntimeError("503 from upstream")
+    client = FakeClient(respond=respond)
+    breaker = make_breaker(Clock())
+    router = ModelRouter(client_factory=lambda: client, routes={"ocr": Route("primary", None)}, breaker=breaker)
+
+    async def scenario():
+        for _ in range(4):
+            with pytest.raises(RuntimeError):
+                await router.generate("ocr", "page")
+        for _ in range(10):
+            with pytest.raises(CircuitOpenError):
+                await router.generate("ocr", "page")
+
+    asyncio.run(scenario())
+    assert len(client.calls) == 4
+    assert breaker.rejected == 10
+
+def test_probe_cancelled_while_queued_is_released():
+    clock = Clock()
+    breaker = make_breaker(clock, min_calls=1)
+    breaker.record(False, 0.1)
+    clock.now = 30
+    scheduler = FairScheduler(concurrency=1)
+    client = FakeClient()
+    router = ModelRouter(
+        client_factory=lambda: client, routes={"ocr": Route("primary", None)}, breaker=breaker, scheduler=scheduler,
+    )
+
+    async def scenario():
+        async with scheduler.slot("other", "ocr"):  # The probe has to wait for this slot
+            probe = asyncio.create_task(router.generate("ocr", "page"))
+            await asyncio.sleep(0)
+            assert scheduler.waiting == 1
+            probe.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await probe
+        # Another call may probe, and its success closes the breaker
+        await router.generate("ocr", "page")
+
+    asyncio.run(scenario())
+    assert breaker.state == CLOSED
+    assert len(client.calls) == 1
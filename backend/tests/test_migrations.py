@@ -0,0 +1,130 @@
+import asyncio
+import os
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from migrations import run_migrations, get_version, LATEST_VERSION
+import chunk_codec
+import search
+
+# Migrations always run against a throwaway SQLite file. Set TEST_POSTGRES_URL
+# (e.g. postgresql+asyncpg://postgres@localhost/focusread_test) to also run them
+# against a disposable Postgres database; its public schema is wiped per test.
+BACKENDS = ["sqlite"] + (["postgres"] if os.getenv("TEST_POSTGRES_URL") else [])
+
+LEGACY_SCHEMA = [
+    # library_items as created before chapters/version existed
+    "CREATE TABLE users (id VARCHAR PRIMARY KEY, email VARCHAR, username VARCHAR, hashed_password VARCHAR)",
+    "CREATE TABLE library_items (id VARCHAR PRIMARY KEY, user_id VARCHAR, title VARCHAR, chunks JSON,"
+    " current_index INTEGER, stats JSON, elapsed_time INTEGER, last_read BIGINT, is_complete BOOLEAN)",
+    "INSERT INTO users VALUES ('u1', 'a@b.c', 'legacy', 'x')",
+    "INSERT INTO library_items VALUES ('s1', 'u1', 'Old Book',"
+    " '[{\"text\": \"An old lighthouse keeper\", \"formattedText\": null, \"id\": 0, \"isProcessed\": true}]',"
+    " 0, '{}', 0, 0, false)",
+]
+
+@pytest.fixture(params=BACKENDS)
+def engine(request, tmp_path):
+    if request.param == "sqlite":
+        url = f"sqlite+aiosqlite:///{tmp_path / 'migrations.db'}"
+    else:
+        url = os.environ["TEST_POSTGRES_URL"]
+
+    async def reset():
+        eng = create_async_engine(url)
+        if request.param == "postgres":
+            async with eng.begin() as conn:
+                await conn.execute(text("DROP SCHEMA public CASCADE"))
+                await conn.execute(text("CREATE SCHEMA public"))
+            await eng.dispose()
+        return eng
+
+    eng = asyncio.run(reset())
+    yield eng
+    asyncio.run(eng.dispose())
+
+def _run(engine, coro_fn):
+    async def wrapper():
+        try:
+            return await coro_fn()
+        finally:
+            # Connections are bound to the loop that created them
+            await engine.dispose()
+    return asyncio.run(wrapper())
+
+def _columns(engine, table):
+    async def go():
+        async with engine.connect() as conn:
+            return await conn.run_sync(lambda c: [col["name"] for col in inspect(c).get_columns(table)])
+    return _run(engine, go)
+
+def test_fresh_database(engine):
+    assert _run(engine, lambda: get_version(engine)) is None
+    assert _run(engine, lambda: run_migrations(engine)) == LATEST_VERSION
+    assert {"chapters", "version"} <= set(_columns(engine, "library_items"))
+    # Second start is a no-op
+    assert _run(engine, lambda: run_migrations(engine)) == LATEST_VERSION
+
+def test_legacy_database_is_upgraded(engine):
+    async def setup():
+        async with engine.begin() as conn:
+            for stmt in LEGACY_SCHEMA:
+                await conn.execute(text(stmt))
+    _run(engine, setup)
+
+    assert _run(engine, lambda: run_migrations(engine)) == LATEST_VERSION
+    assert {"chapters", "version"} <= set(_columns(engine, "library_items"))
+
+    async def check():
+        async with engine.connect() as conn:
+            row = (await conn.execute(text("SELECT title, version FROM library_items"))).one()
+            assert tuple(row) == ("Old Book", 1)
+            # Existing chunks were backfilled into the search index
+            hits = await search.search(conn, "u1", "lighthouse", 10, 0)
+            assert [h.storyId for h in hits] == ["s1"]
+            # ...and compressed into chunk_data
+            row = (await conn.execute(text("SELECT chunks, chunk_data, chunk_count FROM library_items"))).one()
+            assert row[0] is None and row[2] == 1
+            assert chunk_codec.decode(row[1]) == [
+                {"text": "An old lighthouse keeper", "formattedText": None, "id": 0, "isProcessed": True}
+            ]
+            versions = (await conn.execute(text("SELECT version FROM schema_version ORDER BY version"))).scalars().all()
+            assert versions == list(range(1, LATEST_VERSION + 1))
+    _run(engine, check)
+
+def test_partially_migrated_database_resumes(engine):
+    # Database stamped at version 2: only later steps run
+    async def setup():
+        async with engine.begin() as conn:
+            for stmt in LEGACY_SCHEMA:
+                await conn.execute(text(stmt))
+            await conn.execute(text("ALTER TABLE library_items ADD COLUMN chapters JSON"))
+            await conn.execute(text("CREATE TABLE schema_version (version INTEGER PRIMARY KEY)"))
+            await conn.execute(text("INSERT INTO schema_version VALUES (1), (2)"))
+    _run(engine, setup)
+
+    assert _run(engine, lambda: run_migrations(engine)) == LATEST_VERSION
+    assert "version" in _columns(engine, "library_items")
+
+@pytest.mark.parametrize("engine", ["sqlite"], indirect=True)
+def test_search_row_map_is_backfilled(engine):
+    # Index built before chunk_fts_rows existed: stamped at version 10, rows only in chunk_fts
+    async def setup():
+        async with engine.begin() as conn:
+            for stmt in LEGACY_SCHEMA:
+                await conn.execute(text(stmt))
+        await run_migrations(engine)
+        async with engine.begin() as conn:
+            await conn.execute(text("DROP TABLE chunk_fts_rows"))
+            await conn.execute(text("DELETE FROM schema_version WHERE version > 10"))
+    _run(engine, setup)
+
+    assert _run(engine, lambda: run_migrations(engine)) == LATEST_VERSION
+
+    async def check():
+        async with engine.begin() as conn:
+            assert [h.storyId for h in await search.search(conn, "u1", "lighthouse", 10, 0)] == ["s1"]
+            await search.remove_story(conn, "s1")
+            assert (await conn.execute(text("SELECT COUNT(*) FROM chunk_fts"))).scalar() == 0
+    _run(engine, check)
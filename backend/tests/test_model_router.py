@@ -0,0 +1,129 @@
+import asyncio
+import pytest
+
+from ai_client import FakeClient
+from ai_quota import FairScheduler
+from model_router import ModelRouter, Route, LatencyTracker
+
+def make_router(client, **kwargs):
+    routes = {"quiz": Route("primary", "secondary"), "ocr": Route("primary", None)}
+    return ModelRouter(client_factory=lambda: client, routes=routes, **kwargs)
+
+def test_percentile():
+    tracker = LatencyTracker()
+    for ms in range(1, 101):
+        tracker.record(ms / 1000)
+    assert tracker.percentile(95) == 0.095
+    assert tracker.percentile(50) == 0.05
+
+def test_routes_per_task_model():
+    client = FakeClient(respond=lambda model, contents: f"{model}:{contents}")
+    router = make_router(client)
+    response = asyncio.run(router.generate("quiz", "hi"))
+    assert response.text == "primary:hi"
+    assert client.calls == ["primary"]
+
+def test_slow_call_is_hedged_and_loser_cancelled():
+    # Warm-up calls take 10ms; then one call stalls and its hedge answers
+    latencies = iter([0.01] * 5 + [1.0, 0.01])
+    client = FakeClient(latency=lambda model: next(latencies), respond=lambda model, contents: contents)
+    router = make_router(client, hedge_min_samples=5)
+
+    async def scenario():
+        for _ in range(5):
+            await router.generate("quiz", "warm")
+        assert router.hedge_delay("quiz") == pytest.approx(0.01, abs=0.01)
+        start = asyncio.get_running_loop().time()
+        response = await router.generate("quiz", "slow")
+        elapsed = asyncio.get_running_loop().time() - start
+        return response, elapsed
+
+    response, elapsed = asyncio.run(scenario())
+    assert response.text == "slow"
+    assert elapsed < 0.5
+    assert router.hedges == 1
+    assert client.cancelled == 1
+    assert client.calls == ["primary"] * 7
+
+def test_error_falls_back_to_secondary_model():
+    def respond(model, contents):
+        if model == "primary":
+            raise RuntimeError("overloaded")
+        return "from secondary"
+    client = FakeClient(respond=respond)
+    router = make_router(client)
+    assert asyncio.run(router.generate("quiz", "x")).text == "from secondary"
+    assert client.calls == ["primary", "secondary"]
+    assert router.fallbacks == 1
+
+    # Without a fallback the error surfaces
+    with pytest.raises(RuntimeError):
+        asyncio.run(router.generate("ocr", "x"))
+
+def test_timeout_falls_back():
+    client = FakeClient(latency=lambda model: 1.0 if model == "primary" else 0.0)
+    router = make_router(client, timeout=0.05)
+    asyncio.run(router.generate("quiz", "x"))
+    assert client.calls == ["primary", "secondary"]
+    assert client.cancelled == 1
+
+def test_scheduler_serves_interactive_calls_before_bulk_ocr():
+    scheduler = FairScheduler(concurrency=1, weights={"chat": 8, "ocr": 1})
+    order = []
+
+    async def call(user, task, name):
+        async with scheduler.slot(user, task):
+            order.append(name)
+            await asyncio.sleep(0.001)
+
+    async def scenario():
+        # A heavy user queues 6 OCR pages, then two other users ask for chat and OCR
+        tasks = [asyncio.ensure_future(call("heavy", "ocr", f"ocr{i}")) for i in range(6)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.ensure_future(call("light", "ocr", "light-ocr")))
+        tasks.append(asyncio.ensure_future(call("reader", "chat", "chat")))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    # Chat jumps the backlog, and the light user's page doesn't wait behind the heavy user's
+    assert order[:4] == ["ocr0", "chat", "light-ocr", "ocr1"]
+    assert scheduler.active == 0
+
+def test_scheduler_cancelled_waiter_frees_its_place():
+    scheduler = FairScheduler(concurrency=1)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot("a", "ocr"):
+                await release.wait()
+
+        async def waiter(user):
+            async with scheduler.slot(user, "ocr"):
+                return user
+
+        first = asyncio.ensure_future(holder())
+        await asyncio.sleep(0)
+        cancelled = asyncio.ensure_future(waiter("b"))
+        served = asyncio.ensure_future(waiter("c"))
+        await asyncio.sleep(0)
+        assert scheduler.waiting == 2
+        cancelled.cancel()
+        release.set()
+        await first
+        return await served
+
+    assert asyncio.run(scenario()) == "c"
+    assert scheduler.active == 0
+
+def test_usage_is_charged_to_the_calling_user():
+    charged = []
+
+    async def on_usage(user_id, task, response):
+        charged.append((user_id, task, response.text))
+
+    client = FakeClient(respond=lambda model, contents: "ok")
+    router = make_router(client, scheduler=FairScheduler(concurrency=2), on_usage=on_usage)
+    asyncio.run(router.generate("quiz", "x", "user-1"))
+    assert charged == [("user-1", "quiz", "ok")]
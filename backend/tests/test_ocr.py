@@ -0,0 +1,59 @@
+import asyncio
+import io
+import json
+import re
+
+from PIL import Image
+
+from ai_client import FakeClient
+from model_router import ModelRouter, Route
+import ocr
+
+def jpeg():
+    buffer = io.BytesIO()
+    Image.new("RGB", (10, 10), "white").save(buffer, "JPEG")
+    return buffer.getvalue()
+
+def use_client(monkeypatch, client):
+    routes = {"ocr": Route("m", None), "ocr_batch": Route("m", None)}
+    monkeypatch.setattr(ocr, "models", ModelRouter(client_factory=lambda: client, routes=routes))
+    monkeypatch.setattr(ocr, "get_client", lambda: client)
+
+def test_parse_batch():
+    text = json.dumps([{"page": 3, "text": "three"}, {"page": 9, "text": "stray"}, {"page": 4}, "junk"])
+    assert ocr.parse_batch(text, [3, 4]) == {3: "three"}
+    assert ocr.parse_batch("not json", [3]) == {}
+
+def test_ocr_pages_one_call_for_the_batch(monkeypatch):
+    def respond(model, contents):
+        if contents[0] == ocr.OCR_BATCH_PROMPT:
+            pages = [int(re.match(r"Page (\d+):", c).group(1)) for c in contents if isinstance(c, str) and c.startswith("Page ")]
+            return json.dumps([{"page": n, "text": f"text {n}"} for n in pages])
+        return "single"
+    client = FakeClient(respond=respond)
+    use_client(monkeypatch, client)
+
+    texts = asyncio.run(ocr.ocr_pages([(n, jpeg()) for n in (5, 6, 7)]))
+    assert texts == {5: "text 5", 6: "text 6", 7: "text 7"}
+    assert len(client.calls) == 1
+
+def test_ocr_pages_falls_back_to_single_pages(monkeypatch):
+    def respond(model, contents):
+        if contents[0] == ocr.OCR_BATCH_PROMPT:
+            return json.dumps([{"page": 1, "text": "one"}])  # Page 2 missing
+        return "two, on its own"
+    client = FakeClient(respond=respond)
+    use_client(monkeypatch, client)
+
+    texts = asyncio.run(ocr.ocr_pages([(1, jpeg()), (2, jpeg())]))
+    assert texts == {1: "one", 2: "two, on its own"}
+    assert len(client.calls) == 2
+
+def test_ocr_pages_failed_call_leaves_pages_unprocessed(monkeypatch):
+    def respond(model, contents):
+        raise RuntimeError("503")
+    client = FakeClient(respond=respond)
+    use_client(monkeypatch, client)
+
+    assert asyncio.run(ocr.ocr_pages([(1, jpeg()), (2, jpeg())])) == {1: None, 2: None}
+    assert len(client.calls) == 1
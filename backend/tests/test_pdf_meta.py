@@ -0,0 +1,111 @@
+import asyncio
+import os
+from pypdf import PdfWriter
+from pypdf.generic import DictionaryObject, NameObject
+
+import pdf_meta
+from pdf_meta import DocumentCache, inspect_pdf
+from models import PdfMetadata
+
+def make_pdf(path, pages=3, with_font=False):
+    writer = PdfWriter()
+    for i in range(pages):
+        writer.add_blank_page(width=612 + i, height=792)
+    if with_font:
+        font = DictionaryObject({
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject("/Helvetica"),
+        })
+        writer.pages[0][NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): writer._add_object(font)}),
+        })
+    intro = writer.add_outline_item("Introduction", 0)
+    writer.add_outline_item("Background", 1, parent=intro)
+    writer.add_outline_item("Chapter 1", pages - 1)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+def test_inspect_pdf(tmp_path):
+    path = str(tmp_path / "book.pdf")
+    make_pdf(path)
+    meta = inspect_pdf(path)
+    assert meta.pageCount == 3
+    assert meta.pageSizes == [[612.0, 792.0], [613.0, 792.0], [614.0, 792.0]]
+    assert [(c.title, c.pageIndex) for c in meta.chapters] == [
+        ("Introduction", 0), ("Background", 1), ("Chapter 1", 2),
+    ]
+    assert meta.hasTextLayer is False
+
+def test_inspect_pdf_detects_text_layer(tmp_path):
+    path = str(tmp_path / "text.pdf")
+    make_pdf(path, with_font=True)
+    assert inspect_pdf(path).hasTextLayer is True
+
+class FakeStorage:
+    """Remote-style storage: no local file path, so sources are downloaded."""
+    def __init__(self, sources):
+        self.sources = sources
+        self.downloads = 0
+
+    def file_path(self, key):
+        return None
+
+    def exists(self, key):
+        return key in self.sources
+
+    def download_to(self, key, dest_path):
+        self.downloads += 1
+        with open(self.sources[key], "rb") as src, open(dest_path, "wb") as dest:
+            dest.write(src.read())
+
+class FakeDB:
+    def __init__(self):
+        self.saved = {}
+        self.loads = 0
+
+    async def get_pdf_metadata(self, story_id):
+        self.loads += 1
+        return self.saved.get(story_id)
+
+    async def save_pdf_metadata(self, story_id, metadata: PdfMetadata):
+        self.saved[story_id] = metadata
+
+def test_document_cache_reuses_and_evicts(tmp_path, monkeypatch):
+    sources = {}
+    for name in ("a", "b", "c"):
+        path = str(tmp_path / f"{name}.pdf")
+        make_pdf(path, pages=2)
+        sources[f"{name}/source.pdf"] = path
+    store, fake_db = FakeStorage(sources), FakeDB()
+    monkeypatch.setattr(pdf_meta, "storage", store)
+    import database
+    monkeypatch.setattr(database, "db", fake_db)
+
+    async def scenario():
+        cache = DocumentCache(max_size=2)
+        async with cache.open("a") as doc:
+            first_path = doc.path
+            # Legacy story without stored metadata: inspected once and persisted
+            assert doc.metadata.pageCount == 2
+            assert "a" in fake_db.saved
+        async with cache.open("a") as doc:
+            assert doc.path == first_path
+        assert store.downloads == 1 and fake_db.loads == 1
+
+        # "a" is pinned while in use, so the least recently used idle document goes instead
+        async with cache.open("a"):
+            async with cache.open("b"):
+                pass
+            async with cache.open("c"):
+                pass
+        assert os.path.exists(first_path)
+        assert set(cache._docs) == {"a", "c"}
+
+        async with cache.open("missing") as doc:
+            assert doc is None
+
+        cache.discard("a")
+        assert not os.path.exists(first_path)
+
+    asyncio.run(scenario())
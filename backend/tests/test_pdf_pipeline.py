@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+from pdf_pipeline import render_and_ocr
+
+def _collect(**kwargs):
+    async def go():
+        return [page async for page in render_and_ocr("book.pdf", **kwargs)]
+    return asyncio.run(go())
+
+def test_pages_are_ocrd_while_others_render():
+    events = []
+    lock = threading.Lock()
+
+    def render(path, page_num):
+        time.sleep(0.05 * page_num)  # Later pages take longer to rasterize
+        with lock:
+            events.append(("rendered", page_num))
+        return f"jpeg-{page_num}".encode()
+
+    def ocr(jpeg, page_num):
+        with lock:
+            events.append(("ocr", page_num))
+        return jpeg.decode().upper()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        pages = _collect(page_nums=[1, 2, 3, 4], render=render, ocr=ocr, executor=executor)
+
+    assert sorted((p.page_num, p.text) for p in pages) == [(n, f"JPEG-{n}") for n in range(1, 5)]
+    # Page 1 went to OCR before the slowest page finished rendering
+    assert events.index(("ocr", 1)) < events.index(("rendered", 4))
+
+def test_render_errors_propagate():
+    def render(path, page_num):
+        if page_num == 2:
+            raise RuntimeError("pdftoppm failed")
+        return b"jpeg"
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        with pytest.raises(RuntimeError):
+            _collect(page_nums=[1, 2, 3], render=render, ocr=lambda jpeg, n: "", executor=executor)
+
+def test_batched_ocr_groups_pages():
+    calls = []
+
+    def render(path, page_num):
+        time.sleep(0.01 * page_num)
+        return f"jpeg-{page_num}".encode()
+
+    def ocr_batch(pages):
+        calls.append([n for n, _ in pages])
+        return {n: jpeg.decode().upper() for n, jpeg in pages if n != 5}
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        pages = _collect(page_nums=[1, 2, 3, 4, 5], render=render, ocr=None, ocr_batch=ocr_batch,
+                         batch_size=2, executor=executor)
+
+    assert sorted(len(c) for c in calls) == [1, 2, 2]
+    assert sorted(n for c in calls for n in c) == [1, 2, 3, 4, 5]
+    # A page the batch didn't return comes back without text
+    assert sorted((p.page_num, p.text) for p in pages) == [(n, f"JPEG-{n}") for n in range(1, 5)] + [(5, None)]
+
+def test_batched_render_errors_propagate():
+    def render(path, page_num):
+        if page_num == 3:
+            raise RuntimeError("pdftoppm failed")
+        return b"jpeg"
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        with pytest.raises(RuntimeError):
+            _collect(page_nums=[1, 2, 3, 4], render=render, ocr_batch=lambda pages: {}, batch_size=2, executor=executor)
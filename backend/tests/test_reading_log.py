@@ -0,0 +1,27 @@
+from models import ReadingEvent
+from reading_log import event_day, rollup, streaks
+
+def test_days_follow_the_readers_time_zone():
+    at = 1767225600000 - 30 * 60 * 1000  # 2025-12-31 23:30 UTC
+    assert event_day(at) == "2025-12-31"
+    assert event_day(at, 60) == "2026-01-01"
+    assert event_day(at, -300) == "2025-12-31"
+
+def test_rollup_groups_by_day_and_story():
+    at = 1767225600000
+    events = [
+        ReadingEvent(storyId="a", type="session_start", at=at),
+        ReadingEvent(storyId="a", type="page", at=at, pages=2),
+        ReadingEvent(storyId="a", type="quiz", at=at, correct=True, words=100),
+        ReadingEvent(storyId="b", type="session_end", at=at, seconds=60),
+    ]
+    totals = rollup(events)
+    assert totals[("2026-01-01", "a")] == {"sessions": 1, "seconds": 0, "pages": 2, "words": 100, "questions": 1, "correct": 1}
+    assert totals[("2026-01-01", "b")]["seconds"] == 60
+
+def test_streaks():
+    days = ["2026-01-01", "2026-01-02", "2026-01-03", "2026-01-07", "2026-01-08"]
+    assert streaks(days, "2026-01-08") == (2, 3)
+    assert streaks(days, "2026-01-09") == (2, 3)  # Today not read yet: the streak holds
+    assert streaks(days, "2026-01-10") == (0, 3)
+    assert streaks([], "2026-01-10") == (0, 0)
@@ -0,0 +1,99 @@
+import asyncio
+import pytest
+
+from singleflight import SingleFlight, PageFlight, KeyedLocks, content_key
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def scenario():
+        results = await asyncio.gather(*(flight.do(content_key("quiz", "text"), work) for _ in range(5)))
+        assert results == ["result"] * 5
+        assert len(calls) == 1
+        # Once finished, the next call runs again
+        await flight.do(content_key("quiz", "text"), work)
+        assert len(calls) == 2
+        assert not flight.in_flight(content_key("quiz", "text"))
+
+    asyncio.run(scenario())
+
+def test_errors_are_shared_and_waiter_cancellation_is_isolated():
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("model error")
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return 42
+
+    async def scenario():
+        results = await asyncio.gather(flight.do("k", failing), flight.do("k", failing), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+
+        first = asyncio.ensure_future(flight.do("s", slow))
+        second = asyncio.ensure_future(flight.do("s", slow))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == 42
+
+    asyncio.run(scenario())
+
+def test_overlapping_page_sets_are_merged():
+    flight = PageFlight()
+    produced = []
+
+    async def produce(page_nums):
+        produced.append(list(page_nums))
+        for n in page_nums:
+            await asyncio.sleep(0.005)
+            yield n, f"page {n}"
+
+    async def scenario():
+        a, b = await asyncio.gather(
+            flight.run("story", range(6, 11), produce),
+            flight.run("story", range(8, 13), produce),
+        )
+        assert a == {n: f"page {n}" for n in range(6, 11)}
+        assert b == {n: f"page {n}" for n in range(8, 13)}
+        # Second request only produced the pages nobody was working on yet
+        assert produced == [[6, 7, 8, 9, 10], [11, 12]]
+        # Other documents are independent
+        await flight.run("other", [6], produce)
+        assert produced[-1] == [6]
+
+    asyncio.run(scenario())
+
+def test_page_failure_reaches_every_waiter():
+    flight = PageFlight()
+
+    async def produce(page_nums):
+        yield page_nums[0], "ok"
+        raise RuntimeError("render failed")
+
+    async def scenario():
+        results = await asyncio.gather(
+            flight.run("story", [1, 2], produce),
+            flight.run("story", [2], produce),
+            return_exceptions=True,
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+        # Failed pages are released and can be retried
+        async def retry(page_nums):
+            for n in page_nums:
+                yield n, "retried"
+        assert await flight.run("story", [2], retry) == {2: "retried"}
+
+    asyncio.run(scenario())
+
+def test_keyed_locks():
+    locks = KeyedLocks()
+    assert locks("a") is locks("a")
+    assert locks("a") is not locks("b")
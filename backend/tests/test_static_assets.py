@@ -0,0 +1,73 @@
+import gzip
+import os
+import brotli
+from static_assets import IMMUTABLE, REVALIDATE, StaticSite, is_fingerprinted
+
+BUNDLE = b"export function render(){return 'hello world';}\n" * 200
+
+def build(tmp_path, precompressed=False):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "index.html").write_bytes(b"<html><script src='/assets/index-Bx9_kQ2a.js'></script></html>")
+    (tmp_path / "favicon.ico").write_bytes(b"\x00" * 100)
+    (tmp_path / "assets" / "index-Bx9_kQ2a.js").write_bytes(BUNDLE)
+    if precompressed:
+        (tmp_path / "assets" / "index-Bx9_kQ2a.js.br").write_bytes(b"prebuilt")
+    return StaticSite.build(str(tmp_path))
+
+def test_fingerprinted_names():
+    assert is_fingerprinted("assets/index-Bx9_kQ2a.js")
+    assert is_fingerprinted("assets/vendor-D2f8a_-1.css")
+    assert not is_fingerprinted("assets/logo.svg")
+    assert not is_fingerprinted("index-Bx9_kQ2a.js")  # Only Vite's output directory
+
+def test_serves_compressed_bundle_with_immutable_caching(tmp_path):
+    site = build(tmp_path)
+    assert set(site.assets) == {"index.html", "favicon.ico", "assets/index-Bx9_kQ2a.js"}
+
+    response = site.response("/assets/index-Bx9_kQ2a.js", "gzip, deflate, br")
+    assert response.headers["content-encoding"] == "br"
+    assert brotli.decompress(response.body) == BUNDLE
+    assert response.headers["cache-control"] == IMMUTABLE
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.media_type.startswith("application/javascript") or response.media_type.startswith("text/javascript")
+
+    response = site.response("assets/index-Bx9_kQ2a.js", "gzip;q=1, br;q=0")
+    assert gzip.decompress(response.body) == BUNDLE
+
+    response = site.response("assets/index-Bx9_kQ2a.js", "")
+    assert response.body == BUNDLE
+    assert "content-encoding" not in response.headers
+
+def test_spa_fallback_and_revalidation(tmp_path):
+    site = build(tmp_path)
+    response = site.response("library/some-story", "gzip")
+    assert response.body.startswith(b"<html>")
+    assert response.headers["cache-control"] == REVALIDATE
+    assert "content-encoding" not in response.headers  # Too small to be worth compressing
+
+    assert site.response("", "").body.startswith(b"<html>")
+    assert site.response("assets/index-OldHash1.js", "").status_code == 404
+
+    etag = response.headers["etag"]
+    assert site.response("/", "gzip", etag).status_code == 304
+    assert site.response("/", "gzip", '"stale"').status_code == 200
+
+def test_precompressed_siblings_are_used(tmp_path):
+    site = build(tmp_path, precompressed=True)
+    assert "assets/index-Bx9_kQ2a.js.br" not in site.assets
+    assert site.response("assets/index-Bx9_kQ2a.js", "br").body == b"prebuilt"
+
+def test_encodings_get_distinct_etags(tmp_path):
+    site = build(tmp_path)
+    br = site.response("assets/index-Bx9_kQ2a.js", "br").headers["etag"]
+    identity = site.response("assets/index-Bx9_kQ2a.js", "").headers["etag"]
+    assert br != identity
+    assert site.response("assets/index-Bx9_kQ2a.js", "br", br).status_code == 304
+    assert site.response("assets/index-Bx9_kQ2a.js", "", br).status_code == 200
+
+def test_large_files_are_served_from_disk(tmp_path, monkeypatch):
+    import static_assets
+    monkeypatch.setattr(static_assets, "STATIC_MAX_MEMORY_FILE", 1000)
+    site = build(tmp_path)
+    asset = site.assets["assets/index-Bx9_kQ2a.js"]
+    assert asset.body is None and asset.path == os.path.join(str(tmp_path), "assets/index-Bx9_kQ2a.js")
@@ -0,0 +1,99 @@
+import io
+import os
+from datetime import datetime, timezone
+import pytest
+from storage import LocalStorage, S3Storage, page_key, source_key, thumbnail_key, save_page_jpeg
+
+class FakeS3Client:
+    """In-memory stand-in for a MinIO/S3 bucket exposing the boto3 calls S3Storage uses."""
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **extra):
+        self.objects[(Bucket, Key)] = bytes(Body)
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None):
+        with open(Filename, "rb") as f:
+            self.objects[(Bucket, Key)] = f.read()
+
+    def download_file(self, Bucket, Key, Filename):
+        with open(Filename, "wb") as f:
+            f.write(self.objects[(Bucket, Key)])
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def list_objects_v2(self, Bucket, Prefix, MaxKeys=1000, ContinuationToken=None):
+        keys = sorted(k for b, k in self.objects if b == Bucket and k.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+        now = datetime.now(timezone.utc)
+        result = {"Contents": [{"Key": k, "Size": len(self.objects[(Bucket, k)]), "LastModified": now} for k in page]}
+        if start + MaxKeys < len(keys):
+            result["IsTruncated"] = True
+            result["NextContinuationToken"] = str(start + MaxKeys)
+        return result
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete["Objects"]:
+            self.objects.pop((Bucket, obj["Key"]), None)
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"http://minio.local/{Params['Bucket']}/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+@pytest.fixture(params=["local", "s3"])
+def store(request, tmp_path):
+    if request.param == "local":
+        return LocalStorage(str(tmp_path / "uploads"))
+    return S3Storage("focusread", client=FakeS3Client())
+
+def test_put_get_and_delete(store, tmp_path):
+    store.put_bytes(page_key("story-1", 1), b"page", "image/jpeg")
+    src = tmp_path / "upload.pdf"
+    src.write_bytes(b"%PDF-1.4")
+    store.put_file(source_key("story-1"), str(src), "application/pdf")
+
+    assert not src.exists()  # put_file consumes the source
+    assert store.exists(source_key("story-1"))
+    assert store.get_bytes(page_key("story-1", 1)) == b"page"
+    with store.local_path(source_key("story-1")) as path:
+        with open(path, "rb") as f:
+            assert f.read() == b"%PDF-1.4"
+
+    store.delete_prefix("story-1")
+    assert not store.exists(source_key("story-1"))
+    assert not store.exists(page_key("story-1", 1))
+
+def test_urls(tmp_path):
+    local = LocalStorage(str(tmp_path))
+    assert local.url("s/1.jpg") == "/uploads/s/1.jpg"
+    assert local.direct_url("s/1.jpg") is None
+
+    presigned = S3Storage("focusread", client=FakeS3Client(), presign_expiry=60)
+    # Embedded URL stays stable; the API route redirects to a fresh presigned URL
+    assert presigned.url("s/1.jpg") == "/uploads/s/1.jpg"
+    assert presigned.direct_url("s/1.jpg").startswith("http://minio.local/focusread/s/1.jpg")
+
+    public = S3Storage("focusread", client=FakeS3Client(), public_url="https://cdn.example.com/")
+    assert public.url("s/1.jpg") == "https://cdn.example.com/s/1.jpg"
+
+def test_local_rejects_escaping_keys(tmp_path):
+    store = LocalStorage(str(tmp_path / "uploads"))
+    with pytest.raises(ValueError):
+        store.put_bytes("../outside.txt", b"x")
+    assert store.file_path("../outside.txt") is None
+
+def test_save_page_jpeg_writes_thumbnail(store):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (800, 1000), "white").save(buffer, "JPEG")
+    url = save_page_jpeg(store, "story-2", 1, buffer.getvalue())
+    assert url.endswith("story-2/1.jpg")
+    assert store.exists(thumbnail_key("story-2"))
+
+def test_list_objects(store):
+    store.put_bytes(page_key("story-1", 1), b"page", "image/jpeg")
+    store.put_bytes(page_key("story-2", 1), b"longer page", "image/jpeg")
+    listed = {obj.key: obj.size for obj in store.list_objects()}
+    assert listed == {page_key("story-1", 1): 4, page_key("story-2", 1): 11}
+    assert all(obj.modified > 0 for obj in store.list_objects())
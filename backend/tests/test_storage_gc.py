@@ -0,0 +1,79 @@
+import asyncio
+import os
+import time
+
+import database
+import partial_uploads
+import storage_gc
+from storage import LocalStorage, page_key, source_key
+
+class FakeDB:
+    def __init__(self, owners, sessions=()):
+        self.owners = owners
+        self.sessions = list(sessions)
+        self.storage_bytes = {}
+
+    async def get_story_owners(self):
+        return dict(self.owners)
+
+    async def set_storage_bytes(self, sizes):
+        self.storage_bytes.update(sizes)
+
+    async def get_upload_session_ids(self):
+        return self.sessions
+
+    async def get_storage_usage(self, user_id):
+        return sum(self.storage_bytes.get(s, 0) for s, u in self.owners.items() if u == user_id)
+
+def _age(store, key, seconds):
+    path = store.file_path(key)
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+def test_sweep_deletes_orphans_and_reconciles_usage(tmp_path, monkeypatch):
+    store = LocalStorage(str(tmp_path / "uploads"))
+    store.put_bytes(source_key("kept"), b"x" * 100)
+    store.put_bytes(page_key("kept", 1), b"x" * 20)
+    store.put_bytes(page_key("other-user", 1), b"x" * 5)
+    store.put_bytes(source_key("deleted-story"), b"x" * 50)
+    store.put_bytes(page_key("in-progress", 1), b"x" * 7)
+    _age(store, source_key("deleted-story"), 7200)
+
+    partial_dir = tmp_path / "partial"
+    partial_dir.mkdir()
+    for name in ("live-session", "abandoned"):
+        (partial_dir / name).write_bytes(b"data")
+        past = time.time() - 7200
+        os.utime(partial_dir / name, (past, past))
+    monkeypatch.setattr(partial_uploads, "PARTIAL_UPLOAD_DIR", str(partial_dir))
+
+    fake_db = FakeDB({"kept": "u1", "other-user": "u2", "empty": "u1"}, sessions=["live-session"])
+    monkeypatch.setattr(database, "db", fake_db)
+
+    # Dry run reports without touching anything
+    report = asyncio.run(storage_gc.sweep(store, dry_run=True))
+    assert report.orphans_deleted == ["deleted-story"]
+    assert store.exists(source_key("deleted-story"))
+    assert fake_db.storage_bytes == {}
+
+    report = asyncio.run(storage_gc.sweep(store))
+    assert report.orphans_deleted == ["deleted-story"]
+    assert report.bytes_freed == 50
+    assert report.partials_deleted == 1
+    assert not store.exists(source_key("deleted-story"))
+    # Recently written artifacts without a story may belong to an upload still in progress
+    assert store.exists(page_key("in-progress", 1))
+    assert sorted(os.listdir(partial_dir)) == ["live-session"]
+    assert fake_db.storage_bytes == {"kept": 120, "other-user": 5, "empty": 0}
+    assert report.user_bytes == {"u1": 120, "u2": 5}
+
+def test_check_quota(monkeypatch):
+    fake_db = FakeDB({"a": "u1"})
+    fake_db.storage_bytes = {"a": 900}
+    monkeypatch.setattr(database, "db", fake_db)
+
+    monkeypatch.setattr(storage_gc, "STORAGE_QUOTA_BYTES", 0)
+    assert asyncio.run(storage_gc.check_quota("u1", 10**9)) is None
+    monkeypatch.setattr(storage_gc, "STORAGE_QUOTA_BYTES", 1000)
+    assert asyncio.run(storage_gc.check_quota("u1", 100)) is None
+    assert "quota" in asyncio.run(storage_gc.check_quota("u1", 101))
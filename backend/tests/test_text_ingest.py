@@ -0,0 +1,114 @@
+import io
+import zipfile
+import pytest
+
+import text_ingest
+from text_ingest import ChunkBuilder, parse_epub, parse_text
+
+CONTAINER = """<?xml version="1.0"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>"""
+
+OPF = """<?xml version="1.0"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/"><dc:title>The Lighthouse</dc:title></metadata>
+  <manifest>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+    <item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>
+    <item id="cover" href="text/cover.xhtml" media-type="application/xhtml+xml"/>
+    <item id="c1" href="text/ch1.xhtml" media-type="application/xhtml+xml"/>
+    <item id="c2" href="text/ch%202.xhtml" media-type="application/xhtml+xml"/>
+  </manifest>
+  <spine toc="ncx"><itemref idref="cover"/><itemref idref="c1"/><itemref idref="c2"/></spine>
+</package>"""
+
+NAV = """<?xml version="1.0"?>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops"><body>
+  <nav epub:type="toc"><ol>
+    <li><a href="text/ch1.xhtml">One: The Keeper</a></li>
+    <li><a href="text/ch1.xhtml#later">Later in one</a></li>
+    <li><a href="text/ch%202.xhtml">Two: The Storm</a></li>
+  </ol></nav>
+</body></html>"""
+
+NCX = """<?xml version="1.0"?>
+<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/"><navMap>
+  <navPoint><navLabel><text>Chapter One</text></navLabel><content src="text/ch1.xhtml"/></navPoint>
+  <navPoint><navLabel><text>Chapter Two</text></navLabel><content src="text/ch%202.xhtml"/></navPoint>
+</navMap></ncx>"""
+
+def chapter(title, paragraphs):
+    body = "".join(f"<p>{p}</p>" for p in paragraphs)
+    return (f'<?xml version="1.0"?><html xmlns="http://www.w3.org/1999/xhtml"><head><title>x</title>'
+            f'<style>p {{ margin: 0 }}</style></head><body><h1>{title}</h1>{body}</body></html>')
+
+def make_epub(with_nav=True):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as z:
+        z.writestr("mimetype", "application/epub+zip")
+        z.writestr("META-INF/container.xml", CONTAINER)
+        opf = OPF if with_nav else OPF.replace(' properties="nav"', "")
+        z.writestr("OEBPS/content.opf", opf)
+        z.writestr("OEBPS/nav.xhtml", NAV)
+        z.writestr("OEBPS/toc.ncx", NCX)
+        z.writestr("OEBPS/text/cover.xhtml", chapter("Cover", []))
+        z.writestr("OEBPS/text/ch1.xhtml", chapter("The Keeper", ["word " * 40, "The <i>lamp</i> &amp; the <b>sea</b>."] * 3))
+        z.writestr("OEBPS/text/ch 2.xhtml", chapter("The Storm", ["Rain fell all night."]))
+    buffer.seek(0)
+    return buffer
+
+def test_chunk_builder_keeps_paragraphs_whole():
+    builder = ChunkBuilder(target_words=10)
+    for words in (4, 4, 4, 20, 1):
+        builder.add(" ".join(["w"] * words))
+    chunks, _ = builder.finish()
+    assert [len(c.text.split()) for c in chunks] == [8, 4, 20, 1]
+    assert [c.id for c in chunks] == [0, 1, 2, 3]
+    assert all(c.isProcessed and c.formattedText == c.text for c in chunks)
+
+def test_parse_epub_with_nav():
+    book = parse_epub(make_epub(), target_words=100)
+    assert book.title == "The Lighthouse"
+    assert [(c.title, c.pageIndex) for c in book.chapters] == [("One: The Keeper", 1), ("Two: The Storm", 3)]
+    assert book.chunks[0].text == "# Cover"
+    assert book.chunks[1].text.startswith("# The Keeper\n\nword word")
+    assert "The *lamp* & the **sea**." in book.chunks[1].text
+    assert "margin" not in book.chunks[1].text
+    assert book.chunks[3].text == "# The Storm\n\nRain fell all night."
+
+def test_parse_epub_falls_back_to_ncx():
+    book = parse_epub(make_epub(with_nav=False), target_words=100)
+    assert [c.title for c in book.chapters] == ["Chapter One", "Chapter Two"]
+
+def test_parse_text_paragraphs_and_headings():
+    text = (
+        "﻿CHAPTER I\n\nIt was a dark and\nstormy night.\n\n"
+        "- first item\n- second item\n\n"
+        "# Part Two\n\nMorning came.\n"
+    )
+    book = parse_text(io.BytesIO(text.encode("utf-8")), target_words=100)
+    assert [(c.title, c.pageIndex) for c in book.chapters] == [("CHAPTER I", 0), ("Part Two", 1)]
+    assert book.chunks[0].text == "## CHAPTER I\n\nIt was a dark and stormy night.\n\n- first item\n- second item"
+    assert book.chunks[1].text == "## Part Two\n\nMorning came."
+
+def test_prose_starting_with_heading_words_is_not_a_chapter():
+    text = (
+        "Part of the problem was the weather.\n\n"
+        "Book lovers will know this.\n\n"
+        "Chapter 3 of the war began in spring.\n\n"
+        "PART IV: The Return\n\nHome at last.\n"
+    )
+    book = parse_text(io.BytesIO(text.encode("utf-8")), target_words=100)
+    assert [c.title for c in book.chapters] == ["PART IV: The Return"]
+    assert book.chunks[0].text.startswith("Part of the problem was the weather.")
+
+def test_parse_epub_refuses_oversized_members(monkeypatch):
+    monkeypatch.setattr(text_ingest, "EPUB_MAX_MEMBER_BYTES", 300)
+    with pytest.raises(ValueError, match="too large"):
+        parse_epub(make_epub())
+
+    monkeypatch.setattr(text_ingest, "EPUB_MAX_MEMBER_BYTES", 1 << 20)
+    monkeypatch.setattr(text_ingest, "EPUB_MAX_TEXT_BYTES", 2000)
+    with pytest.raises(ValueError, match="too large"):
+        parse_epub(make_epub())
@@ -0,0 +1,274 @@
+import codecs
+import io
+import os
+import posixpath
+import re
+import zipfile
+from html.parser import HTMLParser
+from typing import BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import unquote
+from xml.etree import ElementTree
+
+from models import Chapter, Chunk
+
+# Ingestion for sources that are already text (EPUB, plain text / Markdown).
+# No rendering and no model calls: the document is parsed as it is read, paragraphs
+# are packed into chunks of about TEXT_CHUNK_WORDS words, and chapters come from the
+# EPUB navigation (or headings in plain text). Chunks are created processed.
+
+TEXT_CHUNK_WORDS = int(os.getenv("TEXT_CHUNK_WORDS", "300"))
+# Zip bomb guards: largest single EPUB member read, and total bytes decompressed per book
+EPUB_MAX_MEMBER_BYTES = int(os.getenv("EPUB_MAX_MEMBER_BYTES", str(16 * 1024 * 1024)))
+EPUB_MAX_TEXT_BYTES = int(os.getenv("EPUB_MAX_TEXT_BYTES", str(128 * 1024 * 1024)))
+
+class ParsedBook(NamedTuple):
+    title: Optional[str]
+    chunks: List[Chunk]
+    chapters: List[Chapter]
+
+class ChunkBuilder:
+    """Packs paragraphs into chunks of roughly `target_words` words, never splitting a paragraph."""
+    def __init__(self, target_words: int = TEXT_CHUNK_WORDS):
+        self.target_words = target_words
+        self.chunks: List[Chunk] = []
+        self.chapters: List[Chapter] = []
+        self._paragraphs: List[str] = []
+        self._words = 0
+
+    def add(self, paragraph: str) -> None:
+        words = len(paragraph.split())
+        if not words:
+            return
+        if self._paragraphs and self._words + words > self.target_words:
+            self.flush()
+        self._paragraphs.append(paragraph)
+        self._words += words
+
+    def start_chapter(self, title: str) -> None:
+        # Chapters always begin a new chunk so the reader can jump straight to them
+        self.flush()
+        if self.chapters and self.chapters[-1].pageIndex == len(self.chunks):
+            return  # Two nav entries for the same position: keep the first
+        self.chapters.append(Chapter(title=title, pageIndex=len(self.chunks)))
+
+    def flush(self) -> None:
+        if not self._paragraphs:
+            return
+        text = "\n\n".join(self._paragraphs)
+        self.chunks.append(Chunk(id=len(self.chunks), text=text, formattedText=text, isProcessed=True))
+        self._paragraphs = []
+        self._words = 0
+
+    def finish(self) -> Tuple[List[Chunk], List[Chapter]]:
+        self.flush()
+        # A chapter heading at the very end has no chunk to point at
+        chapters = [c for c in self.chapters if c.pageIndex < len(self.chunks)]
+        return self.chunks, chapters
+
+# --- Plain text ---
+
+# Markdown headings, or "Chapter 12", "PART IV: The Return", "Book 2 - Exile": the word, a
+# number or roman numeral, and at most a separator and a title. Prose that happens to start
+# with one of the words ("Part of the problem...") doesn't match.
+_ROMAN = r"(?=[ivxlcdm])m{0,3}(?:cm|cd|d?c{0,3})(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3})"
+_HEADING = re.compile(
+    rf"^(#{{1,3}})\s+(.+)$|^((?:chapter|part|book)\s+(?:\d+|{_ROMAN})\b\s*(?:[.:\-–—]\s*.{{0,60}})?)$",
+    re.IGNORECASE,
+)
+
+_MARKDOWN_BLOCK = re.compile(r"^\s*(?:[-*+>]|\d+\.)\s", re.MULTILINE)
+
+def _heading(paragraph: str) -> Optional[str]:
+    if "\n" in paragraph or len(paragraph) > 80:
+        return None
+    match = _HEADING.match(paragraph)
+    if not match:
+        return None
+    return (match.group(2) or match.group(3)).strip()
+
+def _text_paragraphs(lines: Iterable[str]) -> Iterator[str]:
+    current: List[str] = []
+    for line in lines:
+        line = line.rstrip()
+        if line.strip():
+            current.append(line.strip())
+        elif current:
+            yield "\n".join(current)
+            current = []
+    if current:
+        yield "\n".join(current)
+
+def parse_text(stream: BinaryIO, target_words: int = TEXT_CHUNK_WORDS) -> ParsedBook:
+    """Plain text or Markdown; paragraphs are separated by blank lines."""
+    # Decoded incrementally, line by line; works on any object with read()
+    lines = codecs.getreader("utf-8-sig")(stream, errors="replace")
+    builder = ChunkBuilder(target_words)
+    for paragraph in _text_paragraphs(lines):
+        heading = _heading(paragraph)
+        if heading:
+            builder.start_chapter(heading)
+            builder.add(f"## {heading}")
+        elif _MARKDOWN_BLOCK.search(paragraph):
+            builder.add(paragraph)
+        else:
+            # Single newlines inside a prose paragraph are hard wraps, not breaks
+            builder.add(paragraph.replace("\n", " "))
+    chunks, chapters = builder.finish()
+    return ParsedBook(None, chunks, chapters)
+
+# --- EPUB ---
+
+_BLOCK_TAGS = {"p", "div", "li", "blockquote", "pre", "tr", "dd", "dt", "figcaption", "br"}
+_HEADING_TAGS = {"h1": "#", "h2": "##", "h3": "###", "h4": "####", "h5": "####", "h6": "####"}
+_SKIP_TAGS = {"script", "style", "head", "nav"}
+
+class _XHTMLParagraphs(HTMLParser):
+    """Collects block-level text from an XHTML document as Markdown paragraphs."""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.paragraphs: List[str] = []
+        self._buffer: List[str] = []
+        self._open: List[int] = []  # Buffer positions of unclosed emphasis markers
+        self._prefix = ""
+        self._skip = 0
+        self._emphasis = {"b": "**", "strong": "**", "i": "*", "em": "*"}
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag in _HEADING_TAGS:
+            self._end_block()
+            self._prefix = _HEADING_TAGS[tag] + " "
+        elif tag in _BLOCK_TAGS:
+            self._end_block()
+        elif tag in self._emphasis:
+            self._open.append(len(self._buffer))
+            self._buffer.append(self._emphasis[tag])
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in _HEADING_TAGS or tag in _BLOCK_TAGS:
+            self._end_block()
+        elif tag in self._emphasis and self._open:
+            start = self._open.pop()
+            if "".join(self._buffer[start + 1:]).strip():
+                self._buffer.append(self._emphasis[tag])
+            else:
+                del self._buffer[start]  # Empty <i></i>: drop the opening marker too
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._buffer.append(data)
+
+    def _end_block(self):
+        text = " ".join("".join(self._buffer).split())
+        if text:
+            self.paragraphs.append(self._prefix + text)
+        self._buffer = []
+        self._open = []
+        self._prefix = ""
+
+    def close(self):
+        super().close()
+        self._end_block()
+
+def _xhtml_paragraphs(data: bytes) -> List[str]:
+    parser = _XHTMLParagraphs()
+    parser.feed(data.decode("utf-8", errors="replace"))
+    parser.close()
+    return parser.paragraphs
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+def _resolve(base: str, href: str) -> str:
+    path = unquote(href.split("#", 1)[0])
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base), path))
+
+class _EpubReader:
+    """Reads members of an EPUB, refusing any (or a total) larger than the configured caps."""
+    def __init__(self, book: zipfile.ZipFile):
+        self.book = book
+        self.remaining = EPUB_MAX_TEXT_BYTES
+
+    def read(self, path: str) -> bytes:
+        # file_size is what ZipExtFile stops at, so checking it bounds the decompressed bytes
+        size = self.book.getinfo(path).file_size
+        if size > EPUB_MAX_MEMBER_BYTES:
+            raise ValueError(f"EPUB member {path} is too large ({size} bytes)")
+        if size > self.remaining:
+            raise ValueError("EPUB text is too large")
+        self.remaining -= size
+        return self.book.read(path)
+
+def _nav_titles(book: _EpubReader, nav_path: Optional[str], ncx_path: Optional[str]) -> Dict[str, str]:
+    """First navigation title per content document path, from the EPUB 3 nav or the EPUB 2 NCX."""
+    titles: Dict[str, str] = {}
+    if nav_path:
+        root = ElementTree.fromstring(book.read(nav_path))
+        for nav in root.iter():
+            if _local(nav.tag) != "nav":
+                continue
+            kind = next((v for k, v in nav.attrib.items() if _local(k) == "type"), "")
+            if kind and kind != "toc":
+                continue
+            for a in nav.iter():
+                if _local(a.tag) == "a" and a.get("href"):
+                    title = " ".join("".join(a.itertext()).split())
+                    if title:
+                        titles.setdefault(_resolve(nav_path, a.get("href")), title)
+            break
+    elif ncx_path:
+        root = ElementTree.fromstring(book.read(ncx_path))
+        for point in root.iter():
+            if _local(point.tag) != "navPoint":
+                continue
+            label = next((e for e in point.iter() if _local(e.tag) == "text"), None)
+            content = next((e for e in point.iter() if _local(e.tag) == "content"), None)
+            if label is not None and content is not None and content.get("src"):
+                title = " ".join((label.text or "").split())
+                if title:
+                    titles.setdefault(_resolve(ncx_path, content.get("src")), title)
+    return titles
+
+def parse_epub(stream: BinaryIO, target_words: int = TEXT_CHUNK_WORDS) -> ParsedBook:
+    """
+    Reads the spine in order, one content document at a time.
+    Chapters are placed at the start of the document their navigation entry points to.
+    """
+    if not hasattr(stream, "seekable"):
+        # SpooledTemporaryFile (UploadFile.file) before Python 3.11; EPUBs are small
+        stream = io.BytesIO(stream.read())
+    with zipfile.ZipFile(stream) as archive:
+        book = _EpubReader(archive)
+        container = ElementTree.fromstring(book.read("META-INF/container.xml"))
+        opf_path = next(e.get("full-path") for e in container.iter() if _local(e.tag) == "rootfile")
+        opf = ElementTree.fromstring(book.read(opf_path))
+
+        title = next((" ".join((e.text or "").split()) for e in opf.iter() if _local(e.tag) == "title"), None)
+        manifest = {}
+        nav_path = ncx_path = None
+        for item in opf.iter():
+            if _local(item.tag) != "item":
+                continue
+            path = _resolve(opf_path, item.get("href", ""))
+            manifest[item.get("id")] = path
+            if "nav" in (item.get("properties") or "").split():
+                nav_path = path
+            elif item.get("media-type") == "application/x-dtbncx+xml":
+                ncx_path = path
+        spine = [manifest[i.get("idref")] for i in opf.iter() if _local(i.tag) == "itemref" and i.get("idref") in manifest]
+        titles = _nav_titles(book, nav_path, ncx_path)
+
+        builder = ChunkBuilder(target_words)
+        for path in spine:
+            if path == nav_path:
+                continue
+            if path in titles:
+                builder.start_chapter(titles[path])
+            for paragraph in _xhtml_paragraphs(book.read(path)):
+                builder.add(paragraph)
+
+    chunks, chapters = builder.finish()
+    return ParsedBook(title or None, chunks, chapters)
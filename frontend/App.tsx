@@ -1,10 +1,11 @@
 
-import React, { useState, useEffect, useCallback, useMemo } from 'react';
+import React, { useState, useEffect, useCallback, useMemo, useRef } from 'react';
 import ReactMarkdown from 'react-markdown';
 import { FileUpload } from './components/FileUpload';
 import { QuizCard } from './components/QuizCard';
 import { ChatInterface } from './components/ChatInterface';
 import { generateQuizForChunk, formatChunkToMarkdown, sendChatMessage } from './services/geminiService';
+import { logReadingEvent, flushReadingEvents } from './services/readingLog';
 import { api } from './api';
 import { AuthModal } from './components/AuthModal';
 import { LeaderboardModal } from './components/LeaderboardModal';
@@ -12,6 +13,8 @@ import { PageSelector } from './components/PageSelector';
 import { TableOfContents } from './components/TableOfContents';
 import { AppView, Chunk, SessionStats, QuizQuestion, Chapter, LibraryItem, ReadingSettings, ChatMessage, User } from './types';
 
+const BATCH_RETRY_DELAY_MS = 10000;
+
 const App: React.FC = () => {
   const [view, setView] = useState<AppView>('upload');
   const [library, setLibrary] = useState<LibraryItem[]>([]);
@@ -65,20 +68,19 @@ const App: React.FC = () => {
   const [currentPdf, setCurrentPdf] = useState<any>(null);
   const [isExtracting, setIsExtracting] = useState(false);
 
+  // Settings as last loaded from / saved to the server, to skip echoing them back
+  const savedSettings = useRef<string | null>(null);
+
   // Load persistence data
   useEffect(() => {
-    // Check Auth
-    api.getMe()
-      .then(u => {
+    // One round-trip: user, settings and a library summary (chunks load when a story is opened).
+    // A 401 here means not logged in.
+    api.bootstrap()
+      .then(({ user: u, settings: s, library: summaries }) => {
         setUser(u);
-        // Load data only if authenticated
-        Promise.all([
-          api.getSettings(),
-          api.getStories()
-        ]).then(([s, stories]) => {
-          setSettings(s);
-          setLibrary(stories);
-        }).catch(console.error);
+        savedSettings.current = JSON.stringify(s);
+        setSettings(s);
+        setLibrary(summaries.map(summary => ({ ...summary, chunks: [] })));
       })
       .catch(() => {
         setShowAuthModal(true);
@@ -87,9 +89,11 @@ const App: React.FC = () => {
 
   // Sync settings
   useEffect(() => {
-    // Debounce or just fire and forget for now (could be optimized)
+    const serialized = JSON.stringify(settings);
+    if (!user || serialized === savedSettings.current) return;
+    savedSettings.current = serialized;
     api.updateSettings(settings).catch(console.error);
-  }, [settings]);
+  }, [settings, user]);
 
   // Sync active session
   useEffect(() => {
@@ -114,6 +118,18 @@ const App: React.FC = () => {
     }
   }, [currentIndex, stats, elapsedTime, view, activeSessionId, chunks]);
 
+  // Reading log: a session lasts while a story is open in the reader
+  useEffect(() => {
+    if (view !== 'reading' || !activeSessionId) return;
+    const storyId = activeSessionId;
+    const started = Date.now();
+    logReadingEvent({ storyId, type: 'session_start' });
+    return () => {
+      logReadingEvent({ storyId, type: 'session_end', seconds: Math.round((Date.now() - started) / 1000) });
+      flushReadingEvents();
+    };
+  }, [view, activeSessionId]);
+
   const processText = (text: string, title?: string) => {
     // 1. Normalize line endings
     const normalizedText = text.replace(/\r\n/g, '\n');
@@ -210,6 +226,17 @@ const App: React.FC = () => {
   };
 
   const startSession = (item: LibraryItem) => {
+    if (item.chunks.length === 0 && item.chunkCount) {
+      // Summary from /bootstrap: fetch the full story once, then open it
+      api.getStory(item.id).then(full => {
+        setLibrary(prev => prev.map(i => i.id === full.id ? full : i));
+        startSession(full);
+      }).catch(err => {
+        console.error("Failed to load story", err);
+        alert("Failed to load story");
+      });
+      return;
+    }
     setActiveSessionId(item.id);
     setChunks(item.chunks);
     setCurrentIndex(item.currentIndex);
@@ -321,19 +348,17 @@ const App: React.FC = () => {
   };
 
   const handleLoginSuccess = async (u: User) => {
-    setUser(u);
     setShowAuthModal(false);
-    // Load data
+    // Load data before setting the user, so the settings sync doesn't push local defaults
     try {
-      const [s, stories] = await Promise.all([
-        api.getSettings(),
-        api.getStories()
-      ]);
+      const { settings: s, library: summaries } = await api.bootstrap();
+      savedSettings.current = JSON.stringify(s);
       setSettings(s);
-      setLibrary(stories);
+      setLibrary(summaries.map(summary => ({ ...summary, chunks: [] })));
     } catch (e) {
       console.error(e);
     }
+    setUser(u);
   };
 
   const handleLogout = async () => {
@@ -412,15 +437,24 @@ const App: React.FC = () => {
           batchSizeToRequest = 1; // FAST MODE
         }
 
+        // Pages whose OCR failed come back unprocessed (the server retries them in the
+        // background); back off instead of asking again straight away
+        let retryDelay = 0;
+        const requestedIndex = startIndexToRequest ?? targetIndex;
         api.processStoryBatch(activeSessionId, startIndexToRequest, batchSizeToRequest).then(updatedStory => {
           // Update local chunks
           setChunks(updatedStory.chunks);
           // Update library cache
           setLibrary(prev => prev.map(item => item.id === activeSessionId ? updatedStory : item));
-        }).catch(e => console.error("Batch process failed", e))
-          .finally(() => {
-            setIsBatchProcessing(false);
-          });
+          if (updatedStory.chunks[requestedIndex]?.isProcessed === false) {
+            retryDelay = BATCH_RETRY_DELAY_MS;
+          }
+        }).catch(e => {
+          console.error("Batch process failed", e);
+          retryDelay = BATCH_RETRY_DELAY_MS;
+        }).finally(() => {
+          setTimeout(() => setIsBatchProcessing(false), retryDelay);
+        });
       }
     }
   }, [currentIndex, view, activeSessionId, chunks, isBatchProcessing]);
@@ -435,6 +469,7 @@ const App: React.FC = () => {
 
   const handleNext = () => {
     if (currentIndex < chunks.length - 1) {
+      if (activeSessionId) logReadingEvent({ storyId: activeSessionId, type: 'page', pages: 1 });
       setCurrentIndex(prev => prev + 1);
       setShowQuiz(false);
       window.scrollTo({ top: 0, behavior: 'smooth' });
@@ -446,15 +481,18 @@ const App: React.FC = () => {
   };
 
   const handleAnswer = (correct: boolean) => {
+    const words = chunks[currentIndex].text.split(/\s+/).length;
     setStats(prev => ({
       ...prev,
       correctAnswers: prev.correctAnswers + (correct ? 1 : 0),
       totalQuestions: prev.totalQuestions + 1,
-      wordCount: prev.wordCount + chunks[currentIndex].text.split(/\s+/).length
+      wordCount: prev.wordCount + words
     }));
+    if (activeSessionId) logReadingEvent({ storyId: activeSessionId, type: 'quiz', correct, words });
 
     if (correct) {
       if (currentIndex < chunks.length - 1) {
+        if (activeSessionId) logReadingEvent({ storyId: activeSessionId, type: 'page', pages: 1 });
         setCurrentIndex(prev => prev + 1);
         setShowQuiz(false);
         window.scrollTo({ top: 0, behavior: 'smooth' });
@@ -480,7 +518,8 @@ const App: React.FC = () => {
     // Use the raw text for context, not the formatted one, to save tokens and avoid markdown artifacts
     const currentContext = chunks[currentIndex]?.text || "";
 
-    const response = await sendChatMessage(currentContext, chatMessages, text);
+    // With the story id the server adds relevant passages from the rest of the book
+    const response = await sendChatMessage(currentContext, chatMessages, text, activeSessionId ?? undefined, currentIndex);
 
     const newAiMsg: ChatMessage = { id: (Date.now() + 1).toString(), role: 'model', text: response, timestamp: Date.now() };
     setChatMessages(prev => [...prev, newAiMsg]);
@@ -743,16 +782,16 @@ const App: React.FC = () => {
                           <div className="flex items-center space-x-3 text-[10px] font-bold text-gray-400 uppercase tracking-widest mb-6">
                             <span>{new Date(item.lastRead).toLocaleDateString()}</span>
                             <span>•</span>
-                            <span>{item.chunks.length} sections</span>
+                            <span>{item.chunkCount ?? item.chunks.length} sections</span>
                           </div>
                         </div>
                         <div className="space-y-3">
                           <div className="flex justify-between text-[10px] font-bold uppercase tracking-widest text-indigo-600">
                             <span>Progress</span>
-                            <span>{Math.round(((item.currentIndex + 1) / item.chunks.length) * 100)}%</span>
+                            <span>{Math.round(((item.currentIndex + 1) / (item.chunkCount ?? item.chunks.length)) * 100)}%</span>
                           </div>
                           <div className="w-full bg-gray-50 h-2 rounded-full overflow-hidden">
-                            <div className="bg-indigo-500 h-full transition-all duration-500" style={{ width: `${((item.currentIndex + 1) / item.chunks.length) * 100}%` }} />
+                            <div className="bg-indigo-500 h-full transition-all duration-500" style={{ width: `${((item.currentIndex + 1) / (item.chunkCount ?? item.chunks.length)) * 100}%` }} />
                           </div>
                         </div>
                       </div>
@@ -1,6 +1,9 @@
-import { LibraryItem, ReadingSettings, QuizQuestion, ChatMessage } from './types';
+import { LibraryItem, ReadingSettings, QuizQuestion, ChatMessage, UploadSession, ReadingEvent, ReadingHistory } from './types';
 
 const API_BASE = ''; // Use relative path for proxy
+const RESUMABLE_UPLOAD_THRESHOLD = 16 * 1024 * 1024;
+const UPLOAD_RANGE_BYTES = 8 * 1024 * 1024;
+const UPLOAD_MAX_RETRIES = 5;
 
 class ApiClient {
     private async request<T>(endpoint: string, options?: RequestInit): Promise<T> {
@@ -46,6 +49,11 @@ class ApiClient {
         await this.request('/auth/logout', { method: 'POST' });
     }
 
+    // User, settings and library summary in one request (app start-up)
+    async bootstrap(): Promise<import('./types').Bootstrap> {
+        return this.request<import('./types').Bootstrap>('/bootstrap');
+    }
+
     async getMe(): Promise<import('./types').User> {
         return this.request<import('./types').User>('/auth/me');
     }
@@ -71,10 +79,10 @@ class ApiClient {
         return res.formattedText;
     }
 
-    async chatWithAI(currentText: string, history: ChatMessage[], message: string): Promise<string> {
+    async chatWithAI(currentText: string, history: ChatMessage[], message: string, storyId?: string, chunkIndex?: number): Promise<string> {
         const res = await this.request<{ response: string }>('/ai/chat', {
             method: 'POST',
-            body: JSON.stringify({ currentText, history, message }),
+            body: JSON.stringify({ currentText, history, message, storyId, chunkIndex }),
         });
         return res.response;
     }
@@ -85,6 +93,15 @@ class ApiClient {
         return this.request<LibraryItem[]>('/stories');
     }
 
+    async getStory(id: string): Promise<LibraryItem> {
+        return this.request<LibraryItem>(`/stories/${id}`);
+    }
+
+    async searchStories(q: string, offset = 0, limit = 20): Promise<import('./types').SearchResults> {
+        const params = new URLSearchParams({ q, offset: offset.toString(), limit: limit.toString() });
+        return this.request<import('./types').SearchResults>(`/stories/search?${params.toString()}`);
+    }
+
     async createStory(story: LibraryItem): Promise<LibraryItem> {
         return this.request<LibraryItem>('/stories', {
             method: 'POST',
@@ -105,6 +122,22 @@ class ApiClient {
         });
     }
 
+    // --- Reading log ---
+
+    async addReadingEvents(events: ReadingEvent[], keepalive = false): Promise<void> {
+        await this.request('/reading/events', {
+            method: 'POST',
+            body: JSON.stringify({ events, utcOffsetMinutes: -new Date().getTimezoneOffset() }),
+            keepalive, // Lets the last batch go out while the page is being closed
+        });
+    }
+
+    async getReadingHistory(days = 30, storyId?: string): Promise<ReadingHistory> {
+        const params = new URLSearchParams({ days: days.toString(), utcOffsetMinutes: (-new Date().getTimezoneOffset()).toString() });
+        if (storyId) params.append('storyId', storyId);
+        return this.request<ReadingHistory>(`/reading/history?${params}`);
+    }
+
     // --- Settings ---
 
     async getSettings(): Promise<ReadingSettings> {
@@ -119,15 +152,58 @@ class ApiClient {
     }
 
     async uploadPdf(file: File): Promise<LibraryItem> {
+        if (file.size > RESUMABLE_UPLOAD_THRESHOLD) {
+            return this.uploadResumable(file);
+        }
+        return this.uploadFile('/upload/pdf', file);
+    }
+
+    // Large PDFs go up in ranges; after a dropped connection only the missing bytes are re-sent
+    private async uploadResumable(file: File): Promise<LibraryItem> {
+        let session = await this.request<UploadSession>('/upload/sessions', {
+            method: 'POST',
+            body: JSON.stringify({ filename: file.name, size: file.size }),
+        });
+        const url = `/upload/sessions/${session.id}`;
+        let failures = 0;
+
+        while (!session.complete) {
+            const end = Math.min(session.offset + UPLOAD_RANGE_BYTES, file.size);
+            try {
+                session = await this.request<UploadSession>(url, {
+                    method: 'PUT',
+                    body: file.slice(session.offset, end),
+                    headers: {
+                        'Content-Type': 'application/octet-stream',
+                        'Content-Range': `bytes ${session.offset}-${end - 1}/${file.size}`,
+                    },
+                });
+                failures = 0;
+            } catch (err) {
+                if (++failures > UPLOAD_MAX_RETRIES) throw err;
+                await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** failures));
+                // Ask the server how much arrived and carry on from there
+                session = await this.request<UploadSession>(url);
+            }
+        }
+        return this.request<LibraryItem>(`${url}/complete`, { method: 'POST' });
+    }
+
+    // EPUB and plain text/Markdown are chunked on the server without OCR
+    async uploadEpub(file: File): Promise<LibraryItem> {
+        return this.uploadFile('/upload/epub', file);
+    }
+
+    async uploadText(file: File): Promise<LibraryItem> {
+        return this.uploadFile('/upload/text', file);
+    }
+
+    private async uploadFile(path: string, file: File): Promise<LibraryItem> {
         const formData = new FormData();
         formData.append('file', file);
 
-        // request method handles JSON headers automatically, but for FormData we need to let browser set Content-Type
-        // So we override request slightly or use specific fetch here?
-        // Let's modify request or add a specialized request.
-        // Actually, my request wrapper sets 'Content-Type': 'application/json'. I should override that.
-
-        const response = await fetch(`${API_BASE}/upload/pdf`, {
+        // The request wrapper sets 'Content-Type': 'application/json'; for FormData the browser must set it
+        const response = await fetch(`${API_BASE}${path}`, {
             method: 'POST',
             body: formData,
             credentials: 'include',
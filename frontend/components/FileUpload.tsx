@@ -27,13 +27,19 @@ export const FileUpload: React.FC<FileUploadProps> = ({ onProcessed, onChaptersF
 
     setIsProcessing(true);
     try {
-      if (file.type === 'application/pdf') {
+      const name = file.name.toLowerCase();
+      const upload =
+        file.type === 'application/pdf' || name.endsWith('.pdf') ? api.uploadPdf :
+        name.endsWith('.epub') ? api.uploadEpub :
+        name.endsWith('.txt') || name.endsWith('.md') ? api.uploadText :
+        null;
+      if (upload) {
         try {
-          const story = await api.uploadPdf(file);
+          const story = await upload.call(api, file);
           onStoryCreated(story);
         } catch (err) {
           console.error(err);
-          alert("Failed to upload/process PDF.");
+          alert("Failed to upload/process file.");
         } finally {
           setIsProcessing(false);
         }
@@ -88,7 +94,7 @@ export const FileUpload: React.FC<FileUploadProps> = ({ onProcessed, onChaptersF
             type="file"
             ref={fileInputRef}
             onChange={handleFileUpload}
-            accept=".pdf,.txt"
+            accept=".pdf,.epub,.txt,.md"
             className="hidden"
           />
           <button
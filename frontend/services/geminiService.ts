@@ -23,9 +23,9 @@ export const formatChunkToMarkdown = async (chunk: string): Promise<string> => {
   }
 };
 
-export const sendChatMessage = async (currentText: string, history: ChatMessage[], userMessage: string): Promise<string> => {
+export const sendChatMessage = async (currentText: string, history: ChatMessage[], userMessage: string, storyId?: string, chunkIndex?: number): Promise<string> => {
   try {
-    return await api.chatWithAI(currentText, history, userMessage);
+    return await api.chatWithAI(currentText, history, userMessage, storyId, chunkIndex);
   } catch (error) {
     console.error("Chat error:", error);
     return "Sorry, I'm having trouble connecting to the assistant right now.";
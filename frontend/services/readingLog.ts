@@ -0,0 +1,43 @@
+import { api } from '../api';
+import { ReadingEvent } from '../types';
+
+// Reading events are queued and sent in batches: every FLUSH_INTERVAL_MS, when a session
+// ends, and when the page is hidden (keepalive, so closing the tab doesn't lose the tail).
+// A failed batch goes back to the front of the queue for the next flush. Events carry an
+// id the server deduplicates on, so a batch that was stored but whose response was lost
+// can be sent again without being counted twice.
+const FLUSH_INTERVAL_MS = 30000;
+const MAX_BATCH = 500;
+
+let queue: ReadingEvent[] = [];
+let timer: ReturnType<typeof setTimeout> | null = null;
+let flushing = false;
+
+export const logReadingEvent = (event: Omit<ReadingEvent, 'id' | 'at'>) => {
+  queue.push({ ...event, id: crypto.randomUUID(), at: Date.now() });
+  if (!timer) timer = setTimeout(() => { timer = null; flushReadingEvents(); }, FLUSH_INTERVAL_MS);
+};
+
+export const flushReadingEvents = async (keepalive = false) => {
+  // The keepalive flush may be the page's last chance, so it doesn't wait for a batch in
+  // flight: it sends what is still queued alongside it
+  if (queue.length === 0 || (flushing && !keepalive)) return;
+  const batch = queue.slice(0, MAX_BATCH);
+  queue = queue.slice(batch.length);
+  if (!keepalive) flushing = true;
+  try {
+    await api.addReadingEvents(batch, keepalive);
+  } catch (error) {
+    console.error("Failed to send reading events", error);
+    queue = [...batch, ...queue];
+  } finally {
+    if (!keepalive) flushing = false;
+  }
+  if (queue.length > 0 && !timer) timer = setTimeout(() => { timer = null; flushReadingEvents(); }, FLUSH_INTERVAL_MS);
+};
+
+if (typeof document !== 'undefined') {
+  document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') flushReadingEvents(true);
+  });
+}
@@ -40,6 +40,7 @@ export interface LibraryItem {
   elapsedTime: number;
   lastRead: number;
   isComplete: boolean;
+  chunkCount?: number; // Set on items from /bootstrap, whose chunks are fetched when opened
 }
 
 export interface ReadingSettings {
@@ -69,3 +70,68 @@ export interface LeaderboardEntry {
   total_words_read: number;
   total_correct_answers: number;
 }
+
+export interface SearchHit {
+  storyId: string;
+  storyTitle: string;
+  chunkIndex: number;
+  snippet: string; // Matched terms wrapped in **bold** markdown
+  score: number;
+}
+
+export interface SearchResults {
+  hits: SearchHit[];
+  nextOffset: number | null;
+}
+
+export interface UploadSession {
+  id: string;
+  filename: string;
+  size: number;
+  offset: number; // Bytes received so far; the next PUT starts here
+  complete: boolean;
+}
+
+export interface LibrarySummary {
+  id: string;
+  title: string;
+  chunkCount: number;
+  currentIndex: number;
+  stats: SessionStats;
+  elapsedTime: number;
+  lastRead: number;
+  isComplete: boolean;
+}
+
+export interface Bootstrap {
+  user: User;
+  settings: ReadingSettings;
+  library: LibrarySummary[];
+}
+
+export interface ReadingEvent {
+  id: string; // Client-generated; the server stores each id once, so a batch can be resent safely
+  storyId: string;
+  type: 'session_start' | 'session_end' | 'page' | 'quiz';
+  at: number; // ms since the epoch
+  pages?: number;
+  words?: number;
+  seconds?: number;
+  correct?: boolean;
+}
+
+export interface ReadingDay {
+  day: string; // YYYY-MM-DD, local
+  sessions: number;
+  seconds: number;
+  pages: number;
+  words: number;
+  questions: number;
+  correct: number;
+}
+
+export interface ReadingHistory {
+  days: ReadingDay[];
+  currentStreak: number;
+  longestStreak: number;
+}